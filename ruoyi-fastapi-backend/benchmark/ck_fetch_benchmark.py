@@ -0,0 +1,78 @@
+"""
+ClickHouse 取数方式对比基准
+
+对同一条板块 × 一年的日线查询，分别使用
+1. 行式：ck_util.query 返回 result_rows 元组列表，再由 convert_result_to_dataframe 转换
+2. 列式：ck_util.query_df 由 clickhouse_connect 按列直接构建 DataFrame
+各执行若干次，输出平均耗时、行数及结果 DataFrame 的内存占用。
+
+运行方式（在 ruoyi-fastapi-backend 目录下，需要能连接 ClickHouse）：
+    python -m benchmark.ck_fetch_benchmark --env=dev
+"""
+import time
+import tracemalloc
+
+from utils import ck_util
+from utils.data_util import convert_result_to_dataframe
+
+# 参与测试的股票数量、时间范围及重复次数
+STOCK_LIMIT = 300
+START_DATE = '2024-01-01'
+END_DATE = '2024-12-31'
+REPEAT = 5
+COLUMNS_TO_READ = ['code', 'open', 'close', 'high', 'low', 'ycp', 'vol', 'timestamps']
+
+
+def build_query() -> str:
+    """
+    构建板块 × 一年的日线查询
+    """
+    codes_query = f"""
+    SELECT DISTINCT code FROM ods_stock.ll_stock_daily_sharing
+    WHERE category = 'stock' AND timestamps >= toDate('{START_DATE}')
+    ORDER BY code
+    LIMIT {STOCK_LIMIT}
+    """
+    codes = [row[0] for row in ck_util.query(codes_query).result_rows]
+    return f"""
+    SELECT {', '.join(COLUMNS_TO_READ)}
+    FROM ods_stock.ll_stock_daily_sharing
+    WHERE code IN ({', '.join(f"'{code}'" for code in codes)})
+        AND category = 'stock'
+        AND timestamps >= toDate('{START_DATE}')
+        AND timestamps <= toDate('{END_DATE}')
+    ORDER BY code, timestamps
+    """
+
+
+def fetch_rows(query: str):
+    return convert_result_to_dataframe(ck_util.query(query), COLUMNS_TO_READ)
+
+
+def fetch_columns(query: str):
+    return ck_util.query_df(query, COLUMNS_TO_READ)
+
+
+def run(name: str, fetch, query: str):
+    # 预热一次，排除连接建立等一次性开销
+    fetch(query)
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        df = fetch(query)
+        elapsed.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fetch(query)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f'{name}: 平均 {sum(elapsed) / len(elapsed) * 1000:.1f} ms, 最快 {min(elapsed) * 1000:.1f} ms, '
+        f'行数 {len(df)}, 结果内存 {df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB, '
+        f'Python堆峰值 {peak / 1024 / 1024:.1f} MB'
+    )
+
+
+if __name__ == '__main__':
+    benchmark_query = build_query()
+    run('行式 result_rows', fetch_rows, benchmark_query)
+    run('列式 query_df', fetch_columns, benchmark_query)
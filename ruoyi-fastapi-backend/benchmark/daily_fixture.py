@@ -0,0 +1,79 @@
+"""
+日线夹具数据集
+
+生成离线开发和基准测试使用的日线夹具（CSV，列为 code、open、close、high、low、ycp、vol、timestamps），
+将 STOCK_REPLICA_MODE 设置为 offline、STOCK_REPLICA_FIXTURE_PATH 指向该文件后，
+应用启动时会由夹具构建日线本地副本，相似度计算、K线等日线查询均不再访问 ClickHouse。
+
+运行方式（在 ruoyi-fastapi-backend 目录下）：
+    # 生成随机游走的合成数据，不需要连接 ClickHouse
+    python -m benchmark.daily_fixture --env=dev synthetic vf_admin/daily_fixture.csv
+    # 从 ClickHouse 导出真实日线的子集
+    python -m benchmark.daily_fixture --env=dev export vf_admin/daily_fixture.csv
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+# 合成数据的股票数量、时间范围
+SYNTHETIC_STOCKS = 500
+START_DATE = '2023-01-01'
+END_DATE = '2024-12-31'
+# 导出真实数据时的股票数量
+EXPORT_STOCK_LIMIT = 500
+
+
+def synthetic_fixture(seed: int = 0) -> pd.DataFrame:
+    """
+    生成随机游走的合成日线，每只股票随机缺失少量交易日以模拟停牌
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(START_DATE, END_DATE)
+    frames = []
+    for index in range(SYNTHETIC_STOCKS):
+        returns = rng.normal(0, 0.02, len(days))
+        close = 10 * (1 + rng.random()) * np.cumprod(1 + returns)
+        ycp = np.concatenate([[close[0] / (1 + returns[0])], close[:-1]])
+        open_ = ycp * (1 + rng.normal(0, 0.01, len(days)))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, len(days))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, len(days))))
+        keep = rng.random(len(days)) > 0.02
+        frames.append(pd.DataFrame({
+            'code': f'{600000 + index:06d}',
+            'open': open_,
+            'close': close,
+            'high': high,
+            'low': low,
+            'ycp': ycp,
+            'vol': rng.integers(1_000, 1_000_000, len(days)).astype(float),
+            'timestamps': days,
+        })[keep])
+    return pd.concat(frames, ignore_index=True)
+
+
+def export_fixture() -> pd.DataFrame:
+    """
+    从 ClickHouse 导出部分股票的真实日线
+    """
+    from utils import ck_util
+    from utils.daily_replica_util import DailyBarReplica
+
+    codes_query = f"""
+    SELECT DISTINCT code FROM ods_stock.ll_stock_daily_sharing
+    WHERE category = 'stock' AND timestamps >= toDate('{START_DATE}')
+    ORDER BY code
+    LIMIT {EXPORT_STOCK_LIMIT}
+    """
+    codes = [row[0] for row in ck_util.query(codes_query).result_rows]
+    return DailyBarReplica.fetch_clickhouse(codes, START_DATE, END_DATE)
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) != 2 or args[0] not in ('synthetic', 'export'):
+        print(__doc__)
+        sys.exit(1)
+    fixture = synthetic_fixture() if args[0] == 'synthetic' else export_fixture()
+    fixture.to_csv(args[1], index=False)
+    print(f'已写入 {args[1]}，股票数 {fixture["code"].nunique()}，行数 {len(fixture)}')
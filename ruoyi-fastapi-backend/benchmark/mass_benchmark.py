@@ -0,0 +1,77 @@
+"""
+形态搜索（MASS）基准
+
+构造一个合成板块（若干只股票 × 多年日线），并在其中几只股票的随机位置植入带缩放和噪声的基准形态，
+分别使用
+1. 逐只股票：滑动窗口逐个子序列 z 标准化后计算欧氏距离，复杂度 O(n·m)
+2. MASS：一次 FFT 计算整个板块的距离剖面，复杂度 O(n·log n)
+搜索前K个匹配，输出平均耗时，并检查两种方式的结果一致、植入的形态均被找到。
+不需要连接数据库。
+
+运行方式（在 ruoyi-fastapi-backend 目录下）：
+    python -m benchmark.mass_benchmark
+"""
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.mass_util import mass_distance_profiles, top_matches
+
+# 板块股票数量、历史交易日数、形态长度、返回的匹配数量及重复次数
+STOCK_COUNT = 300
+HISTORY_DAYS = 1250
+WINDOW = 60
+TOP_K = 10
+REPEAT = 5
+PLANTED = 5
+
+
+def build_sector(seed: int = 0):
+    """
+    构造随机游走的板块收盘价，并植入基准形态
+    """
+    rng = np.random.default_rng(seed)
+    close = 20 + np.cumsum(rng.normal(0, 0.3, (STOCK_COUNT, HISTORY_DAYS)), axis=1)
+    close = np.maximum(close, 1.0)
+    query = 10 + np.cumsum(rng.normal(0, 0.5, WINDOW))
+    planted = []
+    for row in rng.choice(STOCK_COUNT, PLANTED, replace=False):
+        start = int(rng.integers(0, HISTORY_DAYS - WINDOW))
+        close[row, start:start + WINDOW] = query * rng.uniform(0.5, 3) + rng.uniform(5, 50) \
+            + rng.normal(0, 0.05, WINDOW)
+        planted.append((int(row), start))
+    return query, close, planted
+
+
+def naive_profiles(query: np.ndarray, close: np.ndarray) -> np.ndarray:
+    zq = (query - query.mean()) / query.std()
+    profiles = np.empty((close.shape[0], close.shape[1] - len(query) + 1))
+    for row, series in enumerate(close):
+        windows = sliding_window_view(series, len(query))
+        std = windows.std(axis=1, keepdims=True)
+        z = (windows - windows.mean(axis=1, keepdims=True)) / np.where(std > 0, std, 1.0)
+        profiles[row] = np.where(std[:, 0] > 1e-12, np.sqrt(((z - zq) ** 2).sum(axis=1)), np.inf)
+    return profiles
+
+
+def run(name: str, compute, query: np.ndarray, close: np.ndarray):
+    compute(query, close)
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        matches = top_matches(compute(query, close), TOP_K, WINDOW // 2)
+        elapsed.append(time.perf_counter() - start)
+    print(f'{name}: 平均 {sum(elapsed) / len(elapsed) * 1000:.1f} ms, 最快 {min(elapsed) * 1000:.1f} ms')
+    return matches
+
+
+if __name__ == '__main__':
+    benchmark_query, sector_close, planted_matches = build_sector()
+    print(f'板块 {STOCK_COUNT} 只股票 × {HISTORY_DAYS} 个交易日，形态长度 {WINDOW}')
+    naive = run('逐只股票滑动窗口', naive_profiles, benchmark_query, sector_close)
+    mass = run('MASS', mass_distance_profiles, benchmark_query, sector_close)
+    same = [(row, start) for row, start, _ in naive] == [(row, start) for row, start, _ in mass] and np.allclose(
+        [distance for _, _, distance in naive], [distance for _, _, distance in mass], atol=1e-6)
+    found = set(planted_matches) <= {(row, start) for row, start, _ in mass}
+    print(f'结果一致: {same}，植入的 {PLANTED} 个形态均被找到: {found}')
@@ -0,0 +1,100 @@
+"""
+板块行情内存基准
+
+构造一个标准规模的合成板块（300 只股票 × 1250 个交易日），分别以
+1. 原始列类型：股票代码为字符串，行情列为 float64，即列式查询直接得到的结构
+2. 紧凑列类型：由 normalize_daily_frame 统一为分类类型的股票代码及 float32 行情列，即DAO当前返回的结构
+在新启动的进程中执行一次相似度请求在板块行情上的完整路径（排除基准股票、打包发送给计算进程、
+还原长表并构建面板计算相似度、构建相似股票的收益率面板），输出板块长表占用的内存及进程的峰值内存（RSS），
+并检查两种列类型下的相似度得分一致。
+不需要连接数据库。
+
+运行方式（在 ruoyi-fastapi-backend 目录下）：
+    python -m benchmark.section_memory_benchmark
+"""
+import os
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+# 板块股票数量、历史交易日数、返回的相似股票数量及计算使用的指标
+STOCK_COUNT = 300
+HISTORY_DAYS = 1250
+TOP_K = 10
+INDICATORS = ['close', 'high', 'low', 'turnover']
+METHOD = 'pearson'
+
+
+def build_sector(seed: int = 0) -> pd.DataFrame:
+    """
+    构造随机游走的板块日线长表，列类型与列式查询的结果一致，每只股票随机缺失少量交易日以模拟停牌
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range('2020-01-01', periods=HISTORY_DAYS)
+    returns = rng.normal(0, 0.02, (STOCK_COUNT, HISTORY_DAYS))
+    close = 10 * (1 + rng.random((STOCK_COUNT, 1))) * np.cumprod(1 + returns, axis=1)
+    ycp = close / (1 + returns)
+    open_ = ycp * (1 + rng.normal(0, 0.01, close.shape))
+    keep = (rng.random(close.shape) > 0.02).ravel()
+    return pd.DataFrame({
+        'code': np.repeat([f'{600000 + index:06d}' for index in range(STOCK_COUNT)], HISTORY_DAYS).astype(object),
+        'open': open_.ravel(),
+        'close': close.ravel(),
+        'high': (np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, close.shape)))).ravel(),
+        'low': (np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, close.shape)))).ravel(),
+        'ycp': ycp.ravel(),
+        'vol': rng.integers(1_000, 1_000_000, close.size).astype(float),
+        'timestamps': np.tile(days.values, STOCK_COUNT),
+    })[keep].reset_index(drop=True)
+
+
+def peak_rss_mb() -> float:
+    # Linux 下 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_request(path: str, compact: bool) -> dict:
+    """
+    在新进程中读取板块长表并执行一次相似度请求的数据路径，返回内存统计及相似度得分
+    """
+    from module_stock.service.similar_calculate_service import pack_stock_frame, score_stock_batch
+    from utils.data_util import normalize_daily_frame
+    from utils.similarity_util import SectionPanel
+
+    baseline = peak_rss_mb()
+    all_stocks = pd.read_pickle(path)
+    if compact:
+        all_stocks = normalize_daily_frame(all_stocks)
+    frame_mb = all_stocks.memory_usage(deep=True).sum() / 1024 / 1024
+    base_code = str(all_stocks['code'].iloc[0])
+    base_stock_data = all_stocks[all_stocks['code'] == base_code].rename(columns={'timestamps': 'date'})
+    base_stock_data = base_stock_data.set_index('date')
+
+    payload = pack_stock_frame(all_stocks[all_stocks['code'] != base_code])
+    scores, _ = score_stock_batch(base_stock_data, payload, base_code, INDICATORS, METHOD)
+    similar_codes = sorted(scores, key=scores.get, reverse=True)[:TOP_K]
+    SectionPanel.from_frame(all_stocks[all_stocks['code'].isin(similar_codes)],
+                            pd.DatetimeIndex(base_stock_data.index))
+    return {'frame_mb': frame_mb, 'baseline_mb': baseline, 'peak_mb': peak_rss_mb(), 'scores': scores}
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        sector_path = os.path.join(tmp, 'sector.pkl')
+        build_sector().to_pickle(sector_path)
+        results = {}
+        for name, compact in [('原始列类型', False), ('紧凑列类型', True)]:
+            # 每种列类型使用新启动的进程，峰值内存互不影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results[name] = executor.submit(run_request, sector_path, compact).result()
+
+    print(f'板块 {STOCK_COUNT} 只股票 × {HISTORY_DAYS} 个交易日，相似性计算方法 {METHOD}')
+    for name, result in results.items():
+        print(f'{name}: 板块长表 {result["frame_mb"]:.1f} MB，峰值内存 {result["peak_mb"]:.1f} MB'
+              f'（请求路径新增 {result["peak_mb"] - result["baseline_mb"]:.1f} MB）')
+    legacy, compact_scores = results['原始列类型']['scores'], results['紧凑列类型']['scores']
+    print(f'相似度得分最大差异 {max(abs(legacy[code] - compact_scores[code]) for code in legacy):.2e}')
@@ -51,3 +51,7 @@ class RedisInitKeyConfig(Enum):
     SMS_CODE = {'key': 'sms_code', 'remark': '短信验证码'}
     STOCK_KLINE = {'key': 'stock_kline', 'remark': '股票K线数据'}
     STOCK_WATCHLIST = {'key': 'stock:watchlist:{user_id}', 'remark': '用户关注列表'}  # {user_id}为占位符
+    STOCK_SIMILARITY = {'key': 'stock_similarity', 'remark': '股票相似性计算结果'}
+    STOCK_SIMILARITY_STATS = {'key': 'stock_similarity_stats', 'remark': '股票相似性结果缓存命中统计'}
+    STOCK_SIMILARITY_LOCK = {'key': 'stock_similarity_lock', 'remark': '股票相似性计算锁'}
+    STOCK_SIMILARITY_JOB = {'key': 'stock_similarity_job', 'remark': '股票相似性异步计算任务'}
@@ -82,6 +82,12 @@ class ClickHouseSettings(BaseSettings):
     ck_send_receive_timeout: int = 30  # 发送接收超时（秒）
     ck_sync_request_timeout: int = 5  # 同步请求超时（秒）
     ck_compression: bool = True  # 启用压缩可能会提高性能
+    ck_pool_size: int = 10  # 连接池最大连接数，同时也是ClickHouse专用线程池的线程数
+    ck_pool_min_size: int = 1  # 连接池最小保留连接数，空闲回收时不低于该值
+    ck_pool_acquire_timeout: int = 10  # 获取连接的最长等待时间（秒）
+    ck_pool_idle_timeout: int = 300  # 空闲连接超过该时间（秒）后回收
+    ck_pool_validate_idle: int = 30  # 空闲超过该时间（秒）的连接在取出时先校验是否可用
+    ck_query_timeout: int = 30  # 单条查询超时（秒），同时作为服务端 max_execution_time
 
 class RedisSettings(BaseSettings):
     """
@@ -95,6 +101,40 @@ class RedisSettings(BaseSettings):
     redis_database: int = 2
 
 
+class StockSettings(BaseSettings):
+    """
+    股票相似度计算配置
+    """
+
+    stock_pool_workers: int = 4  # 相似度计算进程池的进程数，为0时在当前进程内计算
+    stock_pool_chunk_size: int = 50  # 每个计算任务包含的候选股票数量
+    stock_security_master_cron: str = '0 30 8 * * ?'  # 证券主数据刷新的cron表达式
+    stock_trading_calendar_cron: str = '0 0/30 * * * ?'  # 交易日历刷新的cron表达式
+    stock_feature_store_path: str = 'vf_admin/feature_store'  # 逐日特征库的存储目录
+    stock_feature_store_start_date: str = '2020-01-01'  # 逐日特征库首次构建的起始日期
+    stock_feature_store_cron: str = '0 10/30 * * * ?'  # 逐日特征库增量追加的cron表达式
+    stock_replica_mode: str = 'readthrough'  # 日线本地副本模式：off、readthrough、offline
+    stock_replica_path: str = 'vf_admin/daily_replica'  # 日线本地副本的存储目录
+    stock_replica_start_date: str = '2020-01-01'  # 日线本地副本首次同步的起始日期
+    stock_replica_fixture_path: str = ''  # 离线模式下构建副本使用的夹具数据集（CSV）
+    stock_replica_cron: str = '0 5/30 * * * ?'  # 日线本地副本增量同步的cron表达式
+    stock_ann_windows: str = '20,60,120,250'  # 全市场检索索引的标准窗口长度（交易日），逗号分隔
+    stock_ann_candidates: int = 300  # 全市场检索召回后交给精确方法重新排序的候选股票数量
+    stock_ann_index_path: str = 'vf_admin/ann_index'  # 全市场检索索引的存储目录
+    stock_ann_cron: str = '0 0 2 * * ?'  # 全市场检索索引重建的cron表达式
+    stock_similarity_cache_depth: int = 20  # 相似性结果缓存保存的相似股票数量
+    stock_similarity_cache_ttl: int = 86400  # 相似性结果缓存的过期时间（秒）
+    stock_similarity_lock_ttl: int = 30  # 相似性计算锁的过期时间（秒），持有者定期续期
+    stock_similarity_lock_wait: int = 600  # 等待其他进程完成相同计算的最长时间（秒）
+    stock_job_workers: int = 2  # 每个服务进程同时执行的相似性异步计算任务数，其余任务排队
+    stock_job_ttl: int = 86400  # 异步计算任务状态及结果的保留时间（秒）
+    stock_mcs_edge_tolerance: float = 0.01  # 最大公共子图中对应边权重之差的容差
+    stock_sector_panel_cache_mb: int = 512  # 板块面板缓存占用内存的上限（MB），为0时不缓存
+    stock_sector_panel_warm_count: int = 10  # 按查询历史预热的热门行业分组数量
+    stock_sector_panel_warm_days: int = 30  # 统计热门行业分组时回看的查询历史天数
+    stock_sector_panel_cron: str = '0 20/30 * * * ?'  # 板块面板预热的cron表达式，最新交易日变化后才重新预热
+
+
 class GenSettings:
     """
     代码生成配置
@@ -221,6 +261,14 @@ class GetConfig:
         获取ClickHouse配置
         """
         return ClickHouseSettings()
+
+    @lru_cache()
+    def get_stock_config(self):
+        """
+        获取股票相似度计算配置
+        """
+        return StockSettings()
+
     @lru_cache()
     def get_gen_config(self):
         """
@@ -278,6 +326,8 @@ DataBaseConfig = get_config.get_database_config()
 RedisConfig = get_config.get_redis_config()
 # ClickHouse配置
 ClickHouseConfig = get_config.get_clickhouse_config()
+# 股票相似度计算配置
+StockConfig = get_config.get_stock_config()
 # 代码生成配置
 GenConfig = get_config.get_gen_config()
 # 上传配置
@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+from config.env import StockConfig
+from utils.log_util import logger
+
+# 计算进程的启动方式：不使用默认的 fork，避免子进程继承调度器、ClickHouse 查询线程及 SSH 隧道线程持有的锁而死锁
+PROCESS_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+class ProcessPoolUtil:
+    """
+    CPU密集型计算进程池相关方法
+    """
+
+    executor: Optional[ProcessPoolExecutor] = None
+
+    @staticmethod
+    def _create_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=StockConfig.stock_pool_workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)
+        )
+
+    @classmethod
+    async def init_process_pool(cls):
+        """
+        应用启动时初始化进程池
+
+        :return:
+        """
+        if StockConfig.stock_pool_workers <= 0:
+            logger.info('相似度计算进程池未启用，将在当前进程内计算')
+            return
+        logger.info('开始启动相似度计算进程池...')
+        cls.executor = cls._create_executor()
+        logger.info(f'相似度计算进程池启动成功，进程数：{StockConfig.stock_pool_workers}')
+
+    @classmethod
+    async def close_process_pool(cls):
+        """
+        应用关闭时关闭进程池，取消尚未开始的任务并等待正在执行的任务结束
+
+        :return:
+        """
+        if cls.executor is None:
+            return
+        executor, cls.executor = cls.executor, None
+        # 等待正在执行的任务结束可能较久，放到线程中执行，不阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(executor.shutdown, wait=True, cancel_futures=True)
+        )
+        logger.info('关闭相似度计算进程池成功')
+
+    @classmethod
+    async def run(cls, func: Callable, *args: Any) -> Any:
+        """
+        在进程池中执行计算函数，进程池未启用时在当前进程内执行
+
+        :param func: 模块级计算函数，参数和返回值需可被pickle序列化
+        :param args: 计算函数的参数
+        :return: 计算函数的返回值
+        """
+        executor = cls.executor
+        if executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, partial(func, *args))
+        except BrokenProcessPool:
+            # 计算进程异常退出后进程池不可再用，重建进程池以便后续请求继续使用
+            if cls.executor is executor:
+                logger.error('相似度计算进程异常退出，正在重建进程池')
+                executor.shutdown(wait=False, cancel_futures=True)
+                cls.executor = cls._create_executor()
+            raise
+
+    @classmethod
+    async def map(
+        cls,
+        func: Callable,
+        args_list: Iterable[tuple],
+        callback: Optional[Callable[[int, Any], Awaitable[None]]] = None,
+    ) -> List[Any]:
+        """
+        将多组参数分发到进程池并发执行
+
+        :param func: 模块级计算函数
+        :param args_list: 每个任务的参数元组
+        :param callback: 每个任务完成后以任务序号及其返回值调用的协程函数，用于汇报进度及部分结果
+        :return: 与参数顺序一致的返回值列表
+        """
+
+        async def run_one(index: int, args: tuple) -> Any:
+            result = await cls.run(func, *args)
+            if callback is not None:
+                await callback(index, result)
+            return result
+
+        return list(await asyncio.gather(*(run_one(index, args) for index, args in enumerate(args_list))))
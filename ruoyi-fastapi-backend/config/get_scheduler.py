@@ -13,7 +13,7 @@ from asyncio import iscoroutinefunction
 from datetime import datetime, timedelta
 from sqlalchemy.engine import create_engine
 from sqlalchemy.orm import sessionmaker
-from typing import Union
+from typing import Callable, Union
 from config.database import AsyncSessionLocal, quote_plus, tunnel as db_tunnel
 from config.env import DataBaseConfig, RedisConfig, SSHConfig
 from module_admin.dao.job_dao import JobDao
@@ -217,6 +217,29 @@ class SchedulerUtil:
             executor=job_executor,
         )
 
+    @classmethod
+    def add_system_job(cls, job_id: str, job_name: str, job_func: Callable, cron_expression: str):
+        """
+        添加不在任务管理中维护的系统内置任务，任务保存在内存任务存储中
+
+        :param job_id: 任务id
+        :param job_name: 任务名称
+        :param job_func: 任务函数
+        :param cron_expression: cron执行表达式
+        :return:
+        """
+        scheduler.add_job(
+            func=job_func,
+            trigger=MyCronTrigger.from_crontab(cron_expression),
+            id=job_id,
+            name=job_name,
+            coalesce=True,
+            max_instances=1,
+            replace_existing=True,
+            jobstore='default',
+            executor='default',
+        )
+
     @classmethod
     def execute_scheduler_job_once(cls, job_info: JobModel):
         """
@@ -13,6 +13,7 @@ class CacheMonitorModel(BaseModel):
     command_stats: Optional[List] = Field(default=[], description='命令统计')
     db_size: Optional[int] = Field(default=None, description='Key数量')
     info: Optional[dict] = Field(default={}, description='Redis信息')
+    similarity_cache: Optional[dict] = Field(default={}, description='相似性结果缓存命中统计')
 
 
 class CacheInfoModel(BaseModel):
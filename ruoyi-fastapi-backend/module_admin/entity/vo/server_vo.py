@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict, Field
 from pydantic.alias_generators import to_camel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class CpuInfo(BaseModel):
@@ -53,6 +53,22 @@ class SysFiles(BaseModel):
     usage: Optional[str] = Field(default=None, description='资源的使用率')
 
 
+class ClickHousePoolInfo(BaseModel):
+    model_config = ConfigDict(alias_generator=to_camel)
+
+    min_size: Optional[int] = Field(default=None, description='最小连接数')
+    max_size: Optional[int] = Field(default=None, description='最大连接数')
+    size: Optional[int] = Field(default=None, description='当前连接数')
+    in_use: Optional[int] = Field(default=None, description='使用中连接数')
+    idle: Optional[int] = Field(default=None, description='空闲连接数')
+    acquire_count: Optional[int] = Field(default=None, description='获取连接次数')
+    timeout_count: Optional[int] = Field(default=None, description='获取连接超时次数')
+    broken_count: Optional[int] = Field(default=None, description='丢弃的失效连接数')
+    created_count: Optional[int] = Field(default=None, description='累计创建连接数')
+    wait_time_histogram: Optional[Dict[str, int]] = Field(default=None, description='获取连接等待时间分布')
+    tunnel_active: Optional[bool] = Field(default=None, description='SSH隧道是否可用')
+
+
 class ServerMonitorModel(BaseModel):
     """
     服务监控对应pydantic模型
@@ -65,3 +81,4 @@ class ServerMonitorModel(BaseModel):
     mem: Optional[MemoryInfo] = Field(description='內存相关信息')
     sys: Optional[SysInfo] = Field(description='服务器相关信息')
     sys_files: Optional[List[SysFiles]] = Field(description='磁盘相关信息')
+    ck_pool: Optional[ClickHousePoolInfo] = Field(default=None, description='ClickHouse连接池相关信息')
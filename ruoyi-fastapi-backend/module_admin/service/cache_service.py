@@ -3,6 +3,7 @@ from config.enums import RedisInitKeyConfig
 from config.get_redis import RedisUtil
 from module_admin.entity.vo.cache_vo import CacheInfoModel, CacheMonitorModel
 from module_admin.entity.vo.common_vo import CrudResponseModel
+from module_stock.service.similarity_cache_service import SimilarityCacheService
 
 
 class CacheService:
@@ -24,7 +25,10 @@ class CacheService:
         command_stats = [
             dict(name=key.split('_')[1], value=str(value.get('calls'))) for key, value in command_stats_dict.items()
         ]
-        result = CacheMonitorModel(commandStats=command_stats, dbSize=db_size, info=info)
+        similarity_cache = await SimilarityCacheService.stats(request.app.state.redis)
+        result = CacheMonitorModel(
+            commandStats=command_stats, dbSize=db_size, info=info, similarityCache=similarity_cache
+        )
 
         return result
 
@@ -3,7 +3,16 @@ import platform
 import psutil
 import socket
 import time
-from module_admin.entity.vo.server_vo import CpuInfo, MemoryInfo, PyInfo, ServerMonitorModel, SysFiles, SysInfo
+from module_admin.entity.vo.server_vo import (
+    ClickHousePoolInfo,
+    CpuInfo,
+    MemoryInfo,
+    PyInfo,
+    ServerMonitorModel,
+    SysFiles,
+    SysInfo,
+)
+from utils import ck_util
 from utils.common_util import bytes2human
 
 
@@ -91,6 +100,22 @@ class ServerService:
             )
             sys_files.append(disk_data)
 
-        result = ServerMonitorModel(cpu=cpu, mem=mem, sys=sys, py=py, sysFiles=sys_files)
+        # ClickHouse连接池信息
+        pool_stats = ck_util.ch_pool.stats()
+        ck_pool = ClickHousePoolInfo(
+            minSize=pool_stats['min_size'],
+            maxSize=pool_stats['max_size'],
+            size=pool_stats['size'],
+            inUse=pool_stats['in_use'],
+            idle=pool_stats['idle'],
+            acquireCount=pool_stats['acquire_count'],
+            timeoutCount=pool_stats['timeout_count'],
+            brokenCount=pool_stats['broken_count'],
+            createdCount=pool_stats['created_count'],
+            waitTimeHistogram=pool_stats['wait_time_histogram'],
+            tunnelActive=pool_stats['tunnel_active'],
+        )
+
+        result = ServerMonitorModel(cpu=cpu, mem=mem, sys=sys, py=py, sysFiles=sys_files, ckPool=ck_pool)
 
         return result
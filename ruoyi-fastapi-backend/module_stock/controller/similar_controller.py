@@ -5,11 +5,13 @@ from config.get_db import get_db
 from entity.vo.kLine_vo import StockBase
 from module_admin.annotation.log_annotation import Log
 from module_admin.aspect.interface_auth import CheckUserInterfaceAuth
+from module_admin.entity.vo.user_vo import CurrentUserModel
 from module_admin.service.login_service import LoginService
 from utils.log_util import logger
 from utils.response_util import ResponseUtil
 from module_stock.entity.vo.similar_vo import *
 from module_stock.service.similar_service import StockSimilarityService
+from module_stock.service.similarity_job_service import SimilarityJobService
 
 # 创建路由
 similarController = APIRouter(
@@ -45,7 +47,7 @@ async def calculate_stock_similarity(
         similarity_service = StockSimilarityService()
 
         # 调用服务层方法计算相似性
-        response = await similarity_service.calculate_similarity(similarity_request)
+        response = await similarity_service.calculate_similarity_cached(request.app.state.redis, similarity_request)
 
         logger.info('股票相似性计算成功')
         return ResponseUtil.success(msg='股票相似性计算成功', data=response)
@@ -55,6 +57,163 @@ async def calculate_stock_similarity(
         return ResponseUtil.error(msg=f'股票相似性计算异常: {str(e)}')
 
 
+@similarController.post(
+    '/calculateStream',
+    dependencies=[Depends(CheckUserInterfaceAuth('system:similarity:calculate'))]
+)
+@Log(title='股票相似性流式计算', business_type=BusinessType.OTHER)
+async def calculate_stock_similarity_stream(
+        request: Request,
+        similarity_request: StockSimilarityRequest,
+):
+    """
+    流式计算股票相似性，以 Server-Sent Events 推送计算过程中的前K个相似股票（partial 事件），
+    最后推送与 /calculate 相同的完整结果（result 事件）或错误信息（error 事件）
+
+    Args:
+        request: 请求对象
+        similarity_request: 相似性计算请求
+
+    Returns:
+        StreamingResponse: text/event-stream 流式响应
+    """
+    similarity_service = StockSimilarityService()
+
+    async def event_stream():
+        async for event, data in similarity_service.calculate_similarity_events(
+                request.app.state.redis, similarity_request
+        ):
+            yield f'event: {event}\ndata: {data.model_dump_json()}\n\n'
+
+    return ResponseUtil.streaming(
+        data=event_stream(),
+        media_type='text/event-stream',
+        # 禁止代理缓冲，保证事件及时到达浏览器
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@similarController.post(
+    '/jobs',
+    response_model=SimilarityJobSubmitResponse,
+    dependencies=[Depends(CheckUserInterfaceAuth('system:similarity:calculate'))]
+)
+@Log(title='提交股票相似性计算任务', business_type=BusinessType.OTHER)
+async def submit_similarity_job(
+        request: Request,
+        similarity_request: StockSimilarityRequest,
+        current_user: CurrentUserModel = Depends(LoginService.get_current_user),
+):
+    """
+    提交异步相似性计算任务，适用于图编辑距离、最大公共子图等耗时较长的方法
+
+    Args:
+        request: 请求对象
+        similarity_request: 相似性计算请求
+        current_user: 当前用户
+
+    Returns:
+        ResponseUtil: 包含任务ID的响应
+    """
+    try:
+        job_id = await SimilarityJobService.submit(
+            request.app.state.redis, similarity_request, current_user.user.user_id
+        )
+        return ResponseUtil.success(msg='股票相似性计算任务提交成功', data=SimilarityJobSubmitResponse(jobId=job_id))
+
+    except Exception as e:
+        logger.error(f'股票相似性计算任务提交异常: {str(e)}')
+        return ResponseUtil.error(msg=f'股票相似性计算任务提交异常: {str(e)}')
+
+
+@similarController.get(
+    '/jobs/{job_id}',
+    response_model=SimilarityJobStatus,
+    dependencies=[Depends(CheckUserInterfaceAuth('system:similarity:calculate'))]
+)
+async def get_similarity_job(
+        request: Request,
+        job_id: str,
+        current_user: CurrentUserModel = Depends(LoginService.get_current_user),
+):
+    """
+    查询异步相似性计算任务的状态及进度
+
+    Args:
+        request: 请求对象
+        job_id: 任务ID
+        current_user: 当前用户
+
+    Returns:
+        ResponseUtil: 任务状态响应
+    """
+    status = await SimilarityJobService.get_status(request.app.state.redis, job_id, current_user.user.user_id)
+    if status is None:
+        return ResponseUtil.failure(msg='计算任务不存在或已过期')
+    return ResponseUtil.success(data=status)
+
+
+@similarController.get(
+    '/jobs/{job_id}/result',
+    response_model=StockSimilarityResponse,
+    dependencies=[Depends(CheckUserInterfaceAuth('system:similarity:calculate'))]
+)
+async def get_similarity_job_result(
+        request: Request,
+        job_id: str,
+        current_user: CurrentUserModel = Depends(LoginService.get_current_user),
+):
+    """
+    获取已完成的异步相似性计算任务的结果
+
+    Args:
+        request: 请求对象
+        job_id: 任务ID
+        current_user: 当前用户
+
+    Returns:
+        ResponseUtil: 与同步计算相同的计算结果响应
+    """
+    result = await SimilarityJobService.get_result(request.app.state.redis, job_id, current_user.user.user_id)
+    if result is None:
+        return ResponseUtil.failure(msg='计算任务未完成、不存在或已过期')
+    return ResponseUtil.success(msg='股票相似性计算成功', data=result)
+
+
+@similarController.post(
+    '/patternSearch',
+    response_model=PatternSearchResponse,
+    dependencies=[Depends(CheckUserInterfaceAuth('system:similarity:calculate'))]
+)
+@Log(title='股票形态搜索', business_type=BusinessType.OTHER)
+async def search_stock_pattern(
+        request: Request,
+        pattern_request: PatternSearchRequest,
+        query_db: AsyncSession = Depends(get_db),
+):
+    """
+    在板块内股票的全部历史中搜索与基准形态最接近的子序列
+
+    Args:
+        request: 请求对象
+        pattern_request: 形态搜索请求
+        query_db: 数据库会话
+
+    Returns:
+        ResponseUtil: 搜索结果响应
+    """
+    try:
+        similarity_service = StockSimilarityService()
+        response = await similarity_service.search_pattern(pattern_request)
+
+        logger.info('股票形态搜索成功')
+        return ResponseUtil.success(msg='股票形态搜索成功', data=response)
+
+    except Exception as e:
+        logger.error(f'股票形态搜索异常: {str(e)}')
+        return ResponseUtil.error(msg=f'股票形态搜索异常: {str(e)}')
+
+
 @similarController.get(
     '/fuzzySearch',
     response_model=List[StockBase],
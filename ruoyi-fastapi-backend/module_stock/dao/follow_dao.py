@@ -1,18 +1,15 @@
 # dao/follow_dao.py
-import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
 
-import clickhouse_connect
 from sqlalchemy import select, and_, delete, func, distinct
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 import logging
 import pandas as pd
 
-from config.env import ClickHouseConfig
 from entity.do.watchlist_do import StockWatchlist
 from utils import ck_util
-from utils.data_util import convert_result_to_dataframe
+from utils.trading_calendar_util import TradingCalendarUtil
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +21,8 @@ class FollowDAO:
 
     # ClickHouse查询中常用的列
     STOCK_COLUMNS = ['code', 'open', 'close', 'high', 'low', 'ycp', 'vol', 'timestamps']
+    # 查找每只股票最新行情时回看的交易日数，避免扫描全表计算最大日期
+    LATEST_PRICE_LOOKBACK_DAYS = 30
 
     @classmethod
     async def search_stocks(cls, keyword: str) -> List[Dict[str, Any]]:
@@ -37,8 +36,7 @@ class FollowDAO:
             List[Dict[str, Any]]: 符合条件的股票列表
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._search_stocks_sync, keyword)
+            return await ck_util.run_sync(cls._search_stocks_sync, keyword)
         except Exception as e:
             logger.error(f"搜索股票失败: {e}")
             raise
@@ -55,12 +53,16 @@ class FollowDAO:
             List[Dict[str, Any]]: 符合条件的股票列表
         """
         try:
+            lookback_start = TradingCalendarUtil.shift_trading_days(
+                TradingCalendarUtil.latest_trading_day(), cls.LATEST_PRICE_LOOKBACK_DAYS
+            )
             query = f"""
                WITH latest_dates AS (
                    SELECT 
                        code,
                        MAX(timestamps) as latest_date
                    FROM ods_stock.ll_stock_daily_sharing
+                   WHERE timestamps >= toDate('{lookback_start}')
                    GROUP BY code
                )
                SELECT 
@@ -100,9 +102,106 @@ class FollowDAO:
             logger.error(f"执行搜索股票查询出错: {e}")
             raise
 
+    @classmethod
+    async def get_stock_detail(cls, stock_code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单只证券（股票或指数）的最新行情，行情快照未加载时使用
 
+        Args:
+            stock_code: 证券代码
 
+        Returns:
+            Optional[Dict[str, Any]]: 行情字典，字段与行情快照的 get_quote 一致，不存在时为None
+        """
+        try:
+            return await ck_util.run_sync(cls._get_stock_detail_sync, stock_code)
+        except Exception as e:
+            logger.error(f"获取最新行情出错，股票代码: {stock_code}, 错误: {e}")
+            raise
 
+    @classmethod
+    def _get_stock_detail_sync(cls, stock_code: str) -> Optional[Dict[str, Any]]:
+        """
+        同步方法获取单只证券的最新行情，与行情快照使用相同的聚合方式
+
+        Args:
+            stock_code: 证券代码
+
+        Returns:
+            Optional[Dict[str, Any]]: 行情字典，不存在时为None
+        """
+        latest_date = TradingCalendarUtil.latest_trading_day()
+        seven_day_ago = TradingCalendarUtil.trading_day_on_or_before(latest_date - timedelta(days=7))
+        thirty_day_ago = TradingCalendarUtil.trading_day_on_or_before(latest_date - timedelta(days=30))
+        window_start = TradingCalendarUtil.shift_trading_days(thirty_day_ago, cls.LATEST_PRICE_LOOKBACK_DAYS)
+        query = f"""
+        SELECT
+            d.code,
+            s.SecuName,
+            d.latest_date,
+            d.open,
+            d.close,
+            d.high,
+            d.low,
+            d.pre_close,
+            d.volume,
+            d.amount,
+            d.price_7d_ago,
+            d.price_30d_ago
+        FROM (
+            SELECT
+                code,
+                max(timestamps) AS latest_date,
+                argMax(open, timestamps) AS open,
+                argMax(close, timestamps) AS close,
+                argMax(high, timestamps) AS high,
+                argMax(low, timestamps) AS low,
+                argMax(ycp, timestamps) AS pre_close,
+                argMax(vol, timestamps) AS volume,
+                argMax(amount, timestamps) AS amount,
+                argMaxIf(close, timestamps, timestamps <= toDate('{seven_day_ago}')) AS price_7d_ago,
+                argMaxIf(close, timestamps, timestamps <= toDate('{thirty_day_ago}')) AS price_30d_ago
+            FROM ods_stock.ll_stock_daily_sharing
+            WHERE code = '{stock_code}'
+              AND timestamps >= toDate('{window_start}')
+              AND timestamps <= toDate('{latest_date}')
+            GROUP BY code
+        ) d
+        LEFT JOIN (
+            SELECT SecuCode, any(SecuName) AS SecuName
+            FROM events_temp.lc_csiinduspe
+            WHERE SecuCode = '{stock_code}'
+            GROUP BY SecuCode
+        ) s ON d.code = s.SecuCode
+        """
+        rows = ck_util.query(query).result_rows
+        if not rows:
+            return None
+        (code, name, update_time, open_price, close, high, low, pre_close, volume, amount,
+         price_7d_ago, price_30d_ago) = rows[0]
+
+        def pct_change(base):
+            # 基准价格缺失或为0时收益率为空
+            return (close - base) / base * 100 if close is not None and base else None
+
+        change_rate = pct_change(pre_close)
+        return {
+            "code": code,
+            "name": name or '',
+            "update_time": update_time,
+            "price": close,
+            "change_rate": change_rate,
+            "volume": volume,
+            "amount": amount,
+            "high": high,
+            "low": low,
+            "open": open_price,
+            "pre_close": pre_close,
+            "seven_day_return": pct_change(price_7d_ago),
+            "thirty_day_return": pct_change(price_30d_ago),
+            "close": close,
+            "change": change_rate,
+        }
 
     @classmethod
     async def get_stock_history(cls, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
@@ -135,12 +234,31 @@ class FollowDAO:
             ORDER BY timestamps
             """
 
-            result = ck_util.query(query)
-            return convert_result_to_dataframe(result, cls.STOCK_COLUMNS)
+            # 列式查询，直接得到按列构建的DataFrame
+            return await ck_util.async_query_df(query, cls.STOCK_COLUMNS)
         except Exception as e:
             logger.error(f"获取股票历史数据出错，股票代码: {stock_code}, 错误: {e}")
             raise
 
+    @classmethod
+    async def get_watchlist_add_times(cls, db: AsyncSession, user_id: str) -> Dict[str, datetime]:
+        """
+        获取用户关注的股票代码及添加时间，按添加时间倒序
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            Dict[str, datetime]: 股票代码到添加时间的映射
+        """
+        result = await db.execute(
+            select(StockWatchlist.stock_code, StockWatchlist.add_time)
+            .where(StockWatchlist.user_id == user_id)
+            .order_by(StockWatchlist.add_time.desc())
+        )
+        return {row[0]: row[1] for row in result.all()}
+
     @classmethod
     async def get_user_watchlist(cls, db: AsyncSession, user_id: str) -> List[Dict[str, Any]]:
         """
@@ -154,16 +272,8 @@ class FollowDAO:
             List[Dict[str, Any]]: 用户关注的股票列表
         """
         try:
-            # 先从MySQL获取用户关注的股票代码
-            result = await db.execute(
-                select(StockWatchlist.stock_code, StockWatchlist.add_time)
-                .where(StockWatchlist.user_id == user_id)
-                .order_by(StockWatchlist.add_time.desc())
-            )
-            records = result.all()
-
-            # 创建股票代码到添加时间的映射字典
-            stock_code_to_add_time = {row[0]: row[1] for row in records}
+            # 先从MySQL获取用户关注的股票代码及添加时间
+            stock_code_to_add_time = await cls.get_watchlist_add_times(db, user_id)
             stock_codes = list(stock_code_to_add_time.keys())
 
             if not stock_codes:
@@ -191,6 +301,9 @@ class FollowDAO:
 
             # 将股票代码列表转为SQL IN子句格式
             codes_str = "', '".join(stock_codes)
+            lookback_start = TradingCalendarUtil.shift_trading_days(
+                TradingCalendarUtil.latest_trading_day(), cls.LATEST_PRICE_LOOKBACK_DAYS
+            )
 
             query = f"""
             WITH latest_dates AS (
@@ -199,6 +312,7 @@ class FollowDAO:
                     MAX(timestamps) as latest_date
                 FROM ods_stock.ll_stock_daily_sharing
                 WHERE code IN ('{codes_str}')
+                  AND timestamps >= toDate('{lookback_start}')
                 GROUP BY code
             )
             SELECT 
@@ -223,7 +337,7 @@ class FollowDAO:
                 END
             """
 
-            result = ck_util.query(query)
+            result = await ck_util.async_query(query)
 
             stocks = []
             for row in result.result_rows:
@@ -313,7 +427,7 @@ class FollowDAO:
             """
 
             # 使用 ck_util 中的连接池
-            result = ck_util.query(query)
+            result = await ck_util.async_query(query)
             return len(result.result_rows) > 0
 
         except Exception as e:
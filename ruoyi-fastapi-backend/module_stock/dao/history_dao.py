@@ -422,6 +422,52 @@ class HistoryDAO:
             logger.error(f"获取热门股票失败: {e}")
             raise
 
+    @classmethod
+    async def get_hot_queries(
+            cls,
+            db: AsyncSession,
+            since: datetime,
+            limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        获取查询次数最多的 股票 + 对比范围 组合及其查询过的日期范围
+
+        Args:
+            db: 数据库会话
+            since: 统计的起始查询时间
+            limit: 限制数量
+
+        Returns:
+            List[Dict]: 包含 stock_code、compare_scope、start_date（最早开始日期）、end_date（最晚结束日期）、
+                query_count 的列表，按查询次数降序排列
+        """
+        try:
+            query = select(
+                StockHistory.stock_code,
+                StockHistory.compare_scope,
+                func.min(StockHistory.start_date),
+                func.max(StockHistory.end_date),
+                func.count().label('query_count')
+            ).where(
+                StockHistory.query_time >= since
+            ).group_by(
+                StockHistory.stock_code,
+                StockHistory.compare_scope
+            ).order_by(func.count().desc()).limit(limit)
+
+            result = await db.execute(query)
+
+            return [{
+                'stock_code': row[0],
+                'compare_scope': row[1],
+                'start_date': row[2],
+                'end_date': row[3],
+                'query_count': row[4]
+            } for row in result]
+        except Exception as e:
+            logger.error(f"获取热门查询失败: {e}")
+            raise
+
     @classmethod
     async def get_recent_history(cls, db: AsyncSession, limit: int = 10) -> List[Dict[str, Any]]:
         """
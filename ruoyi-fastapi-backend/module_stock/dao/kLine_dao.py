@@ -1,14 +1,15 @@
-import asyncio
 import math
 import re
 
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import timedelta
 import logging
 from utils import ck_util
-from utils.data_util import convert_result_to_dataframe
+from utils.daily_replica_util import DailyBarReplica
+from utils.similarity_util import SectionPanel, masked_correlation
+from utils.trading_calendar_util import TradingCalendarUtil
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,11 @@ class KLineDAO:
     处理股票K线图数据的查询和相关计算
     """
 
+    # 相似股票计算中与目标股票的最少共同交易日数量
+    SIMILAR_MIN_OVERLAP = 30
+    # 返回的相似股票数量
+    SIMILAR_TOP_N = 10
+
     @classmethod
     async def fetch_stock_list(cls, page: int = 1, page_size: int = 20,
                                sort_by: str = 'seven_day_return',
@@ -38,9 +44,7 @@ class KLineDAO:
             Dict: 包含股票列表和总数的字典
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None,
+            return await ck_util.run_sync(
                 cls._fetch_stock_list_sync,
                 page,
                 page_size,
@@ -71,20 +75,10 @@ class KLineDAO:
             Dict: 包含股票列表和总数的字典
         """
         try:
-            # 先查询数据库中的最大日期
-            max_date_query = """
-            SELECT max(timestamps) as max_date
-            FROM ods_stock.ll_stock_daily_sharing
-            WHERE category = 'stock'
-            """
-
-            max_date_result = ck_util.query(max_date_query)
-            if max_date_result.result_rows and max_date_result.result_rows[0][0]:
-                # 获取数据库中的最大日期
-                max_date = max_date_result.result_rows[0][0]
-                end_date = max_date
-                start_date = (max_date - timedelta(days=30)).strftime('%Y-%m-%d')
-                seven_day_ago = (max_date - timedelta(days=7)).strftime('%Y-%m-%d')
+            # 从交易日历获取最新交易日，7日和30日前的锚点取不晚于该日期的最近交易日，避免落在周末或节假日
+            end_date = TradingCalendarUtil.latest_trading_day()
+            start_date = TradingCalendarUtil.trading_day_on_or_before(end_date - timedelta(days=30))
+            seven_day_ago = TradingCalendarUtil.trading_day_on_or_before(end_date - timedelta(days=7))
 
             # 构建关键词查询条件
             keyword_condition = ""
@@ -202,14 +196,12 @@ class KLineDAO:
             # 添加分页
             paginated_query = f"{query} LIMIT {page_size} OFFSET {(page - 1) * page_size}"
 
-            # 执行分页查询
-            result = ck_util.query(paginated_query)
             # 列名
             columns = ['code', 'name', 'price', 'change_rate', 'volume', 'high', 'low', 'open', 'pre_close',
                        'seven_day_return', 'thirty_day_return']
 
-            # 将查询结果转换为DataFrame
-            df = convert_result_to_dataframe(result, columns)
+            # 执行分页查询，列式查询直接得到按列构建的DataFrame
+            df = ck_util.query_df(paginated_query, columns)
 
             # 处理 NaN 值
             df = df.replace({np.nan: None})
@@ -237,6 +229,95 @@ class KLineDAO:
             logger.error(f"执行股票列表查询出错: {e}")
             raise
 
+    @classmethod
+    async def fetch_market_snapshot(cls, latest_date: str, seven_day_ago: str, thirty_day_ago: str,
+                                    window_start: str) -> pd.DataFrame:
+        """
+        异步获取全市场行情快照
+
+        Args:
+            latest_date: 最新交易日
+            seven_day_ago: 7日收益率的锚点交易日
+            thirty_day_ago: 30日收益率的锚点交易日
+            window_start: 扫描窗口的开始日期，需早于30日锚点以覆盖停牌股票
+
+        Returns:
+            pd.DataFrame: 每只证券一行的行情快照
+        """
+        try:
+            return await ck_util.run_sync(
+                cls._fetch_market_snapshot_sync,
+                latest_date,
+                seven_day_ago,
+                thirty_day_ago,
+                window_start
+            )
+        except Exception as e:
+            logger.error(f"获取行情快照出错: {e}")
+            raise
+
+    @classmethod
+    def _fetch_market_snapshot_sync(cls, latest_date: str, seven_day_ago: str, thirty_day_ago: str,
+                                    window_start: str) -> pd.DataFrame:
+        """
+        同步方法获取全市场行情快照
+
+        一次扫描最近一段时间的日线，按证券聚合出最新一根K线，
+        以及不晚于7日、30日锚点的最近收盘价，并关联证券名称
+
+        Args:
+            latest_date: 最新交易日
+            seven_day_ago: 7日收益率的锚点交易日
+            thirty_day_ago: 30日收益率的锚点交易日
+            window_start: 扫描窗口的开始日期
+
+        Returns:
+            pd.DataFrame: 每只证券一行的行情快照
+        """
+        query = f"""
+        SELECT
+            d.code AS code,
+            d.category AS category,
+            s.SecuName AS name,
+            d.latest_date AS latest_date,
+            d.open AS open,
+            d.close AS close,
+            d.high AS high,
+            d.low AS low,
+            d.pre_close AS pre_close,
+            d.volume AS volume,
+            d.amount AS amount,
+            d.price_7d_ago AS price_7d_ago,
+            d.price_30d_ago AS price_30d_ago
+        FROM (
+            SELECT
+                code,
+                category,
+                max(timestamps) AS latest_date,
+                argMax(open, timestamps) AS open,
+                argMax(close, timestamps) AS close,
+                argMax(high, timestamps) AS high,
+                argMax(low, timestamps) AS low,
+                argMax(ycp, timestamps) AS pre_close,
+                argMax(vol, timestamps) AS volume,
+                argMax(amount, timestamps) AS amount,
+                argMaxIf(close, timestamps, timestamps <= toDate('{seven_day_ago}')) AS price_7d_ago,
+                argMaxIf(close, timestamps, timestamps <= toDate('{thirty_day_ago}')) AS price_30d_ago
+            FROM ods_stock.ll_stock_daily_sharing
+            WHERE timestamps >= toDate('{window_start}')
+              AND timestamps <= toDate('{latest_date}')
+            GROUP BY code, category
+        ) d
+        LEFT JOIN (
+            SELECT SecuCode, any(SecuName) AS SecuName
+            FROM events_temp.lc_csiinduspe
+            GROUP BY SecuCode
+        ) s ON d.code = s.SecuCode
+        """
+        columns = ['code', 'category', 'name', 'latest_date', 'open', 'close', 'high', 'low', 'pre_close',
+                   'volume', 'amount', 'price_7d_ago', 'price_30d_ago']
+        return ck_util.query_df(query, columns)
+
     @classmethod
     async def load_kline_data(cls, stock_code: str, time_range: str = 'day',
                               data_type: Optional[str] = None) -> Dict[str, Any]:
@@ -252,9 +333,7 @@ class KLineDAO:
             Dict: K线图数据
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None,
+            return await ck_util.run_sync(
                 cls._load_kline_data_sync,
                 stock_code,
                 time_range,
@@ -303,21 +382,8 @@ class KLineDAO:
             return empty_result
 
         try:
-            # 查询最大日期
-            max_date_query = """
-                    SELECT max(timestamps) as max_date
-                    FROM ods_stock.ll_stock_daily_sharing
-                    WHERE category = 'stock'
-                    """
-            max_date_result = ck_util.query(max_date_query)
-
-            # 安全地获取和处理最大日期
-            if not max_date_result or not max_date_result.result_rows:
-                logger.error("无法获取最大日期")
-                return empty_result
-
-            # 确保end_date是datetime对象
-            end_date = max_date_result.result_rows[0][0]
+            # 从交易日历获取最新交易日
+            end_date = TradingCalendarUtil.latest_trading_day()
 
             # 计算开始日期
             date_ranges = {
@@ -347,9 +413,14 @@ class KLineDAO:
             ORDER BY timestamps ASC
             """
 
-            result = ck_util.query(query)
             columns = ['code', 'open', 'close', 'high', 'low', 'ycp', 'vol', 'date']
-            df = convert_result_to_dataframe(result, columns)
+            if DailyBarReplica.enabled():
+                # 优先读取日线本地副本，副本未覆盖的日期区间回源 ClickHouse
+                df = DailyBarReplica.query_daily([stock_code], start_date, end_date).rename(
+                    columns={'timestamps': 'date'})
+            else:
+                # 列式查询，直接得到按列构建的DataFrame
+                df = ck_util.query_df(query, columns)
 
             # 确保数值列是数值类型
             for col in ['open', 'close', 'high', 'low', 'vol']:
@@ -425,9 +496,7 @@ class KLineDAO:
             List[Dict]: 相似股票列表
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None,
+            return await ck_util.run_sync(
                 cls._find_similar_stocks_sync,
                 stock_code
             )
@@ -447,9 +516,10 @@ class KLineDAO:
             List[Dict]: 相似股票列表
         """
         try:
-            # 获取目标股票最近90天的收盘价数据
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
+            # 获取目标股票截至最新交易日最近90天的收盘价数据
+            end_date_dt = TradingCalendarUtil.latest_trading_day()
+            end_date = end_date_dt.strftime('%Y-%m-%d')
+            start_date = (end_date_dt - timedelta(days=90)).strftime('%Y-%m-%d')
 
             target_query = f"""
             SELECT 
@@ -464,142 +534,117 @@ class KLineDAO:
             ORDER BY timestamps ASC
             """
 
-            target_result = ck_util.query(target_query)
-            target_df = convert_result_to_dataframe(target_result, ['code', 'close', 'timestamps'])
+            target_df = ck_util.query_df(target_query, ['code', 'close', 'timestamps'])
 
             if target_df.empty:
                 logger.warning(f"未找到股票代码 {stock_code} 的数据")
                 return []
 
-            # 获取所有股票最近90天的收盘价数据
+            # 获取所有股票最近90天的收盘价数据，股票名称只为最终命中的股票查询
             all_stocks_query = f"""
             SELECT 
-                d.code,
-                s.SecuName as name,
-                d.close,
-                d.timestamps
-            FROM ods_stock.ll_stock_daily_sharing d
-            LEFT JOIN events_temp.lc_csiinduspe s ON d.code = s.SecuCode
-            WHERE d.category = 'stock'
-              AND d.timestamps >= toDate('{start_date}')
-              AND d.timestamps <= toDate('{end_date}')
-              AND d.code != '{stock_code}'
-            ORDER BY d.code, d.timestamps ASC
+                code,
+                close,
+                timestamps
+            FROM ods_stock.ll_stock_daily_sharing
+            WHERE category = 'stock'
+              AND timestamps >= toDate('{start_date}')
+              AND timestamps <= toDate('{end_date}')
+              AND code != '{stock_code}'
+            ORDER BY code, timestamps ASC
             """
 
-            all_stocks_result = ck_util.query(all_stocks_query)
-            all_stocks_df = convert_result_to_dataframe(all_stocks_result, ['code', 'name', 'close', 'timestamps'])
-
-            # 计算与目标股票的相似度
-            similar_stocks = []
-
-            # 数据透视表以获取每个股票的时间序列
-            pivot_df = all_stocks_df.pivot(index='timestamps', columns='code', values='close')
-
-            # 获取目标股票的时间序列
-            target_series = pd.Series(target_df['close'].values, index=target_df['timestamps'])
-
-            # 获取不重复的股票代码和名称
-            stocks_info = all_stocks_df[['code', 'name']].drop_duplicates()
-
-            # 计算相关系数
-            for stock_code in pivot_df.columns:
-                stock_series = pivot_df[stock_code].dropna()
-
-                # 确保有足够的数据进行比较
-                if len(stock_series) < 30:
-                    continue
-
-                # 对齐时间序列
-                common_idx = stock_series.index.intersection(target_series.index)
-                if len(common_idx) < 30:
-                    continue
-
-                stock_aligned = stock_series.loc[common_idx]
-                target_aligned = target_series.loc[common_idx]
-
-                # 计算相关系数
-                correlation = stock_aligned.corr(target_aligned)
-
-                # 计算相似度分数 (0-1之间，越接近1表示越相似)
-                similarity = (correlation + 1) / 2
-
-                if not np.isnan(similarity) and similarity > 0.7:  # 只保留相似度高于0.7的股票
-                    stock_name = stocks_info.loc[stocks_info['code'] == stock_code, 'name'].iloc[0] if not \
-                    stocks_info.loc[stocks_info['code'] == stock_code].empty else ''
-
-                    # 计算7日和30日收益率
-                    end_date_dt = datetime.now()
-                    seven_day_ago = (end_date_dt - timedelta(days=7)).strftime('%Y-%m-%d')
-                    thirty_day_ago = (end_date_dt - timedelta(days=30)).strftime('%Y-%m-%d')
-
-                    returns_query = f"""
-                    WITH 
-                        latest AS (
-                            SELECT 
-                                close as latest_price
-                            FROM ods_stock.ll_stock_daily_sharing
-                            WHERE code = '{stock_code}'
-                              AND category = 'stock'
-                              AND timestamps <= toDate('{end_date}')
-                            ORDER BY timestamps DESC
-                            LIMIT 1
-                        ),
-                        seven_day AS (
-                            SELECT 
-                                close as price_7d_ago
-                            FROM ods_stock.ll_stock_daily_sharing
-                            WHERE code = '{stock_code}'
-                              AND category = 'stock'
-                              AND timestamps <= toDate('{seven_day_ago}')
-                            ORDER BY timestamps DESC
-                            LIMIT 1
-                        ),
-                        thirty_day AS (
-                            SELECT 
-                                close as price_30d_ago
-                            FROM ods_stock.ll_stock_daily_sharing
-                            WHERE code = '{stock_code}'
-                              AND category = 'stock'
-                              AND timestamps <= toDate('{thirty_day_ago}')
-                            ORDER BY timestamps DESC
-                            LIMIT 1
-                        )
-                    SELECT 
-                        l.latest_price,
-                        s.price_7d_ago,
-                        t.price_30d_ago
-                    FROM latest l, seven_day s, thirty_day t
-                    """
-
-                    returns_result = ck_util.query(returns_query)
+            all_stocks_df = ck_util.query_df(all_stocks_query, ['code', 'close', 'timestamps'])
 
-                    seven_day_return = None
-                    thirty_day_return = None
+            # 按目标股票的交易日对齐为 股票 × 交易日 的面板，一次性计算所有股票与目标股票的相关系数，
+            # 共同交易日不足 SIMILAR_MIN_OVERLAP 天的股票不参与比较
+            target_dates = pd.DatetimeIndex(pd.to_datetime(target_df['timestamps']))
+            panel = SectionPanel.from_frame(all_stocks_df, target_dates)
+            target_close = pd.to_numeric(target_df['close'], errors='coerce').to_numpy(dtype=float)
+            correlation = masked_correlation(target_close, panel.values['close'], panel.mask, cls.SIMILAR_MIN_OVERLAP)
 
-                    if returns_result:
-                        latest_price, price_7d_ago, price_30d_ago = returns_result[0]
+            # 计算相似度分数 (0-1之间，越接近1表示越相似)，只保留相似度高于0.7的股票，按相似度降序取前10个
+            similarity = (correlation + 1) / 2
+            hits = np.flatnonzero(similarity > 0.7)
+            top = hits[np.argsort(-similarity[hits], kind='stable')][:cls.SIMILAR_TOP_N]
+            if len(top) == 0:
+                return []
 
-                        if price_7d_ago and price_7d_ago != 0:
-                            seven_day_return = (latest_price - price_7d_ago) / price_7d_ago * 100
+            # 名称及7日、30日收益率，锚点取不晚于该日期的最近交易日，所有命中的股票合并为一次查询
+            top_codes = [str(code) for code in panel.codes[top]]
+            seven_day_ago = TradingCalendarUtil.trading_day_on_or_before(end_date_dt - timedelta(days=7))
+            thirty_day_ago = TradingCalendarUtil.trading_day_on_or_before(end_date_dt - timedelta(days=30))
+            details = cls._fetch_similar_stock_details_sync(top_codes, start_date, end_date, seven_day_ago,
+                                                            thirty_day_ago)
 
-                        if price_30d_ago and price_30d_ago != 0:
-                            thirty_day_return = (latest_price - price_30d_ago) / price_30d_ago * 100
+            similar_stocks = []
+            for index, code in zip(top, top_codes):
+                name, seven_day_return, thirty_day_return = details.get(code, ('', None, None))
+                similar_stocks.append({
+                    'code': code,
+                    'name': name,
+                    'similarity': float(similarity[index]),
+                    'correlation': float(correlation[index]),
+                    'seven_day_return': seven_day_return,
+                    'thirty_day_return': thirty_day_return
+                })
+            return similar_stocks
+        except Exception as e:
+            logger.error(f"执行相似股票查询出错: {e}")
+            raise
 
-                    similar_stocks.append({
-                        'code': stock_code,
-                        'name': stock_name,
-                        'similarity': similarity,
-                        'correlation': correlation,
-                        'seven_day_return': seven_day_return,
-                        'thirty_day_return': thirty_day_return
-                    })
+    @classmethod
+    def _fetch_similar_stock_details_sync(cls, stock_codes: List[str], window_start: str, end_date: str,
+                                          seven_day_ago: str, thirty_day_ago: str) -> Dict[str, Tuple]:
+        """
+        一次查询多只股票的名称及7日、30日收益率
 
-            # 按相似度降序排序
-            similar_stocks.sort(key=lambda x: x['similarity'], reverse=True)
+        Args:
+            stock_codes: 股票代码列表
+            window_start: 扫描窗口的开始日期
+            end_date: 最新交易日
+            seven_day_ago: 7日收益率的锚点交易日
+            thirty_day_ago: 30日收益率的锚点交易日
 
-            # 取前10个最相似的股票
-            return similar_stocks[:10]
-        except Exception as e:
-            logger.error(f"执行相似股票查询出错: {e}")
-            raise
\ No newline at end of file
+        Returns:
+            Dict[str, Tuple]: 股票代码到 (名称, 7日收益率, 30日收益率) 的映射，收益率无法计算时为None
+        """
+        codes_str = ', '.join(f"'{code}'" for code in stock_codes)
+        query = f"""
+        SELECT
+            d.code,
+            s.SecuName,
+            d.latest_price,
+            d.price_7d_ago,
+            d.price_30d_ago
+        FROM (
+            SELECT
+                code,
+                argMax(close, timestamps) AS latest_price,
+                argMaxIf(close, timestamps, timestamps <= toDate('{seven_day_ago}')) AS price_7d_ago,
+                argMaxIf(close, timestamps, timestamps <= toDate('{thirty_day_ago}')) AS price_30d_ago
+            FROM ods_stock.ll_stock_daily_sharing
+            WHERE code IN ({codes_str})
+              AND category = 'stock'
+              AND timestamps >= toDate('{window_start}')
+              AND timestamps <= toDate('{end_date}')
+            GROUP BY code
+        ) d
+        LEFT JOIN (
+            SELECT SecuCode, any(SecuName) AS SecuName
+            FROM events_temp.lc_csiinduspe
+            WHERE SecuCode IN ({codes_str})
+            GROUP BY SecuCode
+        ) s ON d.code = s.SecuCode
+        """
+        details = {}
+        for code, name, latest_price, price_7d_ago, price_30d_ago in ck_util.query(query).result_rows:
+            seven_day_return = None
+            thirty_day_return = None
+            if latest_price is not None:
+                if price_7d_ago:
+                    seven_day_return = (latest_price - price_7d_ago) / price_7d_ago * 100
+                if price_30d_ago:
+                    thirty_day_return = (latest_price - price_30d_ago) / price_30d_ago * 100
+            details[code] = (name or '', seven_day_return, thirty_day_return)
+        return details
@@ -4,9 +4,10 @@ import pandas as pd
 from entity.vo.kLine_vo import StockBase
 from module_stock.entity.vo.similar_vo import *
 import logging
-import asyncio
 from utils import ck_util
-from utils.data_util import convert_result_to_dataframe
+from utils.daily_replica_util import DailyBarReplica
+from utils.data_util import normalize_daily_frame
+from utils.trading_calendar_util import TradingCalendarUtil
 logger = logging.getLogger(__name__)
 
 
@@ -27,9 +28,8 @@ class SimilarDao:
             pd.DataFrame: 包含多只股票数据的DataFrame
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_section_stock_info_sync, section_code_list, start_date,
-                                              end_date)
+            return await ck_util.run_sync(cls._get_section_stock_info_sync, section_code_list, start_date,
+                                          end_date)
         except Exception as e:
             logger.error(f"获取板块股票数据出错: {e}")
             raise
@@ -54,6 +54,10 @@ class SimilarDao:
                 logger.warning("股票代码列表为空")
                 return pd.DataFrame(columns=COLUMNS_TO_READ)
 
+            if DailyBarReplica.enabled():
+                # 优先读取日线本地副本，副本未覆盖的日期区间回源 ClickHouse
+                return normalize_daily_frame(DailyBarReplica.query_daily(section_code_list, start_date, end_date))
+
             query = f"""
             SELECT 
                 code,
@@ -72,9 +76,8 @@ class SimilarDao:
             ORDER BY code, timestamps
             """
 
-            result = ck_util.query(query)
-            # 将查询结果转换为 Pandas DataFrame
-            return convert_result_to_dataframe(result, COLUMNS_TO_READ)
+            # 列式查询，直接得到按列构建的 DataFrame，统一压缩列类型
+            return normalize_daily_frame(ck_util.query_df(query, COLUMNS_TO_READ))
         except Exception as e:
             logger.error(f"执行板块股票数据查询出错: {e}")
             raise
@@ -90,8 +93,7 @@ class SimilarDao:
             Dict[str, Any]: 股票基本信息
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stock_info_sync, stock_code)
+            return await ck_util.run_sync(cls._get_stock_info_sync, stock_code)
         except Exception as e:
             logger.error(f"获取股票信息出错 {stock_code}: {e}")
             raise
@@ -150,8 +152,7 @@ class SimilarDao:
             pd.DataFrame: 股票历史数据
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stock_data_sync, stock_code, start_date, end_date)
+            return await ck_util.run_sync(cls._get_stock_data_sync, stock_code, start_date, end_date)
         except Exception as e:
             logger.error(f"获取股票数据出错 {stock_code}: {e}")
             raise
@@ -187,17 +188,21 @@ class SimilarDao:
             ORDER BY timestamps
             """
 
-            logger.info(f"执行查询: {query}")
-            result = ck_util.query(query)
-
-            # 使用参考文件中的方法转换为DataFrame
-            df = convert_result_to_dataframe(result, COLUMNS_TO_READ)
+            if DailyBarReplica.enabled():
+                # 优先读取日线本地副本，副本未覆盖的日期区间回源 ClickHouse
+                df = DailyBarReplica.query_daily([stock_code], start_date, end_date)
+            else:
+                logger.info(f"执行查询: {query}")
+                # 列式查询，直接得到按列构建的 DataFrame
+                df = ck_util.query_df(query, COLUMNS_TO_READ)
 
             if df.empty:
                 logger.warning(f"未找到股票数据: {stock_code}")
                 # 返回空的DataFrame
                 return pd.DataFrame()
 
+            # 与板块行情使用相同的列类型，基准股票与候选股票按相同的精度计算
+            df = normalize_daily_frame(df)
             # 设置日期为索引
             if 'timestamps' in df.columns:
                 df.rename(columns={'timestamps': 'date'}, inplace=True)
@@ -225,8 +230,7 @@ class SimilarDao:
             pd.DataFrame: 行业分类数据
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stock_nums_sync, stock_code, section_level)
+            return await ck_util.run_sync(cls._get_stock_nums_sync, stock_code, section_level)
         except Exception as e:
             logger.error(f"获取股票行业分类数据出错 {stock_code}: {e}")
             raise
@@ -240,11 +244,8 @@ class SimilarDao:
         SELECT * FROM events_temp.lc_csiinduspe WHERE SecuCode = '{stock_code}'
         """
 
-        result = ck_util.query(query)
-        # 将查询结果转换为 Pandas DataFrame
-        df = pd.DataFrame(result.result_rows, columns=result.column_names)
-
-        return df
+        # 列式查询，直接得到按列构建的 DataFrame
+        return ck_util.query_df(query)
 
     @classmethod
     async def get_stock(cls, stock_code: str, code: str, board: int, code_type: str, is_st: int) -> tuple:
@@ -261,8 +262,7 @@ class SimilarDao:
             tuple: 包含股票代码列表和股票名称列表的元组
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stock_sync, stock_code, code, board, code_type, is_st)
+            return await ck_util.run_sync(cls._get_stock_sync, stock_code, code, board, code_type, is_st)
         except Exception as e:
             logger.error(
                 f"获取股票列表出错，参数：stock_code={stock_code}, code={code}, board={board}, code_type={code_type}, is_st={is_st}: {e}")
@@ -282,9 +282,8 @@ class SimilarDao:
                     f"SELECT SecuName,SecuCode FROM events_temp.lc_csiinduspe WHERE {column_name} = '{code}' AND board = {board} AND NOT "
                     f"(SecuName LIKE 'ST%' OR SecuName LIKE '*ST%');")
 
-            result = ck_util.query(query)
-            # 将查询结果转换为 Pandas DataFrame
-            df = pd.DataFrame(result.result_rows, columns=result.column_names).pipe(
+            # 列式查询，直接得到按列构建的 DataFrame
+            df = ck_util.query_df(query, ['SecuName', 'SecuCode']).pipe(
                 lambda x: x[x['SecuCode'] != stock_code]).reset_index(drop=True)
 
             stock_code_list = df['SecuCode'].tolist()
@@ -294,6 +293,58 @@ class SimilarDao:
         except Exception as e:
             logger.error(f"执行股票查询出错: {e}")
             raise
+
+    @classmethod
+    async def get_security_master(cls) -> pd.DataFrame:
+        """获取全部股票的证券主数据（名称、板块、中证行业分类）
+
+        Returns:
+            pd.DataFrame: 包含 SecuCode、SecuName、board、CSIIndusCode、FirstIndustryCode 的数据
+        """
+        try:
+            return await ck_util.run_sync(cls._get_security_master_sync)
+        except Exception as e:
+            logger.error(f"获取证券主数据出错: {e}")
+            raise
+
+    @classmethod
+    def _get_security_master_sync(cls) -> pd.DataFrame:
+        """同步方法获取全部股票的证券主数据"""
+        query = """
+        SELECT SecuCode, SecuName, board, CSIIndusCode, FirstIndustryCode
+        FROM events_temp.lc_csiinduspe
+        """
+
+        # 列式查询，直接得到按列构建的 DataFrame
+        return ck_util.query_df(query)
+
+    @classmethod
+    def get_market_daily_sync(cls, start_date: str, end_date: str) -> pd.DataFrame:
+        """同步方法获取全市场股票在 [start_date, end_date] 内的日线行情，用于写入逐日特征库
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            pd.DataFrame: 包含 code、open、close、high、low、ycp、vol、timestamps 的长表
+        """
+        if DailyBarReplica.enabled():
+            return DailyBarReplica.query_daily(None, start_date, end_date)
+
+        COLUMNS_TO_READ = ['code', 'open', 'close', 'high', 'low', 'ycp', 'vol', 'timestamps']
+        query = f"""
+        SELECT code, open, close, high, low, ycp, vol, timestamps
+        FROM ods_stock.ll_stock_daily_sharing
+        WHERE category = 'stock'
+            AND timestamps >= toDate('{start_date}')
+            AND timestamps <= toDate('{end_date}')
+        ORDER BY timestamps, code
+        """
+
+        # 列式查询，直接得到按列构建的 DataFrame
+        return ck_util.query_df(query, COLUMNS_TO_READ)
+
     @classmethod
     async def get_stock_data_before_event(cls, stock_code: str, ts_time: str, day_far: int,
                                           day_near: int) -> pd.DataFrame:
@@ -302,16 +353,15 @@ class SimilarDao:
         Args:
             stock_code: 股票代码
             ts_time: 事件时间
-            day_far: 最远时间间隔天数
-            day_near: 最近时间间隔天数
+            day_far: 最远时间间隔交易日数
+            day_near: 最近时间间隔交易日数
 
         Returns:
             pd.DataFrame: 股票历史数据
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stock_data_before_event_sync, stock_code, ts_time, day_far,
-                                              day_near)
+            return await ck_util.run_sync(cls._get_stock_data_before_event_sync, stock_code, ts_time, day_far,
+                                          day_near)
         except Exception as e:
             logger.error(f"获取事件前股票数据出错 {stock_code}: {e}")
             raise
@@ -323,13 +373,13 @@ class SimilarDao:
         COLUMNS_TO_READ = ['code', 'open', 'close', 'high', 'low', 'ycp', 'vol', 'timestamps']
         security_id = str(stock_code)
 
+        # 按交易日计算查询的开始日期和结束日期
+        start_date = TradingCalendarUtil.shift_trading_days(ts_time, day_far)
+        end_date = TradingCalendarUtil.shift_trading_days(ts_time, day_near)
+        if start_date is None or end_date is None:
+            return pd.DataFrame(columns=COLUMNS_TO_READ).rename(columns={'timestamps': 'date'}).set_index('date')
+
         query = f"""
-        WITH
-        -- 计算查询的开始日期和结束日期
-        date_range AS (
-              SELECT addDays(toDate('{ts_time}'), -{day_far}) AS start_date,
-                   addDays(toDate('{ts_time}'), -{day_near}) AS end_date
-        )
         SELECT 
             code,
             open,
@@ -342,14 +392,13 @@ class SimilarDao:
         FROM ods_stock.ll_stock_daily_sharing
         WHERE code = '{security_id}'
             AND category = 'stock'
-            AND timestamps > (SELECT start_date FROM date_range)
-            AND timestamps <= (SELECT end_date FROM date_range)
+            AND timestamps > toDate('{start_date}')
+            AND timestamps <= toDate('{end_date}')
         ORDER BY timestamps
         """
 
-        result = ck_util.query(query)
-        # 将查询结果转换为 Pandas DataFrame
-        df = convert_result_to_dataframe(result, COLUMNS_TO_READ)
+        # 列式查询，直接得到按列构建的 DataFrame
+        df = ck_util.query_df(query, COLUMNS_TO_READ)
 
         # 设置日期为索引
         if 'timestamps' in df.columns:
@@ -368,16 +417,15 @@ class SimilarDao:
         Args:
             section_code_list: 股票代码列表
             ts_time: 事件时间
-            day_far: 最远时间间隔天数
-            day_near: 最近时间间隔天数
+            day_far: 最远时间间隔交易日数
+            day_near: 最近时间间隔交易日数
 
         Returns:
             pd.DataFrame: 股票历史数据
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_section_stock_data_sync, section_code_list, ts_time,
-                                              day_far, day_near)
+            return await ck_util.run_sync(cls._get_section_stock_data_sync, section_code_list, ts_time,
+                                          day_far, day_near)
         except Exception as e:
             logger.error(f"获取一组股票数据出错: {e}")
             raise
@@ -388,13 +436,13 @@ class SimilarDao:
         """同步方法获取一组股票在特定时间段的数据"""
         COLUMNS_TO_READ = ['code', 'open', 'close', 'high', 'low', 'ycp', 'vol', 'timestamps']
 
+        # 按交易日计算查询的开始日期和结束日期
+        start_date = TradingCalendarUtil.shift_trading_days(ts_time, day_far)
+        end_date = TradingCalendarUtil.shift_trading_days(ts_time, day_near)
+        if start_date is None or end_date is None:
+            return pd.DataFrame(columns=COLUMNS_TO_READ).rename(columns={'timestamps': 'date'}).set_index('date')
+
         query = f"""
-         WITH
-        -- 计算查询的开始日期和结束日期
-        date_range AS (
-            SELECT addDays(toDate('{ts_time}'), -{day_far}) AS start_date,
-                   addDays(toDate('{ts_time}'), -{day_near}) AS end_date
-        )
         SELECT 
             code,
             open,
@@ -407,14 +455,13 @@ class SimilarDao:
         FROM ods_stock.ll_stock_daily_sharing
         WHERE code IN ({', '.join(f"'{code}'" for code in section_code_list)})
             AND category ='stock'
-            AND timestamps >= (SELECT start_date FROM date_range)
-            AND timestamps <= (SELECT end_date FROM date_range)
+            AND timestamps >= toDate('{start_date}')
+            AND timestamps <= toDate('{end_date}')
         ORDER BY code, timestamps
         """
 
-        result = ck_util.query(query)
-        # 将查询结果转换为 Pandas DataFrame
-        df = convert_result_to_dataframe(result, COLUMNS_TO_READ)
+        # 列式查询，直接得到按列构建的 DataFrame
+        df = ck_util.query_df(query, COLUMNS_TO_READ)
 
         # 设置日期为索引
         if 'timestamps' in df.columns:
@@ -438,8 +485,7 @@ class SimilarDao:
             pd.DataFrame: 包含股票代码和相应时间点数据的DataFrame
         """
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._calculate_rate_by_stock_list_sync, stock_code_list, timestamps)
+            return await ck_util.run_sync(cls._calculate_rate_by_stock_list_sync, stock_code_list, timestamps)
         except Exception as e:
             logger.error(f"根据股票列表计算收益率出错: {e}")
             raise
@@ -458,24 +504,25 @@ class SimilarDao:
         else:
             timestamps_str = str(tuple(timestamps))
 
-        all_data_frames = []
-        for stock_code in stock_code_list:
-            query = f"""
-            SELECT {', '.join(COLUMNS_TO_READ)}
-            FROM ods_stock.ll_stock_daily_sharing
-            WHERE code = '{stock_code}' AND timestamps IN {timestamps_str} AND category = 'stock'
-            ORDER BY code, timestamps
-            """
+        if not stock_code_list:
+            return pd.DataFrame(columns=COLUMNS_TO_READ)
 
-            result = ck_util.query(query)
-            if result.result_rows:
-                df = pd.DataFrame(result.result_rows, columns=result.column_names)
-                all_data_frames.append(df)
+        # 一次列式查询取回所有股票的数据
+        query = f"""
+        SELECT {', '.join(COLUMNS_TO_READ)}
+        FROM ods_stock.ll_stock_daily_sharing
+        WHERE code IN ({', '.join(f"'{code}'" for code in stock_code_list)})
+            AND timestamps IN {timestamps_str} AND category = 'stock'
+        ORDER BY code, timestamps
+        """
 
-        if not all_data_frames:
-            return pd.DataFrame(columns=COLUMNS_TO_READ)
+        combined_df = ck_util.query_df(query, COLUMNS_TO_READ)
+        if combined_df.empty:
+            return combined_df
 
-        combined_df = pd.concat(all_data_frames)
+        # 按传入的股票顺序排列
+        order = {code: i for i, code in enumerate(stock_code_list)}
+        combined_df = combined_df.sort_values('code', key=lambda codes: codes.map(order), kind='stable')
         combined_df['timestamps'] = pd.to_datetime(combined_df['timestamps']).dt.strftime('%Y-%m-%d')
         combined_df = combined_df.reset_index(drop=True)
 
@@ -527,8 +574,7 @@ class SimilarDao:
             LIMIT 20
             """
             logger.info(f"执行历史模糊查询: {query}")
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, ck_util.query, query)
+            result = await ck_util.async_query(query)
 
             stock_list = []
             for row in result.result_rows:
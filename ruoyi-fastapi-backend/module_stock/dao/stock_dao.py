@@ -1,9 +1,6 @@
-import clickhouse_connect
 from entity.do.stock_do import StockInfo
-from config.env import ClickHouseConfig
+from utils import ck_util
 import logging
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +9,8 @@ class StockDao:
     @classmethod
     async def get_stock_list(cls):
         try:
-            # 使用线程池执行同步数据库操作
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls._get_stock_list_sync)
+            # 使用ClickHouse专用线程池执行同步数据库操作
+            return await ck_util.run_sync(cls._get_stock_list_sync)
         except Exception as e:
             logger.error(f"Failed to get stock list: {e}")
             return []
@@ -23,31 +19,22 @@ class StockDao:
     @classmethod
     def _get_stock_list_sync(cls):
         try:
-            # 创建clickhouse_connect客户端
-            client = clickhouse_connect.get_client(
-                host=ClickHouseConfig.ck_host,
-                port=ClickHouseConfig.ck_port,  # 使用HTTP端口
-                username=ClickHouseConfig.ck_username,
-                password=ClickHouseConfig.ck_password,
-                connect_timeout=ClickHouseConfig.ck_connect_timeout
-            )
-
             # 先检查表是否存在
             check_query = "SHOW TABLES FROM ods_stock"
-            tables_result = client.query(check_query)
+            tables_result = ck_util.query(check_query)
             tables = tables_result.result_rows
             logger.info(f"Available tables in ods_stock: {tables}")
 
             # 然后检查表中是否有数据
             count_query = "SELECT COUNT() FROM ods_stock.ll_stock_daily_sharing"
-            count_result = client.query(count_query)
+            count_result = ck_util.query(count_query)
             count = count_result.result_rows[0][0]
             logger.info(f"Record count in ll_stock_daily_sharing: {count}")
 
             # 原始查询
             query = "SELECT code, open, close, high, low, ycp, vol, timestamps FROM ods_stock.ll_stock_daily_sharing LIMIT 10"
             logger.info(f"Executing query: {query}")
-            result = client.query(query)
+            result = ck_util.query(query)
             rows = result.result_rows
             logger.info(f"Query result (first few records): {rows[:5] if rows else '[]'}")
 
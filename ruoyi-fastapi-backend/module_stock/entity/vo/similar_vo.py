@@ -8,10 +8,11 @@ class StockSimilarityRequest(BaseModel):
     stockCode: str  # 股票代码
     startDate: str  # 开始日期
     endDate: str  # 结束日期
-    sectionLevel: int #选择的行业细分
+    sectionLevel: int #选择的行业细分：1 中证三级行业，0 证监会一级行业，2 全市场
     indicators: List[str]  # 选择的指标
     similarityMethod: str  # 相似性计算方法
     similarCount: int  # 返回相似股票的数量
+    dtwWindow: Optional[int] = None  # DTW的Sakoe-Chiba窗口宽度（交易日），为空时不限制
 
     class Config:
         json_schema_extra = {
@@ -22,6 +23,7 @@ class StockSimilarityRequest(BaseModel):
                 "sectionLevel": 1,
                 "indicators": ["close", "high", "low", "turnover"],
                 "similarityMethod": "dtw",
+                "dtwWindow": 10,
                 "useLLM": True,
                 "similar_count": 5
             }
@@ -52,6 +54,62 @@ class PerformanceData(BaseModel):
 class StockSimilarityResponse(BaseModel):
     similarStocks: List[SimilarStock]
     performanceData: PerformanceData
+    candidateCount: int = 0  # 参与比较的候选股票数量
+    prunedCount: int = 0  # DTW下界剪枝跳过的候选股票数量
+    abandonedCount: int = 0  # DTW计算中提前放弃的候选股票数量
+
+
+# 流式计算的部分结果模型
+class SimilarityPartialResult(BaseModel):
+    similarStocks: List[SimilarStock]  # 已计算部分中的前K个相似股票
+    scoredCount: int = 0  # 已计算的候选股票数量
+    candidateCount: int = 0  # 候选股票总数
+
+
+# 流式计算的错误事件模型
+class SimilarityStreamError(BaseModel):
+    message: str
+
+
+# 异步计算任务提交响应模型
+class SimilarityJobSubmitResponse(BaseModel):
+    jobId: str
+
+
+# 异步计算任务状态模型
+class SimilarityJobStatus(BaseModel):
+    jobId: str
+    status: str  # 任务状态：queued 排队中，running 计算中，done 已完成，failed 失败
+    progress: int = 0  # 已计算候选股票的百分比
+    scoredCount: int = 0  # 已计算的候选股票数量
+    candidateCount: int = 0  # 候选股票总数
+    message: Optional[str] = None  # 失败原因
+    historyId: Optional[int] = None  # 完成后写入的查询历史ID
+    createTime: Optional[str] = None
+    updateTime: Optional[str] = None
+
+
+# 形态搜索请求模型
+class PatternSearchRequest(BaseModel):
+    stockCode: str  # 基准股票代码
+    startDate: str  # 基准形态的开始日期
+    endDate: str  # 基准形态的结束日期
+    sectionLevel: int = 1  # 搜索范围，与相似性计算相同
+    historyStartDate: Optional[str] = None  # 搜索历史的开始日期，为空时为基准形态结束日期的5年前
+    historyEndDate: Optional[str] = None  # 搜索历史的结束日期，为空时为最新交易日
+    topK: int = 10  # 返回的匹配数量
+
+
+class PatternMatch(StockBasic):
+    startDate: str  # 匹配子序列的开始日期
+    endDate: str  # 匹配子序列的结束日期
+    distance: float  # z标准化欧氏距离，越小越相似
+
+
+class PatternSearchResponse(BaseModel):
+    matches: List[PatternMatch]
+    windowLength: int = 0  # 基准形态的交易日数
+    candidateCount: int = 0  # 参与搜索的股票数量
 
 
 # 股票基本信息响应
@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from dao.follow_dao import FollowDAO
+from module_stock.service.market_snapshot_service import MarketSnapshotService
+from utils.trading_calendar_util import TradingCalendarUtil
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -85,6 +87,21 @@ class StockFollowService:
             logger.error(f"搜索股票失败，关键词: {keyword}, 错误: {e}")
             raise
 
+    @staticmethod
+    async def _get_quote(code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单只证券的最新行情，行情快照已加载时从内存获取，否则查询数据库
+
+        Args:
+            code: 证券代码
+
+        Returns:
+            Optional[Dict[str, Any]]: 行情字典，不存在时为None
+        """
+        if MarketSnapshotService.is_loaded():
+            return MarketSnapshotService.get_quote(code)
+        return await FollowDAO.get_stock_detail(code)
+
     async def get_stock_detail(self, code: str) -> Dict[str, Any]:
         """
         获取股票详细信息
@@ -100,7 +117,8 @@ class StockFollowService:
                 logger.warning("股票代码为空")
                 return {}
 
-            stock = await FollowDAO.get_stock_detail(code)
+            # 最新行情从内存中的行情快照获取，快照未加载时查询数据库
+            stock = await self._get_quote(code)
 
             if not stock:
                 logger.warning(f"未找到股票，代码: {code}")
@@ -110,9 +128,11 @@ class StockFollowService:
             if 'change' in stock and stock['change'] is not None:
                 stock['change'] = round(stock['change'], 2)
 
-            # 获取历史数据
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+            # 获取截至最新交易日最近30天的历史数据
+            await TradingCalendarUtil.ensure_loaded()
+            latest_trading_day = TradingCalendarUtil.latest_trading_day()
+            end_date = latest_trading_day.strftime('%Y-%m-%d')
+            start_date = (latest_trading_day - timedelta(days=30)).strftime('%Y-%m-%d')
 
             history_data = await FollowDAO.get_stock_history(code, start_date, end_date)
 
@@ -152,7 +172,25 @@ class StockFollowService:
                 logger.warning("用户ID为空")
                 return []
 
-            stocks = await FollowDAO.get_user_watchlist(db, user_id)
+            if MarketSnapshotService.is_loaded():
+                # 关注的股票代码从MySQL获取，最新行情从内存中的行情快照获取
+                stock_code_to_add_time = await FollowDAO.get_watchlist_add_times(db, user_id)
+                stocks = [
+                    {
+                        "code": quote['code'],
+                        "name": quote['name'],
+                        "price": quote['price'],
+                        "change_rate": quote['change_rate'],
+                        "open": quote['open'],
+                        "high": quote['high'],
+                        "low": quote['low'],
+                        "volume": quote['volume'],
+                        "add_time": stock_code_to_add_time.get(quote['code']),
+                    }
+                    for quote in MarketSnapshotService.get_quotes(list(stock_code_to_add_time.keys()))
+                ]
+            else:
+                stocks = await FollowDAO.get_user_watchlist(db, user_id)
 
             # 格式化数据
             for stock in stocks:
@@ -248,18 +286,18 @@ class StockFollowService:
             Dict[str, Any]: 市场概览数据
         """
         try:
-            # 获取今日日期
-            today = datetime.now().strftime('%Y-%m-%d')
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+            # 行情日期为快照对应的最新交易日
+            trade_date = MarketSnapshotService.trade_date
+            today = trade_date.strftime('%Y-%m-%d') if trade_date else datetime.now().strftime('%Y-%m-%d')
 
             # 查询上证指数
-            sh_index = await FollowDAO.get_stock_detail('000001.SH')
+            sh_index = await cls._get_quote('000001.SH')
 
             # 查询深证成指
-            sz_index = await FollowDAO.get_stock_detail('399001.SZ')
+            sz_index = await cls._get_quote('399001.SZ')
 
             # 查询创业板指
-            cyb_index = await FollowDAO.get_stock_detail('399006.SZ')
+            cyb_index = await cls._get_quote('399006.SZ')
 
             # 汇总结果
             result = {
@@ -268,20 +306,20 @@ class StockFollowService:
                     {
                         "name": "上证指数",
                         "code": "000001.SH",
-                        "current": sh_index.get('close', 0) if sh_index else 0,
-                        "change": round(sh_index.get('change', 0), 2) if sh_index else 0
+                        "current": sh_index.get('close') or 0 if sh_index else 0,
+                        "change": round(sh_index.get('change') or 0, 2) if sh_index else 0
                     },
                     {
                         "name": "深证成指",
                         "code": "399001.SZ",
-                        "current": sz_index.get('close', 0) if sz_index else 0,
-                        "change": round(sz_index.get('change', 0), 2) if sz_index else 0
+                        "current": sz_index.get('close') or 0 if sz_index else 0,
+                        "change": round(sz_index.get('change') or 0, 2) if sz_index else 0
                     },
                     {
                         "name": "创业板指",
                         "code": "399006.SZ",
-                        "current": cyb_index.get('close', 0) if cyb_index else 0,
-                        "change": round(cyb_index.get('change', 0), 2) if cyb_index else 0
+                        "current": cyb_index.get('close') or 0 if cyb_index else 0,
+                        "change": round(cyb_index.get('change') or 0, 2) if cyb_index else 0
                     }
                 ]
             }
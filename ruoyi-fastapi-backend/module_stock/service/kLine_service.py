@@ -9,6 +9,7 @@ from fastapi import APIRouter, Depends, Request, Query
 from config.enums import RedisInitKeyConfig
 from entity.vo.kLine_vo import StockListResponse, KlineDataResponse, SimilarStockResponse
 from dao.kLine_dao import KLineDAO
+from module_stock.service.market_snapshot_service import MarketSnapshotService
 
 logger = logging.getLogger(__name__)
 
@@ -51,14 +52,24 @@ class KLineService:
             StockListResponse: 股票列表响应
         """
         try:
-            # 调用DAO层获取股票列表
-            result = await KLineDAO.fetch_stock_list(
-                page=request.page,
-                page_size=request.pageSize,
-                sort_by=request.sortBy,
-                sort_order=request.sortOrder,
-                keyword=request.keyword
-            )
+            if MarketSnapshotService.is_loaded():
+                # 在内存中的行情快照上完成过滤、排序和分页
+                result = MarketSnapshotService.query_stock_list(
+                    page=request.page,
+                    page_size=request.pageSize,
+                    sort_by=request.sortBy,
+                    sort_order=request.sortOrder,
+                    keyword=request.keyword
+                )
+            else:
+                # 快照未加载时回退到DAO层查询
+                result = await KLineDAO.fetch_stock_list(
+                    page=request.page,
+                    page_size=request.pageSize,
+                    sort_by=request.sortBy,
+                    sort_order=request.sortOrder,
+                    keyword=request.keyword
+                )
 
             # 构建响应对象
             response = StockListResponse(
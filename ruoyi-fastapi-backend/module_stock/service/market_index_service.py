@@ -0,0 +1,155 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.env import StockConfig
+from config.get_executor import ProcessPoolUtil
+from module_stock.dao.similar_dao import SimilarDao
+from utils import ck_util
+from utils.ann_index_util import IvfIndex, build_window_index, window_nearest_codes
+from utils.feature_store_util import DailyFeatureStore
+from utils.similarity_util import SectionPanel
+from utils.trading_calendar_util import TradingCalendarUtil
+import logging
+logger = logging.getLogger(__name__)
+
+# 全市场范围对应的 sectionLevel
+MARKET_SECTION_LEVEL = 2
+
+
+class MarketIndexService:
+    """
+    全市场近似最近邻检索服务
+
+    为若干标准窗口长度（以最新交易日结束）分别构建全市场收盘价窗口嵌入的 IVF 索引，
+    索引每晚重建并保存到磁盘。全市场范围的相似度计算先用索引召回数百只候选股票，
+    再由请求指定的精确方法重新排序；请求窗口与标准窗口不一致时，临时计算请求窗口的全市场嵌入后精确检索。
+    """
+
+    indexes: Dict[int, IvfIndex] = {}
+    update_time: Optional[datetime] = None
+
+    @classmethod
+    def _window_lengths(cls) -> List[int]:
+        return [int(length) for length in str(StockConfig.stock_ann_windows).split(',') if length.strip()]
+
+    @classmethod
+    def _index_path(cls, length: int) -> str:
+        return os.path.join(StockConfig.stock_ann_index_path, f'window_{length}.npz')
+
+    @classmethod
+    def _market_close_window(cls, start_date, end_date) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        读取全市场在 [start_date, end_date] 内的收盘价矩阵，特征库覆盖时直接使用特征库
+
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: (股票代码, 交易日, 股票 × 交易日 的收盘价矩阵, 有效性掩码)
+        """
+        store = DailyFeatureStore.open(StockConfig.stock_feature_store_path)
+        if store is not None and store.covers(start_date, end_date):
+            dates = store.window_dates(start_date, end_date)
+            close = np.asarray(store.window_view('close', start_date, end_date).T, dtype=float)
+            return np.asarray(store.codes, dtype=str), dates, close, ~np.isnan(close)
+        frame = SimilarDao.get_market_daily_sync(str(start_date), str(end_date))
+        dates = pd.DatetimeIndex(np.unique(pd.to_datetime(frame['timestamps'])))
+        panel = SectionPanel.from_frame(frame, dates)
+        return (np.asarray(panel.codes, dtype=str), dates.values.astype('datetime64[D]'),
+                panel.values.get('close', np.empty((0, len(dates)))), panel.mask)
+
+    @classmethod
+    def _save_index(cls, length: int, index: IvfIndex):
+        """
+        将索引写入临时文件后原子替换磁盘上的索引文件
+        """
+        os.makedirs(StockConfig.stock_ann_index_path, exist_ok=True)
+        path = cls._index_path(length)
+        tmp_path = f'{path}.tmp.npz'
+        index.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    async def rebuild_indexes(cls) -> bool:
+        """
+        为每个标准窗口长度重建索引并保存到磁盘
+
+        读取全市场收盘价及写入磁盘在长任务线程池中执行，嵌入计算及 k-means 聚类在计算进程池中执行，
+        均不占用查询线程及服务进程的 CPU
+
+        :return: 是否全部重建成功
+        """
+        await TradingCalendarUtil.ensure_loaded()
+        end_date = TradingCalendarUtil.latest_trading_day()
+        success = True
+        for length in cls._window_lengths():
+            try:
+                start_date = TradingCalendarUtil.shift_trading_days(end_date, length - 1)
+                codes, dates, close, mask = await ck_util.run_job(cls._market_close_window, start_date, end_date)
+                index = await ProcessPoolUtil.run(build_window_index, codes, dates, close, mask)
+                await ck_util.run_job(cls._save_index, length, index)
+                cls.indexes = {**cls.indexes, length: index}
+                logger.info(f"全市场检索索引重建成功，窗口: {length}，股票数: {len(index)}，结束日期: {end_date}")
+            except Exception as e:
+                success = False
+                logger.error(f"全市场检索索引重建失败，窗口: {length}: {e}")
+        cls.update_time = datetime.now()
+        return success
+
+    @classmethod
+    def load_indexes(cls):
+        """
+        加载磁盘上已有的索引，供应用启动时使用
+        """
+        indexes = {}
+        for length in cls._window_lengths():
+            path = cls._index_path(length)
+            if os.path.exists(path):
+                try:
+                    indexes[length] = IvfIndex.load(path)
+                except Exception as e:
+                    logger.error(f"加载全市场检索索引失败 {path}: {e}")
+        cls.indexes = indexes
+        logger.info(f"全市场检索索引加载完成，窗口: {sorted(indexes)}")
+
+    @classmethod
+    def _indexed_candidates_sync(cls, stock_code: str, start_date: str, end_date: str,
+                                 count: int) -> Optional[List[str]]:
+        """
+        请求窗口为标准窗口时，用已构建的索引召回与基准股票窗口走势最接近的候选股票
+
+        :param stock_code: 基准股票代码
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param count: 召回数量
+        :return: 按嵌入距离升序排列的候选股票代码，不含基准股票；没有匹配的索引时为None
+        """
+        dates = np.array(TradingCalendarUtil.trading_days_between(start_date, end_date), dtype='datetime64[D]')
+        for index in cls.indexes.values():
+            if index.matches(dates) and stock_code in index.code_index:
+                query = index.embeddings[index.code_index[stock_code]]
+                return [code for code in index.search(query, count + 1) if code != stock_code][:count]
+        return None
+
+    @classmethod
+    async def candidate_codes(cls, stock_code: str, start_date: str, end_date: str) -> List[str]:
+        """
+        获取全市场范围的比较股票列表
+
+        :param stock_code: 基准股票代码
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 基准股票代码及召回的候选股票代码
+        """
+        count = StockConfig.stock_ann_candidates
+        candidates = await ck_util.run_sync(cls._indexed_candidates_sync, stock_code, start_date, end_date, count)
+        if candidates is None:
+            # 请求窗口不是标准窗口：读取全市场窗口后在计算进程池中临时计算嵌入，在降维空间中精确检索
+            codes, _, close, mask = await ck_util.run_sync(cls._market_close_window, start_date, end_date)
+            candidates = await ProcessPoolUtil.run(window_nearest_codes, codes, close, mask, stock_code, count)
+            if candidates is None:
+                logger.warning(f"基准股票 {stock_code} 在 {start_date} ~ {end_date} 内的有效交易日不足，无法进行全市场检索")
+                candidates = []
+        return [stock_code] + candidates
@@ -0,0 +1,200 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from module_stock.dao.kLine_dao import KLineDAO
+from utils.trading_calendar_util import TradingCalendarUtil
+import logging
+logger = logging.getLogger(__name__)
+
+# 快照中的数值列
+NUMERIC_COLUMNS = ['price', 'change_rate', 'volume', 'amount', 'high', 'low', 'open', 'pre_close',
+                   'seven_day_return', 'thirty_day_return']
+# 股票列表允许排序的列
+SORTABLE_COLUMNS = set(NUMERIC_COLUMNS) | {'code', 'name'}
+# 扫描窗口在30日锚点之前额外回看的交易日数，覆盖短期停牌的股票
+SNAPSHOT_LOOKBACK_DAYS = 20
+
+
+class MarketSnapshotService:
+    """
+    全市场行情快照服务
+
+    每次交易日历定时刷新时用一条查询加载每只证券的最新行情、涨跌幅、7日及30日收益率和名称，
+    以列数组的形式保存在内存中，股票列表的排序、关键词过滤和分页，
+    以及关注列表、指数概览的行情查询都直接在内存中完成。
+    """
+
+    columns: Dict[str, np.ndarray] = {}
+    code_index: Dict[str, int] = {}
+    trade_date: Optional[date] = None
+    update_time: Optional[datetime] = None
+
+    @classmethod
+    async def refresh_market_snapshot(cls) -> bool:
+        """
+        加载最新交易日的行情快照并原子替换内存数据，加载失败时保留上一次的数据
+
+        最新交易日的日线可能分批入库，最新交易日未变化时也重新加载，使当日行情随入库进度更新
+
+        :return: 是否加载成功
+        """
+        try:
+            latest_date = TradingCalendarUtil.latest_trading_day()
+            seven_day_ago = TradingCalendarUtil.trading_day_on_or_before(latest_date - timedelta(days=7))
+            thirty_day_ago = TradingCalendarUtil.trading_day_on_or_before(latest_date - timedelta(days=30))
+            window_start = TradingCalendarUtil.shift_trading_days(thirty_day_ago, SNAPSHOT_LOOKBACK_DAYS)
+            snapshot_df = await KLineDAO.fetch_market_snapshot(latest_date, seven_day_ago, thirty_day_ago, window_start)
+        except Exception as e:
+            logger.error(f"刷新行情快照失败，继续使用上一次的数据: {e}")
+            return False
+
+        columns = cls._build_columns(snapshot_df)
+        code_index = {}
+        for index, code in enumerate(columns['code']):
+            # 同一代码存在多个分类时优先使用股票分类
+            if code not in code_index or columns['category'][index] == 'stock':
+                code_index[code] = index
+
+        cls.columns, cls.code_index = columns, code_index
+        cls.trade_date = latest_date
+        cls.update_time = datetime.now()
+        logger.info(f"行情快照加载成功，交易日: {latest_date}，证券数: {len(code_index)}")
+        return True
+
+    @classmethod
+    def _build_columns(cls, snapshot_df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        将快照查询结果转换为列数组，并计算涨跌幅及7日、30日收益率
+
+        :param snapshot_df: 快照查询结果
+        :return: 列名到数组的映射
+        """
+        def as_float(column: str) -> np.ndarray:
+            return pd.to_numeric(snapshot_df[column], errors='coerce').to_numpy(dtype=float)
+
+        def pct_change(current: np.ndarray, base: np.ndarray) -> np.ndarray:
+            # 基准价格缺失或为0时收益率为空
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(np.isfinite(base) & (base != 0), (current - base) / base * 100, np.nan)
+
+        close = as_float('close')
+        pre_close = as_float('pre_close')
+        names = snapshot_df['name'].fillna('').astype(str).to_numpy()
+        return {
+            'code': snapshot_df['code'].astype(str).to_numpy(dtype=str),
+            'name': names.astype(str),
+            'category': snapshot_df['category'].fillna('').astype(str).to_numpy(dtype=str),
+            'update_time': pd.to_datetime(snapshot_df['latest_date']).to_numpy(),
+            'price': close,
+            'change_rate': pct_change(close, pre_close),
+            'volume': as_float('volume'),
+            'amount': as_float('amount'),
+            'high': as_float('high'),
+            'low': as_float('low'),
+            'open': as_float('open'),
+            'pre_close': pre_close,
+            'seven_day_return': pct_change(close, as_float('price_7d_ago')),
+            'thirty_day_return': pct_change(close, as_float('price_30d_ago')),
+        }
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        """
+        行情快照是否已加载
+
+        :return: 是否已加载
+        """
+        return cls.update_time is not None
+
+    @classmethod
+    def _row(cls, index: int) -> Dict[str, Any]:
+        """
+        将快照中的一行转换为字典，数值缺失时为None
+        """
+        row = {
+            'code': str(cls.columns['code'][index]),
+            'name': str(cls.columns['name'][index]),
+            'update_time': pd.Timestamp(cls.columns['update_time'][index]).to_pydatetime(),
+        }
+        for column in NUMERIC_COLUMNS:
+            value = float(cls.columns[column][index])
+            row[column] = value if np.isfinite(value) else None
+        return row
+
+    @classmethod
+    def query_stock_list(cls, page: int = 1, page_size: int = 20, sort_by: str = 'seven_day_return',
+                         sort_order: str = 'desc', keyword: Optional[str] = None) -> Dict[str, Any]:
+        """
+        在内存中过滤、排序并分页股票列表，返回结构与 KLineDAO.fetch_stock_list 一致
+
+        :param page: 页码
+        :param page_size: 每页大小
+        :param sort_by: 排序字段
+        :param sort_order: 排序方式('asc'或'desc')
+        :param keyword: 搜索关键词，匹配代码或名称
+        :return: 包含股票列表和总数的字典
+        """
+        columns = cls.columns
+        # 只展示有证券名称的股票
+        mask = (columns['category'] == 'stock') & (columns['name'] != '')
+        if keyword:
+            mask &= (np.char.find(columns['code'], keyword) >= 0) | (np.char.find(columns['name'], keyword) >= 0)
+        indices = np.flatnonzero(mask)
+
+        if sort_by not in SORTABLE_COLUMNS:
+            sort_by = 'seven_day_return'
+        values = columns[sort_by][indices]
+        descending = str(sort_order).lower() == 'desc'
+        if values.dtype.kind == 'f':
+            # 空值始终排在最后
+            order = np.argsort(-values if descending else values, kind='stable')
+        else:
+            order = np.argsort(values, kind='stable')
+            if descending:
+                order = order[::-1]
+        start = max(page - 1, 0) * page_size
+        page_indices = indices[order[start:start + page_size]]
+
+        items = []
+        for index in page_indices:
+            item = cls._row(index)
+            item.pop('update_time')
+            items.append(item)
+        return {
+            'items': items,
+            'total': int(len(indices))
+        }
+
+    @classmethod
+    def get_quote(cls, code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单只证券的最新行情
+
+        :param code: 证券代码
+        :return: 行情字典，包含 close 和 change 字段，不存在时为None
+        """
+        index = cls.code_index.get(code)
+        if index is None:
+            return None
+        quote = cls._row(index)
+        quote['close'] = quote['price']
+        quote['change'] = quote['change_rate']
+        return quote
+
+    @classmethod
+    def get_quotes(cls, codes: List[str]) -> List[Dict[str, Any]]:
+        """
+        按输入顺序获取多只证券的最新行情，快照中不存在的证券被忽略
+
+        :param codes: 证券代码列表
+        :return: 行情字典列表
+        """
+        quotes = []
+        for code in codes:
+            quote = cls.get_quote(code)
+            if quote is not None:
+                quotes.append(quote)
+        return quotes
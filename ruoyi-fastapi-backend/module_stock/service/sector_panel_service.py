@@ -0,0 +1,303 @@
+import asyncio
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from config.database import AsyncSessionLocal
+from config.env import StockConfig
+from module_stock.dao.history_dao import HistoryDAO
+from module_stock.dao.similar_dao import SimilarDao
+from module_stock.service.market_index_service import MARKET_SECTION_LEVEL
+from module_stock.service.security_master_service import SecurityMasterService
+from utils.trading_calendar_util import TradingCalendarUtil
+import logging
+logger = logging.getLogger(__name__)
+
+# 面板中保存的行情列，与 SimilarDao.get_section_stock_info 返回的数值列一致
+PANEL_COLUMNS = ['open', 'close', 'high', 'low', 'ycp', 'vol']
+# 行业分组：(分类列, 分类代码, 板块, 是否ST)
+SectionKey = Tuple[str, Any, Any, int]
+
+
+class SectorPanel:
+    """
+    一个行业分组在一段日期范围内的日线面板
+
+    以 股票 × 交易日 × 行情列 的 float32 数组保存（与DAO返回的列类型一致），股票代码按升序排列，
+    有效性掩码标记每只股票在每个交易日是否有数据
+    """
+
+    def __init__(self, members: FrozenSet[str], start_date: date, end_date: date, version: date,
+                 codes: np.ndarray, dates: np.ndarray, values: np.ndarray, mask: np.ndarray):
+        self.members = members
+        self.start_date = start_date
+        self.end_date = end_date
+        self.version = version
+        self.codes = codes
+        self.code_index = {code: row for row, code in enumerate(codes)}
+        self.dates = dates
+        self.values = values
+        self.mask = mask
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, members: FrozenSet[str], start_date: date, end_date: date,
+                   version: date) -> 'SectorPanel':
+        """
+        由 SimilarDao.get_section_stock_info 返回的长表构建面板
+
+        :param frame: 包含 code、timestamps 及行情列的长表
+        :param members: 查询的股票代码
+        :param start_date: 查询的开始日期
+        :param end_date: 查询的结束日期
+        :param version: 查询时的最新交易日
+        :return: 板块面板
+        """
+        code_idx, codes = pd.factorize(frame['code'], sort=True)
+        timestamps = pd.to_datetime(frame['timestamps']).to_numpy(dtype='datetime64[ns]')
+        date_idx, dates = pd.factorize(timestamps, sort=True)
+        mask = np.zeros((len(codes), len(dates)), dtype=bool)
+        mask[code_idx, date_idx] = True
+        values = np.full((len(codes), len(dates), len(PANEL_COLUMNS)), np.nan, dtype=np.float32)
+        values[code_idx, date_idx] = np.column_stack([
+            pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float32) for col in PANEL_COLUMNS
+        ])
+        return cls(members, start_date, end_date, version, np.asarray(codes, dtype=object),
+                   np.asarray(dates, dtype='datetime64[ns]'), values, mask)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.mask.nbytes + self.dates.nbytes
+
+    @staticmethod
+    def estimate_nbytes(stock_count: int, day_count: int) -> int:
+        """
+        加载前估算面板数组占用的内存
+
+        :param stock_count: 股票数量
+        :param day_count: 交易日数量
+        :return: 字节数
+        """
+        return stock_count * day_count * (len(PANEL_COLUMNS) * np.dtype(np.float32).itemsize + 1) + day_count * 8
+
+    def covers(self, members: FrozenSet[str], start_date: date, end_date: date, latest_day: date) -> bool:
+        """
+        面板是否包含请求的全部股票及日期范围。
+        面板加载时最新交易日的数据可能尚未全部入库，最新交易日变化后该日及之后的日期不再由面板提供
+
+        :param members: 请求的股票代码
+        :param start_date: 请求的开始日期
+        :param end_date: 请求的结束日期
+        :param latest_day: 当前的最新交易日
+        :return: 是否包含
+        """
+        if not members <= self.members or start_date < self.start_date:
+            return False
+        ready_end = min(self.end_date, self.version)
+        if latest_day != self.version:
+            # 只排除加载时的最新交易日及之后的日期，更早结束的面板不受影响
+            ready_end = min(self.end_date, self.version - timedelta(days=1))
+        return min(end_date, latest_day) <= ready_end
+
+    def to_frame(self, members: FrozenSet[str], start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        截取部分股票及日期范围，还原为按 code、timestamps 排序的长表
+
+        :param members: 股票代码
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 与 SimilarDao.get_section_stock_info 结构一致的长表
+        """
+        rows = np.array(sorted(self.code_index[code] for code in members if code in self.code_index), dtype=np.int64)
+        lo = int(np.searchsorted(self.dates, np.datetime64(start_date, 'ns')))
+        hi = int(np.searchsorted(self.dates, np.datetime64(end_date + timedelta(days=1), 'ns')))
+        row_idx, col_idx = np.nonzero(self.mask[rows, lo:hi])
+        values = self.values[rows[row_idx], col_idx + lo]
+        # 股票代码为分类类型，类别只包含截取的股票
+        frame = pd.DataFrame({'code': pd.Categorical.from_codes(row_idx, categories=self.codes[rows])})
+        for i, col in enumerate(PANEL_COLUMNS):
+            frame[col] = values[:, i]
+        frame['timestamps'] = self.dates[col_idx + lo]
+        return frame
+
+
+class SectorPanelService:
+    """
+    板块面板缓存
+
+    大部分请求集中在少数几个中证行业，按行业分组在进程内缓存其成分股的日线面板（LRU），
+    请求的日期范围落在已缓存的范围之内时直接截取，不再查询 ClickHouse 或日线本地副本；
+    未命中时以已缓存范围与请求范围的并集重新加载，使缓存的范围逐步扩大。
+    缓存按面板数组占用的内存总量淘汰最久未使用的分组，并定时按查询历史预热最常被查询的分组。
+    """
+
+    _panels: 'OrderedDict[SectionKey, SectorPanel]' = OrderedDict()
+    _nbytes: int = 0
+    # 正在加载的分组，相同分组的并发请求等待同一次加载
+    _loading: Dict[SectionKey, asyncio.Task] = {}
+    warm_version: Optional[date] = None
+
+    @staticmethod
+    def _capacity() -> int:
+        return int(StockConfig.stock_sector_panel_cache_mb) * 1024 * 1024
+
+    @staticmethod
+    def _to_date(value: Any) -> date:
+        return pd.Timestamp(str(value)[:10]).date()
+
+    @classmethod
+    async def get_section_stock_info(cls, stock_code: str, section_level: int, section_code_list: List[str],
+                                     start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        获取板块内所有股票的日线行情，优先由缓存的板块面板截取，返回结构与 SimilarDao.get_section_stock_info 一致
+
+        :param stock_code: 基准股票代码
+        :param section_level: 版块等级
+        :param section_code_list: 板块内的股票代码列表
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 包含多只股票数据的长表
+        """
+        section_key = None
+        # 面板的有效性依赖最新交易日，交易日历未加载时不使用面板缓存
+        if cls._capacity() > 0 and section_level != MARKET_SECTION_LEVEL and section_code_list \
+                and TradingCalendarUtil.is_loaded():
+            section_key = await SecurityMasterService.get_section_key(stock_code, section_level)
+        if section_key is None:
+            return await SimilarDao.get_section_stock_info(section_code_list, start_date, end_date)
+
+        members = frozenset(section_code_list)
+        start, end = cls._to_date(start_date), cls._to_date(end_date)
+        panel = await cls._get_panel(section_key, members, start, end)
+        if isinstance(panel, pd.DataFrame):
+            # 超出缓存容量未缓存，直接使用加载时查询得到的长表，其范围可能大于请求的范围
+            timestamps = pd.to_datetime(panel['timestamps'])
+            keep = panel['code'].isin(members) & (timestamps >= pd.Timestamp(start)) & (timestamps <= pd.Timestamp(end))
+            return panel[keep].reset_index(drop=True)
+        return panel.to_frame(members, start, end)
+
+    @classmethod
+    async def _get_panel(cls, section_key: SectionKey, members: FrozenSet[str], start: date,
+                         end: date) -> Union[SectorPanel, pd.DataFrame]:
+        """
+        获取包含请求范围的面板，未命中时加载
+
+        :return: 板块面板，面板超出缓存容量时为加载时查询得到的长表
+        """
+        while True:
+            panel = cls._panels.get(section_key)
+            if panel is not None and panel.covers(members, start, end, TradingCalendarUtil.latest_trading_day()):
+                cls._panels.move_to_end(section_key)
+                return panel
+            task = cls._loading.get(section_key)
+            if task is None or task.done():
+                break
+            # 等待其他请求对同一分组的加载完成后重新检查
+            await asyncio.shield(task)
+
+        if panel is not None:
+            # 与已缓存的范围合并后整体重新加载，扩大缓存覆盖的范围，同时刷新最新交易日之后入库的数据；
+            # 合并后的面板预计超出缓存容量时只加载请求的范围
+            union_members = members | panel.members
+            union_start, union_end = min(start, panel.start_date), max(end, panel.end_date)
+            estimate = SectorPanel.estimate_nbytes(
+                len(union_members), TradingCalendarUtil.count_trading_days(union_start, union_end)
+            )
+            if estimate <= cls._capacity():
+                members, start, end = union_members, union_start, union_end
+        task = asyncio.ensure_future(cls._load(section_key, members, start, end))
+        cls._loading[section_key] = task
+        task.add_done_callback(partial(cls._loading_done, section_key))
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _loading_done(cls, section_key: SectionKey, task: asyncio.Task):
+        # 加载结束后立即移除，等待中的请求被唤醒时不会再次等待已完成的加载
+        if cls._loading.get(section_key) is task:
+            del cls._loading[section_key]
+
+    @classmethod
+    async def _load(cls, section_key: SectionKey, members: FrozenSet[str], start: date,
+                    end: date) -> Union[SectorPanel, pd.DataFrame]:
+        """
+        查询并缓存分组在日期范围内的面板，超出缓存容量时淘汰最久未使用的分组
+
+        :return: 板块面板，面板本身超出缓存容量时不缓存并返回查询得到的长表
+        """
+        version = TradingCalendarUtil.latest_trading_day()
+        frame = await SimilarDao.get_section_stock_info(sorted(members), str(start), str(end))
+        panel = SectorPanel.from_frame(frame, members, start, end, version)
+        if panel.nbytes > cls._capacity():
+            logger.warning(f"板块面板超出缓存容量，不缓存: {section_key}，{panel.nbytes / 1024 / 1024:.1f} MB")
+            return frame
+
+        previous = cls._panels.pop(section_key, None)
+        if previous is not None:
+            cls._nbytes -= previous.nbytes
+        cls._panels[section_key] = panel
+        cls._nbytes += panel.nbytes
+        while cls._nbytes > cls._capacity():
+            evicted_key, evicted = cls._panels.popitem(last=False)
+            cls._nbytes -= evicted.nbytes
+            logger.info(f"淘汰板块面板: {evicted_key}")
+        logger.info(f"板块面板加载成功: {section_key}，股票数: {len(panel.codes)}，交易日: {start} ~ {end}，"
+                    f"缓存占用: {cls._nbytes / 1024 / 1024:.1f} MB")
+        return panel
+
+    @classmethod
+    async def warm_up(cls, force: bool = False):
+        """
+        按最近的查询历史预热最常被查询的行业分组，每个分组加载其被查询过的最大日期范围。
+        最新交易日未变化时不重复预热
+
+        :param force: 最新交易日未变化时是否也重新预热
+        """
+        if cls._capacity() <= 0 or StockConfig.stock_sector_panel_warm_count <= 0 \
+                or not TradingCalendarUtil.is_loaded():
+            return
+        latest_day = TradingCalendarUtil.latest_trading_day()
+        if not force and cls.warm_version == latest_day:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                hot_queries = await HistoryDAO.get_hot_queries(
+                    db,
+                    datetime.now() - timedelta(days=StockConfig.stock_sector_panel_warm_days),
+                    # 多只热门股票可能属于同一分组，多取一些查询记录
+                    StockConfig.stock_sector_panel_warm_count * 5
+                )
+        except Exception as e:
+            logger.error(f"读取热门查询失败，跳过板块面板预热: {e}")
+            return
+
+        ranges: Dict[SectionKey, Tuple[date, date]] = {}
+        for query in hot_queries:
+            try:
+                section_level = int(query['compare_scope'])
+                start, end = cls._to_date(query['start_date']), cls._to_date(query['end_date'])
+            except (TypeError, ValueError):
+                continue
+            if section_level == MARKET_SECTION_LEVEL:
+                continue
+            section_key = await SecurityMasterService.get_section_key(query['stock_code'], section_level)
+            if section_key is None:
+                continue
+            if section_key in ranges:
+                start, end = min(start, ranges[section_key][0]), max(end, ranges[section_key][1])
+            elif len(ranges) >= StockConfig.stock_sector_panel_warm_count:
+                continue
+            ranges[section_key] = (start, end)
+
+        for section_key, (start, end) in ranges.items():
+            members = frozenset(await SecurityMasterService.get_section_members(*section_key))
+            if not members:
+                continue
+            try:
+                await cls._get_panel(section_key, members, start, end)
+            except Exception as e:
+                logger.error(f"预热板块面板失败 {section_key}: {e}")
+        cls.warm_version = latest_day
+        logger.info(f"板块面板预热完成，分组数: {len(ranges)}，缓存占用: {cls._nbytes / 1024 / 1024:.1f} MB")
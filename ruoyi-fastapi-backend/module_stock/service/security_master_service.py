@@ -0,0 +1,158 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from module_stock.dao.similar_dao import SimilarDao
+import logging
+logger = logging.getLogger(__name__)
+
+# ST股票的名称前缀
+ST_PREFIXES = ('ST', '*ST')
+
+
+class SecurityMasterService:
+    """
+    证券主数据服务
+
+    启动时从 events_temp.lc_csiinduspe 全量加载到内存，并由定时任务定期刷新，
+    维护 股票代码 → 股票信息 以及 (分类列, 分类代码, 板块, 是否ST) → 成分股 两类索引，
+    使股票名称查询和同板块股票查询成为进程内的字典查找。
+    未加载成功时回退到逐条查询数据库。
+    """
+
+    stock_map: Dict[str, Dict[str, Any]] = {}
+    section_map: Dict[Tuple[str, Any, Any, int], List[str]] = {}
+    update_time: Optional[datetime] = None
+
+    @classmethod
+    async def refresh_security_master(cls) -> bool:
+        """
+        全量加载证券主数据并原子替换内存索引，加载失败时保留上一次的数据
+
+        :return: 是否加载成功
+        """
+        try:
+            master_df = await SimilarDao.get_security_master()
+        except Exception as e:
+            logger.error(f"刷新证券主数据失败，继续使用上一次的数据: {e}")
+            return False
+
+        stock_map = {}
+        section_map = {}
+        for row in master_df.to_dict('records'):
+            code = row['SecuCode']
+            if code is None:
+                continue
+            profile = cls._build_profile(row)
+            # 同一股票存在多条记录时以第一条为准，与按代码 LIMIT 1 的查询保持一致
+            stock_map.setdefault(code, profile)
+            for column in ('CSIIndusCode', 'FirstIndustryCode'):
+                if profile[column] is None:
+                    continue
+                members = section_map.setdefault((column, profile[column], profile['board'], profile['isST']), [])
+                if code not in members:
+                    members.append(code)
+
+        cls.stock_map, cls.section_map = stock_map, section_map
+        cls.update_time = datetime.now()
+        logger.info(f"证券主数据加载成功，股票数: {len(stock_map)}，行业分组数: {len(section_map)}")
+        return True
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        """
+        证券主数据是否已加载
+
+        :return: 是否已加载
+        """
+        return cls.update_time is not None
+
+    @classmethod
+    async def get_stock_info(cls, stock_code: str) -> Dict[str, Any]:
+        """
+        获取单个股票的基本信息，返回结构与 SimilarDao.get_stock_info 一致
+
+        :param stock_code: 股票代码
+        :return: 股票基本信息
+        """
+        if not cls.is_loaded():
+            return await SimilarDao.get_stock_info(stock_code)
+        profile = cls.stock_map.get(stock_code)
+        return {
+            "code": stock_code,
+            "name": profile['name'] if profile else stock_code,
+            "industry": "未知行业",
+            "description": "没有可用的描述信息"
+        }
+
+    @classmethod
+    async def get_stock_profile(cls, stock_code: str) -> Optional[Dict[str, Any]]:
+        """
+        获取股票的板块及行业分类信息
+
+        :param stock_code: 股票代码
+        :return: 包含 code、name、board、CSIIndusCode、FirstIndustryCode、isST 的字典，不存在时为None
+        """
+        if cls.is_loaded():
+            return cls.stock_map.get(stock_code)
+        lc_csiinduspe = await SimilarDao.get_stock_nums(stock_code)
+        if lc_csiinduspe.empty:
+            return None
+        return cls._build_profile(lc_csiinduspe.iloc[0].to_dict())
+
+    @classmethod
+    async def get_section_key(cls, stock_code: str, section_level: int) -> Optional[Tuple[str, Any, Any, int]]:
+        """
+        获取股票在指定版块等级下所属的行业分组
+
+        :param stock_code: 股票代码
+        :param section_level: 版块等级，1 表示当前具体等级分类，0 表示所在大版
+        :return: (分类列, 分类代码, 板块, 是否ST)，股票不存在或没有中证行业分类时为None
+        """
+        stock_profile = await cls.get_stock_profile(stock_code)
+        if stock_profile is None or stock_profile['CSIIndusCode'] is None:
+            return None
+        csi_indus_code = stock_profile['CSIIndusCode']
+        first_industry_code = stock_profile['FirstIndustryCode']
+        if (first_industry_code == csi_indus_code) or (section_level == 1):
+            return 'CSIIndusCode', csi_indus_code, stock_profile['board'], stock_profile['isST']
+        return 'FirstIndustryCode', first_industry_code, stock_profile['board'], stock_profile['isST']
+
+    @classmethod
+    async def get_section_members(
+        cls, code_type: str, code: Any, board: Any, is_st: int, exclude_code: Optional[str] = None
+    ) -> List[str]:
+        """
+        获取同一行业分类、同一板块且ST状态相同的股票代码列表
+
+        :param code_type: 行业分类列名，CSIIndusCode 或 FirstIndustryCode
+        :param code: 行业分类代码
+        :param board: 板块值
+        :param is_st: 是否为ST股票，1表示是，0表示否
+        :param exclude_code: 需要排除的股票代码
+        :return: 股票代码列表
+        """
+        if not cls.is_loaded():
+            stock_code_list, _ = await SimilarDao.get_stock(exclude_code, code, board, code_type, is_st)
+            return stock_code_list
+        members = cls.section_map.get((code_type, code, board, is_st), [])
+        return [member for member in members if member != exclude_code]
+
+    @classmethod
+    def _build_profile(cls, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将 lc_csiinduspe 的一行记录转换为股票信息字典
+
+        :param row: lc_csiinduspe 记录
+        :return: 股票信息字典
+        """
+        name = row.get('SecuName') or row['SecuCode']
+        return {
+            'code': row['SecuCode'],
+            'name': name,
+            'board': row.get('board'),
+            'CSIIndusCode': None if pd.isna(row.get('CSIIndusCode')) else row.get('CSIIndusCode'),
+            'FirstIndustryCode': None if pd.isna(row.get('FirstIndustryCode')) else row.get('FirstIndustryCode'),
+            'isST': 1 if name.startswith(ST_PREFIXES) else 0,
+        }
@@ -0,0 +1,1007 @@
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import pandas as pd
+import numpy as np
+
+from config.env import StockConfig
+from utils.dtw_util import dtw_distance
+from utils.feature_store_util import DailyFeatureStore
+from utils.mass_util import mass_distance_profiles, top_matches
+from utils.price_graph_util import (
+    PriceChainGraph,
+    graph_edit_similarity_batch,
+    longest_common_subpath,
+    max_common_subgraph_similarity,
+)
+from utils.similarity_util import BATCH_SIMILARITY_METHODS, INDICATOR_FEATURES, SectionPanel, base_values
+import logging
+import statsmodels.tsa.stattools as ts
+logger = logging.getLogger(__name__)
+
+# 发送到计算进程的行情数值列
+PAYLOAD_COLUMNS = ['open', 'close', 'high', 'low', 'ycp', 'vol']
+
+
+def pack_stock_frame(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """将板块长表行情打包为按股票分段的紧凑 numpy 数组，便于发送到计算进程
+
+    Args:
+        frame: 包含 code、timestamps 及行情数值列的长表
+
+    Returns:
+        Dict[str, np.ndarray]: codes 为股票代码，offsets 为每只股票在数组中的起止位置，
+            timestamps 为交易日，values 为 PAYLOAD_COLUMNS 对应的 float32 矩阵（与DAO返回的列类型一致）
+    """
+    code_ids, codes = pd.factorize(frame['code'])
+    order = np.argsort(code_ids, kind='stable')
+    offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(code_ids, minlength=len(codes)), out=offsets[1:])
+    return {
+        'codes': np.asarray(codes, dtype=str),
+        'offsets': offsets,
+        'timestamps': pd.to_datetime(frame['timestamps']).to_numpy(dtype='datetime64[ns]')[order],
+        'values': frame[PAYLOAD_COLUMNS].to_numpy(dtype=np.float32)[order],
+    }
+
+
+def split_stock_payload(payload: Dict[str, np.ndarray], chunk_size: int) -> List[Dict[str, np.ndarray]]:
+    """按股票数量将打包后的行情切分为多个计算任务
+
+    Args:
+        payload: pack_stock_frame 的打包结果
+        chunk_size: 每个任务包含的股票数量
+
+    Returns:
+        List[Dict[str, np.ndarray]]: 切分后的打包结果列表
+    """
+    chunks = []
+    offsets = payload['offsets']
+    for start in range(0, len(payload['codes']), max(int(chunk_size), 1)):
+        stop = min(start + chunk_size, len(payload['codes']))
+        lo, hi = offsets[start], offsets[stop]
+        chunks.append({
+            'codes': payload['codes'][start:stop],
+            'offsets': offsets[start:stop + 1] - lo,
+            'timestamps': payload['timestamps'][lo:hi],
+            'values': payload['values'][lo:hi],
+        })
+    return chunks
+
+
+def unpack_stock_frame(payload: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """将打包后的行情还原为与DAO返回结构一致的长表
+
+    Args:
+        payload: pack_stock_frame 或 split_stock_payload 的结果
+
+    Returns:
+        pd.DataFrame: 包含 code、行情数值列及 timestamps 的长表
+    """
+    frame = pd.DataFrame(payload['values'], columns=PAYLOAD_COLUMNS)
+    frame.insert(0, 'code', np.repeat(payload['codes'], np.diff(payload['offsets'])))
+    frame['timestamps'] = payload['timestamps']
+    return frame
+
+
+def _float_values(df: pd.DataFrame, col: str) -> np.ndarray:
+    """读取行情列为 float64 数组，DAO返回的行情列为 float32，计算时统一转换为 float64，不修改传入的 DataFrame"""
+    return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+
+
+class StockSimilarityCalculator:
+    """股票相似度计算器，只包含纯计算逻辑，不访问数据源，可在计算进程中使用"""
+
+    def _calculate_batch_similarity(
+            self,
+            base_stock_data: pd.DataFrame,
+            all_stocks: pd.DataFrame,
+            base_code: str,
+            indicators: List[str],
+            method: str,
+            dtw_window: Optional[int] = None,
+            top_k: Optional[int] = None,
+            stats: Optional[Dict[str, int]] = None
+    ) -> Dict[str, float]:
+        """使用向量化方式批量计算基准股票与所有候选股票的相似度
+
+        Args:
+            base_stock_data: 基准股票数据，以交易日为索引
+            all_stocks: 板块内所有股票的行情数据（长表）
+            base_code: 基准股票代码，计算时排除
+            indicators: 用于计算的指标列表
+            method: 相似性计算方法，需为 BATCH_SIMILARITY_METHODS 中的方法
+            dtw_window: DTW的Sakoe-Chiba窗口宽度，仅dtw方法使用
+            top_k: 只需要的最相似股票数量，dtw方法据此进行下界剪枝与早停
+            stats: 用于回传剪枝统计的字典
+
+        Returns:
+            Dict[str, float]: 股票代码到相似度得分的映射，按板块数据中的出现顺序排列，被剪枝的股票不包含在内
+        """
+        dates = pd.DatetimeIndex(base_stock_data.index)
+        panel = SectionPanel.from_frame(all_stocks, dates, exclude_code=base_code)
+        if len(panel) == 0:
+            return {}
+        options = {'window': dtw_window, 'top_k': top_k, 'stats': stats} if method == 'dtw' else {}
+        scores = BATCH_SIMILARITY_METHODS[method](base_values(base_stock_data, dates), panel, indicators, **options)
+        return {code: float(score) for code, score in zip(panel.codes, scores) if not np.isnan(score)}
+
+    def _calculate_stock_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str],
+            method: str
+    ) -> float:
+        """计算两只股票的相似度
+
+        Args:
+            stock1: 第一只股票数据
+            stock2: 第二只股票数据
+            indicators: 用于计算的指标列表
+            method: 相似性计算方法
+
+        Returns:
+            float: 相似度得分
+        """
+        if 'timestamps' in stock2.columns:
+            # 以该列为索引，得到新的 DataFrame，不修改调用方的数据
+            stock2 = stock2.set_index('timestamps')
+            if not isinstance(stock2.index, pd.DatetimeIndex):
+                stock2.index = pd.to_datetime(stock2.index)
+        # 找到两只股票共同的交易日
+        common_dates = stock1.index.intersection(stock2.index)
+        if len(common_dates) < 2:
+            logger.warning("股票对的共同交易日少于2天，无法计算相似度")
+            return 0.0
+
+        stock1_aligned = stock1.loc[common_dates]
+        stock2_aligned = stock2.loc[common_dates]
+        # 根据指标选择和计算方法进行计算
+        if method == "dtw":
+            return self._calculate_dtw_similarity(stock1_aligned, stock2_aligned, indicators)
+        elif method == "pearson":
+            return self._calculate_pearson_similarity(stock1_aligned, stock2_aligned, indicators)
+        elif method == "euclidean":
+            return self._calculate_euclidean_similarity(stock1_aligned, stock2_aligned, indicators)
+        elif method == "coIntegration":
+            return self._calculate_cointegration_similarity(stock1_aligned, stock2_aligned, indicators)
+        elif method == "shape":
+            return self._calculate_shape_similarity(stock1_aligned, stock2_aligned, indicators)
+        elif method == "position":
+            return self._calculate_position_similarity(stock1_aligned, stock2_aligned, indicators)
+        else:
+            logger.warning(f"不支持的相似性计算方法: {method}，使用dtw代替")
+            return self._calculate_dtw_similarity(stock1_aligned, stock2_aligned, indicators)
+
+    def _calculate_dtw_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str],
+            window: Optional[int] = None
+    ) -> float:
+        """使用DTW计算两只股票的相似度
+
+        Args:
+            stock1: 第一只股票数据
+            stock2: 第二只股票数据
+            indicators: 用于计算的指标列表
+            window: Sakoe-Chiba窗口宽度（交易日），为空时不限制
+
+        Returns:
+            float: 相似度得分
+        """
+        series1 = []
+        series2 = []
+
+        # 根据选择的指标构建多维序列
+        for indicator in ["close", "high", "low"]:
+            if indicator in indicators:
+                ycp1, ycp2 = _float_values(stock1, 'ycp'), _float_values(stock2, 'ycp')
+                series1.append((_float_values(stock1, indicator) - ycp1) / ycp1)
+                series2.append((_float_values(stock2, indicator) - ycp2) / ycp2)
+
+        if "turnover" in indicators:
+            # 计算相对换手率
+            vol1, vol2 = _float_values(stock1, 'vol'), _float_values(stock2, 'vol')
+            series1.append(vol1 / np.nanmax(vol1))
+            series2.append(vol2 / np.nanmax(vol2))
+
+        # 如果没有选择任何指标，返回0
+        if not series1:
+            return 0.0
+
+        # 所有指标作为一条多维序列计算DTW距离
+        distance = dtw_distance(
+            np.column_stack(series1),
+            np.column_stack(series2),
+            window=window
+        )
+        # 转换为相似度得分（距离越小，相似度越高）
+        similarity = 1 / (1 + distance)
+        return similarity
+
+    def _calculate_cointegration_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str]
+    ) -> float:
+        """使用协整性检验计算两只股票的相似度
+
+        Args:
+            stock1: 第一只股票数据
+            stock2: 第二只股票数据
+            indicators: 用于计算的指标列表
+
+        Returns:
+            float: 相似度得分
+        """
+        p_values = []
+
+        # 检查数据长度是否足够
+        if len(stock1) <= 25 or len(stock2) <= 25:
+            return 0.0
+
+        # 根据选择的指标计算协整性p值
+        if "close" in indicators:
+            stock1_close_change = (stock1['close'] - stock1['ycp']) / stock1['ycp']
+            stock2_close_change = (stock2['close'] - stock2['ycp']) / stock2['ycp']
+            _, p_val, _ = ts.coint(stock1_close_change.values, stock2_close_change.values)
+            p_values.append(p_val)
+
+        if "high" in indicators:
+            # 计算最高价涨幅
+            stock1_high_change = (stock1['high'] - stock1['ycp']) / stock1['ycp']
+            stock2_high_change = (stock2['high'] - stock2['ycp']) / stock2['ycp']
+            _, p_val, _ = ts.coint(stock1_high_change.values, stock2_high_change.values)
+            p_values.append(p_val)
+
+        if "low" in indicators:
+            # 计算最低价涨幅
+            stock1_low_change = (stock1['low'] - stock1['ycp']) / stock1['ycp']
+            stock2_low_change = (stock2['low'] - stock2['ycp']) / stock2['ycp']
+            _, p_val, _ = ts.coint(stock1_low_change.values, stock2_low_change.values)
+            p_values.append(p_val)
+
+        if "turnover" in indicators:
+            # 计算相对换手率
+            stock1_turnover = stock1['vol'] / stock1['vol'].max()
+            stock2_turnover = stock2['vol'] / stock2['vol'].max()
+            _, p_val, _ = ts.coint(stock1_turnover.values, stock2_turnover.values)
+            p_values.append(p_val)
+
+        # 如果没有选择任何指标，返回0
+        if not p_values:
+            return 0.0
+
+        # 计算平均p值
+        avg_p_val = np.mean(p_values)
+
+        # 转换为相似度得分（p值越小，协整性越强，相似度越高）
+        # 使用1-p值作为相似度，但限制在0到1之间
+        similarity = 1/(1+avg_p_val)
+        return similarity
+
+    def _calculate_pearson_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str]
+    ) -> float:
+        """使用皮尔逊相关系数计算两只股票的相似度
+
+        Args:
+            stock1: 第一只股票数据
+            stock2: 第二只股票数据
+            indicators: 用于计算的指标列表
+
+        Returns:
+            float: 相似度得分
+        """
+        try:
+            # 1. 数据预处理优化
+            if len(stock1) <= 25 or len(stock2) <= 25:
+                return 0.0
+
+            # 2. 预计算所有指标的变化率（以 float64 数组计算，不修改传入的数据）
+            changes = {}
+            for df, prefix in [(stock1, '1'), (stock2, '2')]:
+                ycp = _float_values(df, 'ycp')
+                vol = _float_values(df, 'vol')
+                changes[f'close_{prefix}'] = (_float_values(df, 'close') - ycp) / ycp
+                changes[f'high_{prefix}'] = (_float_values(df, 'high') - ycp) / ycp
+                changes[f'low_{prefix}'] = (_float_values(df, 'low') - ycp) / ycp
+                changes[f'turnover_{prefix}'] = vol / np.nanmax(vol)
+
+            # 3. 使用向量化操作计算相关系数
+            pearson_values = []
+            for indicator in indicators:
+                if indicator == "close":
+                    corr = np.corrcoef(changes['close_1'], changes['close_2'])[0, 1]
+                elif indicator == "high":
+                    corr = np.corrcoef(changes['high_1'], changes['high_2'])[0, 1]
+                elif indicator == "low":
+                    corr = np.corrcoef(changes['low_1'], changes['low_2'])[0, 1]
+                elif indicator == "turnover":
+                    corr = np.corrcoef(changes['turnover_1'], changes['turnover_2'])[0, 1]
+                
+                if not np.isnan(corr):
+                    pearson_values.append(corr)
+
+            # 4. 计算最终相似度
+            if not pearson_values:
+                return 0.0
+
+            avg_pearson = np.mean(pearson_values)
+            return max(0.0, avg_pearson) if avg_pearson > 0 else 0.0
+
+        except Exception as e:
+            logger.error(f"计算皮尔逊相关系数时出错: {e}")
+            return 0.0
+
+    def _calculate_euclidean_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str]
+    ) -> float:
+        """使用欧氏距离计算两只股票的相似度"""
+        distances = []
+
+        if "close" in indicators:
+            # 标准化收盘价
+            ycp1, ycp2 = _float_values(stock1, 'ycp'), _float_values(stock2, 'ycp')
+            stock1_close_change = (_float_values(stock1, 'close') - ycp1) / ycp1
+            stock2_close_change = (_float_values(stock2, 'close') - ycp2) / ycp2
+            dist = np.sqrt(np.sum((stock1_close_change - stock2_close_change) ** 2))
+            distances.append(dist)
+
+        # 其余代码保持不变...
+
+        if not distances:
+            return 0.0
+
+        # 平均距离
+        avg_dist = np.mean(distances)
+
+        # 转换为相似度得分
+        similarity = 1 / (1 + avg_dist)
+
+        return similarity
+
+    def _create_price_graph(self, df: pd.DataFrame, indicators: List[str]) -> nx.Graph:
+        """
+        将单个股票的K线数据转换为图结构，根据指定的指标创建节点特征
+
+        Args:
+            df: 包含K线数据的DataFrame，以timestamps为索引
+            indicators: 用于构建图的指标列表
+
+        Returns:
+            nx.Graph: NetworkX图对象
+        """
+        G = nx.Graph()
+        # 只取用到的数值列，以 float64 构建新的 DataFrame，不修改原始数据
+        numeric_cols = ['close', 'high', 'low', 'ycp', 'vol']
+        df = pd.DataFrame({col: _float_values(df, col) for col in numeric_cols if col in df.columns}, index=df.index)
+
+        # 预先计算相对换手率，如果需要且有相关数据
+        if "turnover" in indicators and 'vol' in df.columns:
+            max_vol = df['vol'].max()
+            if max_vol != 0:
+                df['relative_turnover'] = df['vol'].apply(lambda x: x / max_vol)
+            else:
+                df['relative_turnover'] = df['vol'].apply(lambda x: float('0'))
+
+        # 为每个交易日创建节点，只包含指定的指标特征
+        for idx, row in df.iterrows():
+            node_features = {'date': idx}
+
+            # 根据指定的指标添加对应的特征，但要确保列存在
+            if "close" in indicators and 'close' in df.columns:
+                close_change = (row['close'] - row['ycp']) / row['ycp'] if row['ycp'] != 0 else float('0')
+                node_features['close_change'] = close_change
+            if "high" in indicators and 'high' in df.columns and 'ycp' in df.columns:
+                # 计算最高价涨幅
+                high_change = (row['high'] - row['ycp']) / row['ycp'] if row['ycp'] != 0 else float('0')
+                node_features['high_change'] = high_change
+
+            if "low" in indicators and 'low' in df.columns and 'ycp' in df.columns:
+                # 计算最低价涨幅
+                low_change = (row['low'] - row['ycp']) / row['ycp'] if row['ycp'] != 0 else float('0')
+                node_features['low_change'] = low_change
+
+            if "turnover" in indicators and 'relative_turnover' in df.columns:
+                node_features['relative_turnover'] = row['relative_turnover']
+
+            G.add_node(idx, **node_features)
+
+        # 创建边连接相邻的交易日
+        dates = list(df.index)
+        for i in range(len(dates) - 1):
+            current_date = dates[i]
+            next_date = dates[i + 1]
+
+            # 初始化边权重
+            edge_weight = float('0')
+            edge_count = 0
+
+            # 根据指定的指标计算边的权重，检查特征是否存在
+            if "close" in indicators and 'close_change' in G.nodes[current_date] and 'close_change' in G.nodes[next_date]:
+                close_diff = abs(G.nodes[next_date]['close_change'] - G.nodes[current_date]['close_change'])
+                edge_weight += close_diff
+                edge_count += 1
+
+            if "high" in indicators and 'high_change' in G.nodes[current_date] and 'high_change' in G.nodes[next_date]:
+                high_diff = abs(G.nodes[next_date]['high_change'] - G.nodes[current_date]['high_change'])
+                edge_weight += high_diff
+                edge_count += 1
+
+            if "low" in indicators and 'low_change' in G.nodes[current_date] and 'low_change' in G.nodes[next_date]:
+                low_diff = abs(G.nodes[next_date]['low_change'] - G.nodes[current_date]['low_change'])
+                edge_weight += low_diff
+                edge_count += 1
+
+            if "turnover" in indicators and 'relative_turnover' in G.nodes[current_date] and 'relative_turnover' in \
+                    G.nodes[next_date]:
+                turnover_diff = abs(
+                    G.nodes[next_date]['relative_turnover'] - G.nodes[current_date]['relative_turnover'])
+                edge_weight += turnover_diff
+                edge_count += 1
+
+            # 计算平均边权重，确保不同指标数量下的权重可比
+            if edge_count > 0:
+                edge_weight = edge_weight / float(str(edge_count))
+            else:
+                edge_weight = float('0')  # 如果没有共同特征，设置权重为0
+
+            G.add_edge(current_date, next_date, weight=edge_weight)
+        return G
+
+    def _calculate_mcs_similarity(self, G1: nx.Graph, G2: nx.Graph, indicators: List[str],
+                                  tolerance: Optional[float] = None) -> float:
+        """
+        计算两个价格图之间的最大公共子图相似度
+
+        价格图是按交易日相连的路径，最大公共子图由最长公共对齐子路径动态规划精确求得，结果确定且不限制节点数
+
+        Args:
+            G1: 第一个图
+            G2: 第二个图
+            indicators: 用于计算相似度的指标列表
+            tolerance: 边权重容差，为空时使用配置值
+
+        Returns:
+            float: Tanimoto 系数形式的相似度，范围在0-1之间
+        """
+        if G1.number_of_nodes() == 0 or G2.number_of_nodes() == 0:
+            return 0.0
+        # 存在不支持的指标时节点之间互不兼容
+        if any(indicator not in INDICATOR_FEATURES for indicator in indicators):
+            return 0.0
+        tolerance = StockConfig.stock_mcs_edge_tolerance if tolerance is None else tolerance
+        path_weights = []
+        for G in (G1, G2):
+            nodes = list(G.nodes())
+            path_weights.append(np.array([G[u][v]['weight'] for u, v in zip(nodes, nodes[1:])], dtype=float))
+        common = int(longest_common_subpath(path_weights[0], path_weights[1][None, :], tolerance)[0]) + 1
+        return float(common) / (G1.number_of_nodes() + G2.number_of_nodes() - common)
+
+    def _calculate_graph_similarity(self, G1: nx.Graph, G2: nx.Graph, indicators: List[str]) -> float:
+        """
+        计算两个图之间的相似度，基于图编辑距离的价格轨迹相似度，
+        根据指定的指标单独计算相似度，然后综合得出最终相似度
+
+        Args:
+            G1: 第一个图
+            G2: 第二个图
+            indicators: 用于计算相似度的指标列表
+
+        Returns:
+            float: 相似度得分，范围在0-1之间，1表示完全相似
+        """
+        logger.warning("==== 进入图编辑距离相似度计算 ====")
+        # 获取两个图的共同节点
+        common_dates = set(G1.nodes()) & set(G2.nodes())
+        if not common_dates:
+            return 0.0
+        logger.warning(f"共同节点数: {len(common_dates)}")
+
+        # 为每个指标单独计算相似度
+        similarity_scores = []
+
+        # 对于每个指标，首先检查所有共同节点是否都有该特征
+        # 计算"close"指标的相似度
+        if "close" in indicators:
+            close_nodes = [date for date in common_dates if 'close_change' in G1.nodes[date] and 'close_change' in G2.nodes[date]]
+            if close_nodes:
+                close_diff_total = float('0')
+                for date in close_nodes:
+                    node1 = G1.nodes[date]
+                    node2 = G2.nodes[date]
+                    # 计算收盘价差异
+                    close_diff = abs(node1['close_change'] - node2['close_change'])
+
+                    close_diff_total += close_diff
+
+                # 计算平均差异并转换为相似度分数
+                if len(close_nodes) > 0:
+                    avg_close_diff = close_diff_total / float(len(close_nodes))
+                    close_similarity = 1.0 / (1.0 + avg_close_diff)  # 距离越大相似度越小，但不会直接为0
+                    logger.warning(f"close指标: 平均差异={avg_close_diff}, 相似度={close_similarity}")
+                    # 确保结果在0-1之间
+                    close_similarity = max(min(close_similarity, float('1')), float('0'))
+                    similarity_scores.append(close_similarity)
+
+        # 计算"high"指标的相似度
+        if "high" in indicators:
+            high_nodes = [date for date in common_dates if
+                          'high_change' in G1.nodes[date] and 'high_change' in G2.nodes[date]]
+            if high_nodes:
+                high_diff_total = float('0')
+                for date in high_nodes:
+                    node1 = G1.nodes[date]
+                    node2 = G2.nodes[date]
+                    # 计算最高价涨幅差异
+                    high_diff = abs(node1['high_change'] - node2['high_change'])
+                    high_diff_total += high_diff
+
+                # 计算平均差异并转换为相似度分数
+                if len(high_nodes) > 0:
+                    avg_high_diff = high_diff_total / float(str(len(high_nodes)))
+                    high_similarity = float('1') / (float('1') + avg_high_diff)  # 使用倒数转换为相似度
+                    logger.warning(f"high指标: 平均差异={avg_high_diff}, 相似度={high_similarity}")
+                    # 确保结果在0-1之间
+                    high_similarity = max(min(high_similarity, float('1')), float('0'))
+                    similarity_scores.append(high_similarity)
+
+        # 计算"low"指标的相似度
+        if "low" in indicators:
+            low_nodes = [date for date in common_dates if
+                         'low_change' in G1.nodes[date] and 'low_change' in G2.nodes[date]]
+            if low_nodes:
+                low_diff_total = float('0')
+                for date in low_nodes:
+                    node1 = G1.nodes[date]
+                    node2 = G2.nodes[date]
+                    # 计算最低价涨幅差异
+                    low_diff = abs(node1['low_change'] - node2['low_change'])
+                    low_diff_total += low_diff
+
+                # 计算平均差异并转换为相似度分数
+                if len(low_nodes) > 0:
+                    avg_low_diff = low_diff_total / float(str(len(low_nodes)))
+                    low_similarity = float('1') / (float('1') + avg_low_diff)  # 使用倒数转换为相似度
+                    logger.warning(f"low指标: 平均差异={avg_low_diff}, 相似度={low_similarity}")
+                    # 确保结果在0-1之间
+                    low_similarity = max(min(low_similarity, float('1')), float('0'))
+                    similarity_scores.append(low_similarity)
+
+        # 计算"turnover"指标的相似度
+        if "turnover" in indicators:
+            turnover_nodes = [date for date in common_dates if
+                              'relative_turnover' in G1.nodes[date] and 'relative_turnover' in G2.nodes[date]]
+            if turnover_nodes:
+                turnover_diff_total = float('0')
+                for date in turnover_nodes:
+                    node1 = G1.nodes[date]
+                    node2 = G2.nodes[date]
+                    # 计算相对换手率差异
+                    turnover_diff = abs(node1['relative_turnover'] - node2['relative_turnover'])
+                    turnover_diff_total += turnover_diff
+
+                # 计算平均差异并转换为相似度分数
+                if len(turnover_nodes) > 0:
+                    avg_turnover_diff = turnover_diff_total / float(str(len(turnover_nodes)))
+                    turnover_similarity = float('1') - avg_turnover_diff  # 直接转换为相似度
+                    logger.warning(f"turnover指标: 平均差异={avg_turnover_diff}, 相似度={turnover_similarity}")
+                    # 确保结果在0-1之间
+                    turnover_similarity = max(min(turnover_similarity, float('1')), float('0'))
+                    similarity_scores.append(turnover_similarity)
+
+        # 计算边相似度，仅当有共同边时
+        common_edges = set()
+        try:
+            # 获取两个图的所有边
+            G1_edges = [(min(u, v), max(u, v)) for u, v in G1.edges()]
+            G2_edges = [(min(u, v), max(u, v)) for u, v in G2.edges()]
+
+            # 找到共同的边
+            common_edges = set(G1_edges) & set(G2_edges)
+            logger.warning(f"共同边数: {len(common_edges)}")
+        except Exception as e:
+            logger.warning(f"计算边相似度时出错: {e}")
+
+        # 只有当存在共同边时才计算边相似度
+        if common_edges:
+            edge_diff_total = float('0')
+            edge_count = 0
+
+            for edge in common_edges:
+                try:
+                    # 确保边存在于两个图中
+                    if G1.has_edge(*edge) and G2.has_edge(*edge):
+                        weight1 = G1.get_edge_data(*edge).get('weight', float('0'))
+                        weight2 = G2.get_edge_data(*edge).get('weight', float('0'))
+                        edge_diff = abs(weight1 - weight2)
+                        edge_diff_total += edge_diff
+                        edge_count += 1
+                except Exception as e:
+                    logger.warning(f"处理边 {edge} 时出错: {e}")
+                    continue
+
+            if edge_count > 0:
+                avg_edge_diff = edge_diff_total / float(edge_count)
+                edge_similarity = 1.0 / (1.0 + avg_edge_diff)  # 距离越大相似度越小，但不会直接为0
+                logger.warning(f"边相似度: 平均差异={avg_edge_diff}, 相似度={edge_similarity}")
+                # 确保结果在0-1之间
+                edge_similarity = max(min(edge_similarity, float('1')), float('0'))
+                similarity_scores.append(edge_similarity)
+
+        # 如果没有任何相似度分数，返回0
+        if not similarity_scores:
+            return 0.0
+
+        # 计算所有相似度分数的平均值作为最终相似度
+        final_similarity = sum(similarity_scores) / float(len(similarity_scores))
+
+        # 确保结果在0-1之间并返回
+        final_similarity = max(min(final_similarity, float('1')), float('0'))
+        logger.warning(f"所有分数: {similarity_scores}")
+        logger.warning(f"最终相似度: {final_similarity}")
+        return float(final_similarity)  # 将float转换为float返回
+    def _calculate_shape_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str]
+    ) -> float:
+        """使用K线形状（上影线、实体、下影线）计算两只股票的相似度
+
+        Args:
+            stock1: 第一只股票数据
+            stock2: 第二只股票数据
+            indicators: 用于计算的指标列表（未用到，可保留）
+
+        Returns:
+            float: 相似度得分
+        """
+        # 权重设置
+        upper_weight = 0.33
+        body_weight = 0.34
+        lower_weight = 0.33
+        # 对齐日期
+        common_dates = stock1.index.intersection(stock2.index)
+        if len(common_dates) < 2:
+            logger.warning("股票对的共同交易日少于2天，无法计算形状相似度")
+            return 0.0
+
+        stock1_aligned = stock1.loc[common_dates]
+        stock2_aligned = stock2.loc[common_dates]
+
+        # 计算上影线、实体、下影线长度序列
+        def calc_shape_parts(df):
+            open_, close, high, low = (_float_values(df, col) for col in ['open', 'close', 'high', 'low'])
+            limit = _float_values(df, 'ycp') * 0.1
+            # 上影线
+            upper = np.where(open_ > close, (high - open_) / limit, (high - close) / limit)
+            # 下影线
+            lower = np.where(open_ > close, (close - low) / limit, (open_ - low) / limit)
+            # 实体
+            body = np.abs(open_ - close) / limit
+            return upper, body, lower
+
+        upper1, body1, lower1 = calc_shape_parts(stock1_aligned)
+        upper2, body2, lower2 = calc_shape_parts(stock2_aligned)
+
+        # 计算各部分的总和
+        sum_upper1, sum_upper2 = np.sum(upper1), np.sum(upper2)
+        sum_body1, sum_body2 = np.sum(body1), np.sum(body2)
+        sum_lower1, sum_lower2 = np.sum(lower1), np.sum(lower2)
+
+        # 相似度计算函数
+        def part_similarity(sum1, sum2):
+            if sum1 == 0 and sum2 == 0:
+                return 1.0
+            if (sum1 == 0 and sum2 != 0) or (sum1 != 0 and sum2 == 0):
+                return 0.0
+            return min(sum1, sum2) / max(sum1, sum2)
+
+        upper_sim = part_similarity(sum_upper1, sum_upper2)
+        body_sim = part_similarity(sum_body1, sum_body2)
+        lower_sim = part_similarity(sum_lower1, sum_lower2)
+
+        # 加权总相似度
+        similarity = upper_weight * upper_sim + body_weight * body_sim + lower_weight * lower_sim
+        return float(similarity)
+
+    def _calculate_position_similarity(
+            self,
+            stock1: pd.DataFrame,
+            stock2: pd.DataFrame,
+            indicators: List[str]
+    ) -> float:
+        """
+        使用位置序列计算两只股票的相似度
+
+        位置定义：
+        - 第一天位置为1
+        - 之后的位置为 (收盘价-作收价)/(作收价*0.1)
+
+        两个序列的位置相似性 = 较小的所有天数的位置和 / 较大的所有天数位置和
+        如果有且只有一个位置和为0，则相似度为0；如果两个都是0，则相似度为1。
+
+        Args:
+            stock1: 第一只股票数据
+            stock2: 第二只股票数据
+            indicators: 用于计算的指标列表（未用到，可保留）
+
+        Returns:
+            float: 相似度得分
+        """
+        # 对齐日期
+        common_dates = stock1.index.intersection(stock2.index)
+        if len(common_dates) < 2:
+            logger.warning("股票对的共同交易日少于2天，无法计算位置相似度")
+            return 0.0
+
+        stock1_aligned = stock1.loc[common_dates]
+        stock2_aligned = stock2.loc[common_dates]
+
+        # 计算位置序列
+        def calc_position(df):
+            pos = np.zeros(len(df))
+            pos[0] = 1  # 第一天为1
+            if len(df) > 1:
+                # 从第二天开始
+                close, ycp = _float_values(df, 'close')[1:], _float_values(df, 'ycp')[1:]
+                pos[1:] = (close - ycp) / (ycp * 0.1)
+            return pos
+
+        pos1 = calc_position(stock1_aligned)
+        pos2 = calc_position(stock2_aligned)
+
+        sum_pos1 = np.sum(pos1)
+        sum_pos2 = np.sum(pos2)
+
+        # 相似度计算
+        if sum_pos1 == 0 and sum_pos2 == 0:
+            return 1.0
+        if (sum_pos1 == 0 and sum_pos2 != 0) or (sum_pos1 != 0 and sum_pos2 == 0):
+            return 0.0
+        similarity = min(sum_pos1, sum_pos2) / max(sum_pos1, sum_pos2)
+        return float(similarity)
+
+
+def score_stock_chunk(
+        base_stock_data: pd.DataFrame,
+        payload: Dict[str, np.ndarray],
+        indicators: List[str],
+        method: str
+) -> List[Tuple[str, float]]:
+    """在计算进程中逐只计算一批候选股票与基准股票的相似度，图相似性方法由 score_graph_chunk 及 score_mcs_chunk 计算
+
+    Args:
+        base_stock_data: 基准股票数据，以交易日为索引
+        payload: 一批候选股票的打包行情
+        indicators: 用于计算的指标列表
+        method: 相似性计算方法
+
+    Returns:
+        List[Tuple[str, float]]: (股票代码, 相似度得分) 列表
+    """
+    calculator = StockSimilarityCalculator()
+    stocks = unpack_stock_frame(payload)
+    results = []
+    for code, stock_df in stocks.groupby('code', sort=False):
+        similarity = calculator._calculate_stock_similarity(base_stock_data, stock_df, indicators, method)
+        results.append((code, float(similarity)))
+    return results
+
+
+def score_graph_chunk(base_graph: PriceChainGraph, payload: Dict[str, np.ndarray]) -> List[Tuple[str, float]]:
+    """在计算进程中以数组运算一次性计算一批候选股票与基准股票价格图的图编辑相似度
+
+    Args:
+        base_graph: 基准股票的价格图
+        payload: 一批候选股票的打包行情
+
+    Returns:
+        List[Tuple[str, float]]: (股票代码, 相似度得分) 列表
+    """
+    frame = unpack_stock_frame(payload)
+    # 面板交易日取基准股票与候选股票交易日的并集，保留候选股票自身的相邻关系
+    dates = pd.DatetimeIndex(np.union1d(base_graph.dates, payload['timestamps']))
+    panel = SectionPanel.from_frame(frame, dates)
+    scores = graph_edit_similarity_batch(base_graph, panel)
+    return [(str(code), float(score)) for code, score in zip(panel.codes, scores)]
+
+
+def score_mcs_chunk(
+        base_graph: PriceChainGraph,
+        payload: Dict[str, np.ndarray],
+        indicators: List[str],
+        tolerance: float
+) -> List[Tuple[str, float]]:
+    """在计算进程中一次性计算一批候选股票与基准股票价格图的最大公共子图相似度
+
+    Args:
+        base_graph: 基准股票的价格图
+        payload: 一批候选股票的打包行情
+        indicators: 用于计算的指标列表
+        tolerance: 边权重容差
+
+    Returns:
+        List[Tuple[str, float]]: (股票代码, 相似度得分) 列表
+    """
+    codes, offsets = payload['codes'], payload['offsets']
+    if any(indicator not in INDICATOR_FEATURES for indicator in indicators):
+        return [(str(code), 0.0) for code in codes]
+    # 每只候选股票的行情按交易日排序后从位置0开始排列
+    lengths = np.diff(offsets)
+    rows = np.repeat(np.arange(len(codes)), lengths)
+    order = np.lexsort((payload['timestamps'], rows))
+    cols = np.arange(len(rows)) - np.repeat(offsets[:-1], lengths)
+    shape = (len(codes), int(lengths.max()) if len(lengths) else 0)
+    mask = np.zeros(shape, dtype=bool)
+    mask[rows, cols] = True
+    values = {}
+    for i, col in enumerate(PAYLOAD_COLUMNS):
+        values[col] = np.full(shape, np.nan)
+        values[col][rows, cols] = payload['values'][order, i]
+    scores = max_common_subgraph_similarity(base_graph, values, mask, tolerance)
+    return [(str(code), float(score)) for code, score in zip(codes, scores)]
+
+
+def score_stock_batch(
+        base_stock_data: pd.DataFrame,
+        payload: Dict[str, np.ndarray],
+        base_code: str,
+        indicators: List[str],
+        method: str,
+        dtw_window: Optional[int] = None,
+        top_k: Optional[int] = None
+) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """在计算进程中使用向量化方式计算整个板块的相似度
+
+    Args:
+        base_stock_data: 基准股票数据，以交易日为索引
+        payload: 板块内所有股票的打包行情
+        base_code: 基准股票代码，计算时排除
+        indicators: 用于计算的指标列表
+        method: 相似性计算方法，需为 BATCH_SIMILARITY_METHODS 中的方法
+        dtw_window: DTW的Sakoe-Chiba窗口宽度，仅dtw方法使用
+        top_k: 只需要的最相似股票数量，dtw方法据此进行下界剪枝与早停
+
+    Returns:
+        Tuple[Dict[str, float], Dict[str, int]]: 股票代码到相似度得分的映射及剪枝统计
+    """
+    stats = {}
+    scores = StockSimilarityCalculator()._calculate_batch_similarity(
+        base_stock_data,
+        unpack_stock_frame(payload),
+        base_code,
+        indicators,
+        method,
+        dtw_window=dtw_window,
+        top_k=top_k,
+        stats=stats
+    )
+    return scores, stats
+
+
+def score_store_batch(
+        store_path: str,
+        base_code: str,
+        codes: List[str],
+        start_date: str,
+        end_date: str,
+        indicators: List[str],
+        method: str,
+        dtw_window: Optional[int] = None,
+        top_k: Optional[int] = None
+) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """在计算进程中直接从逐日特征库读取板块面板并使用向量化方式计算相似度，
+    只有股票代码和日期需要在进程间传递
+
+    Args:
+        store_path: 逐日特征库目录
+        base_code: 基准股票代码，计算时排除
+        codes: 板块内的股票代码
+        start_date: 开始日期
+        end_date: 结束日期
+        indicators: 用于计算的指标列表
+        method: 相似性计算方法，需为 BATCH_SIMILARITY_METHODS 中的方法
+        dtw_window: DTW的Sakoe-Chiba窗口宽度，仅dtw方法使用
+        top_k: 只需要的最相似股票数量，dtw方法据此进行下界剪枝与早停
+
+    Returns:
+        Tuple[Dict[str, float], Dict[str, int]]: 股票代码到相似度得分的映射及剪枝统计
+    """
+    stats = {}
+    store = DailyFeatureStore.open(store_path)
+    dates = pd.DatetimeIndex(store.stock_frame(base_code, start_date, end_date).index)
+    panel = store.section_panel(codes, dates, exclude_code=base_code)
+    stats['panelCount'] = len(panel)
+    if len(panel) == 0:
+        return {}, stats
+    options = {'window': dtw_window, 'top_k': top_k, 'stats': stats} if method == 'dtw' else {}
+    scores = BATCH_SIMILARITY_METHODS[method](store.base_values(base_code, dates), panel, indicators, **options)
+    return {code: float(score) for code, score in zip(panel.codes, scores) if not np.isnan(score)}, stats
+
+
+def find_pattern_matches(
+        query: np.ndarray,
+        codes: np.ndarray,
+        dates: np.ndarray,
+        close: np.ndarray,
+        mask: np.ndarray,
+        top_k: int,
+        base_code: Optional[str] = None,
+        base_start: Optional[int] = None
+) -> List[Tuple[str, str, str, float]]:
+    """在计算进程中用 MASS 搜索与基准形态最接近的历史子序列
+
+    Args:
+        query: 基准形态的收盘价序列
+        codes: 参与搜索的股票代码
+        dates: 历史交易日
+        close: 形状为 股票 × 交易日 的收盘价矩阵
+        mask: 有效性掩码
+        top_k: 返回的匹配数量
+        base_code: 基准股票代码，其自身在基准形态附近的平凡匹配被排除
+        base_start: 基准形态在历史交易日中的起始位置
+
+    Returns:
+        List[Tuple[str, str, str, float]]: (股票代码, 开始日期, 结束日期, 距离) 列表，按距离升序排列
+    """
+    m = len(query)
+    # 停牌日沿用前一交易日的收盘价，上市前的交易日仍为空值
+    filled = pd.DataFrame(np.where(mask, close, np.nan)).ffill(axis=1).to_numpy()
+    profiles = mass_distance_profiles(np.asarray(query, dtype=float), filled)
+    exclusion = max(1, m // 2)
+    if base_code is not None and base_start is not None:
+        for row in np.flatnonzero(np.asarray(codes) == base_code):
+            profiles[row, max(0, base_start - exclusion):base_start + exclusion + 1] = np.inf
+    days = np.asarray(dates, dtype='datetime64[D]')
+    return [
+        (str(codes[row]), str(days[start]), str(days[start + m - 1]), distance)
+        for row, start, distance in top_matches(profiles, top_k, exclusion)
+    ]
+
+
+def search_store_pattern(
+        store_path: str,
+        base_code: str,
+        codes: List[str],
+        start_date: str,
+        end_date: str,
+        history_start: str,
+        history_end: str,
+        top_k: int
+) -> Tuple[List[Tuple[str, str, str, float]], int, int]:
+    """在计算进程中直接从逐日特征库读取板块历史收盘价并搜索形态
+
+    Args:
+        store_path: 逐日特征库目录
+        base_code: 基准股票代码
+        codes: 参与搜索的股票代码
+        start_date: 基准形态的开始日期
+        end_date: 基准形态的结束日期
+        history_start: 搜索历史的开始日期
+        history_end: 搜索历史的结束日期
+        top_k: 返回的匹配数量
+
+    Returns:
+        Tuple[List[Tuple[str, str, str, float]], int, int]: 匹配列表、基准形态的交易日数及参与搜索的股票数量
+    """
+    store = DailyFeatureStore.open(store_path)
+    query = store.stock_frame(base_code, start_date, end_date)['close'].to_numpy(dtype=float)
+    dates = store.window_dates(history_start, history_end)
+    panel = store.section_panel(codes, pd.DatetimeIndex(dates.astype('datetime64[ns]')), columns=['close'])
+    base_start = int(np.searchsorted(dates, np.datetime64(start_date, 'D')))
+    matches = find_pattern_matches(query, panel.codes, dates, panel.values['close'], panel.mask, top_k,
+                                   base_code, base_start)
+    return matches, len(query), len(panel)
@@ -1,36 +1,240 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import networkx as nx
-import pandas as pd
 import numpy as np
-from fastdtw import fastdtw
+import pandas as pd
 
+from config.env import StockConfig
+from config.get_executor import ProcessPoolUtil
 from entity.vo.kLine_vo import StockBase
 from module_stock.dao.similar_dao import SimilarDao
 from module_stock.entity.vo.similar_vo import *
+from module_stock.service.market_index_service import MARKET_SECTION_LEVEL, MarketIndexService
+from module_stock.service.sector_panel_service import SectorPanelService
+from module_stock.service.security_master_service import SecurityMasterService
+from module_stock.service.similarity_cache_service import SimilarityCacheService
+from module_stock.service.similar_calculate_service import (
+    StockSimilarityCalculator,
+    find_pattern_matches,
+    pack_stock_frame,
+    score_graph_chunk,
+    score_mcs_chunk,
+    score_stock_batch,
+    score_stock_chunk,
+    score_store_batch,
+    search_store_pattern,
+    split_stock_payload,
+)
+from utils.feature_store_util import DailyFeatureStore
+from utils.price_graph_util import PriceChainGraph
+from utils.similarity_util import BATCH_SIMILARITY_METHODS, SectionPanel, cumulative_returns
+from utils.trading_calendar_util import TradingCalendarUtil
 import logging
-import statsmodels.tsa.stattools as ts
-import random
 logger = logging.getLogger(__name__)
 
+# 形态搜索默认回看的年数
+PATTERN_HISTORY_YEARS = 5
+# 进度回调：参数为已计算的候选股票数量、候选股票总数及已计算部分中的前K个相似股票
+ProgressCallback = Callable[[int, int, List[SimilarStock]], Awaitable[None]]
+# 等待其他进程完成相同计算时轮询计算锁的间隔（秒）
+SINGLE_FLIGHT_POLL_INTERVAL = 0.2
+
 
-class StockSimilarityService:
+class StockSimilarityService(StockSimilarityCalculator):
     """股票相似性计算服务"""
 
+    # 本进程内正在进行的缓存计算，键为缓存键名及计算的相似股票数量
+    _inflight: Dict[str, asyncio.Task] = {}
+
     def __init__(self):
         """初始化服务"""
         self.similar_dao = SimilarDao()
 
-    async def calculate_similarity(self, request: StockSimilarityRequest) -> StockSimilarityResponse:
+    async def calculate_similarity_cached(self, redis, request: StockSimilarityRequest,
+                                          progress: Optional[ProgressCallback] = None) -> StockSimilarityResponse:
+        """计算股票相似性，优先使用结果缓存
+
+        缓存未命中时按缓存长度计算并缓存完整的排序结果，之后只改变相似股票数量的请求直接由缓存返回。
+        相同的并发请求只计算一次：实际计算的请求逐批汇报进度，等待其结果的请求在结果可用时汇报一次进度
+
+        Args:
+            redis: Redis连接对象
+            request: 包含计算参数的请求对象
+            progress: 进度回调，为空时不汇报进度
+
+        Returns:
+            StockSimilarityResponse: 计算结果响应
+        """
+        if not SimilarityCacheService.available():
+            # 缓存键包含最新交易日，交易日历未加载时不使用缓存，直接计算
+            logger.warning("交易日历未加载，跳过相似性结果缓存")
+            return await self.calculate_similarity(request, progress)
+        cached = await SimilarityCacheService.get(redis, request)
+        if cached is not None:
+            if progress is not None:
+                await progress(cached.candidateCount, cached.candidateCount, cached.similarStocks)
+            return cached
+        # 相同的并发请求合并为一次计算：本进程内共享同一个计算任务，进程之间由 Redis 锁保证只有一个进程计算
+        depth_request = request.model_copy(update={'similarCount': SimilarityCacheService.cache_depth(request)})
+        cache_key = SimilarityCacheService.cache_key(depth_request)
+        flight_key = f'{cache_key}:{depth_request.similarCount}'
+        task = self._inflight.get(flight_key)
+        joined = task is not None
+        if not joined:
+            task = asyncio.ensure_future(self._calculate_single_flight(redis, depth_request, cache_key, progress))
+            StockSimilarityService._inflight[flight_key] = task
+            task.add_done_callback(lambda _: StockSimilarityService._inflight.pop(flight_key, None))
+        # 某个请求被取消时不影响其他等待同一计算的请求
+        response = await asyncio.shield(task)
+        if joined and progress is not None:
+            await progress(response.candidateCount, response.candidateCount, response.similarStocks)
+        if not response.similarStocks:
+            return response
+        return SimilarityCacheService.truncate(response, request.similarCount)
+
+    async def calculate_similarity_events(self, redis, request: StockSimilarityRequest
+                                          ) -> AsyncIterator[Tuple[str, BaseModel]]:
+        """流式计算股票相似性：每批候选股票计算完成后产生当前的前K个相似股票，最后产生完整结果
+
+        客户端中途断开时计算继续进行，结果仍写入缓存
+
+        Args:
+            redis: Redis连接对象
+            request: 包含计算参数的请求对象
+
+        Yields:
+            Tuple[str, BaseModel]: (事件名, 数据)，事件名为 partial、result 或 error
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def progress(scored: int, total: int, similar_stocks: List[SimilarStock]):
+            await queue.put(('partial', SimilarityPartialResult(
+                similarStocks=similar_stocks[:request.similarCount], scoredCount=scored, candidateCount=total
+            )))
+
+        task = asyncio.ensure_future(self.calculate_similarity_cached(redis, request, progress))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+        try:
+            yield 'result', task.result()
+        except Exception as e:
+            logger.error(f"流式计算股票相似性失败: {e}")
+            yield 'error', SimilarityStreamError(message=str(e))
+
+    async def _calculate_single_flight(self, redis, depth_request: StockSimilarityRequest, cache_key: str,
+                                       progress: Optional[ProgressCallback] = None) -> StockSimilarityResponse:
+        """获取计算锁后计算并写入缓存，锁被其他进程持有时等待其计算结果
+
+        持有锁的进程异常退出后锁因过期自动释放，等待的进程随即重新竞争锁；等待超过上限时不再等待，直接计算。
+        自身计算时逐批汇报进度，使用其他进程写入的缓存时汇报一次进度
+
+        Args:
+            redis: Redis连接对象
+            depth_request: 相似股票数量为缓存长度的请求对象
+            cache_key: 缓存键名
+            progress: 进度回调，为空时不汇报进度
+
+        Returns:
+            StockSimilarityResponse: 按缓存长度截取的计算结果
+        """
+        deadline = asyncio.get_running_loop().time() + StockConfig.stock_similarity_lock_wait
+        while True:
+            # 只有计算锁的读写失败时才回退为不加锁计算，计算本身的异常直接抛出
+            try:
+                token = await SimilarityCacheService.acquire_lock(redis, cache_key)
+                if token is None:
+                    released = await self._wait_lock_release(redis, cache_key, deadline)
+                    cached = await SimilarityCacheService.read(redis, cache_key, depth_request.similarCount) \
+                        if released else None
+            except Exception as e:
+                logger.error(f"相似性计算锁不可用，直接计算: {e}")
+                return await self._calculate_and_cache(redis, depth_request, progress=progress)
+            if token is not None:
+                return await self._calculate_and_cache(redis, depth_request, token, progress)
+            if not released:
+                logger.warning(f"等待相似性计算锁超时，直接计算: {cache_key}")
+                return await self._calculate_and_cache(redis, depth_request, progress=progress)
+            # 锁已释放：持有者写入的缓存足够时直接使用，否则（计算结果为空或持有者异常退出）重新竞争锁
+            if cached is not None:
+                if progress is not None:
+                    await progress(cached.candidateCount, cached.candidateCount, cached.similarStocks)
+                return cached
+
+    @staticmethod
+    async def _wait_lock_release(redis, cache_key: str, deadline: float) -> bool:
+        """等待其他进程释放计算锁
+
+        Returns:
+            bool: 锁是否在截止时间前释放
+        """
+        loop = asyncio.get_running_loop()
+        while await SimilarityCacheService.lock_exists(redis, cache_key):
+            if loop.time() > deadline:
+                return False
+            await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        return True
+
+    async def _calculate_and_cache(self, redis, depth_request: StockSimilarityRequest, token: Optional[str] = None,
+                                   progress: Optional[ProgressCallback] = None) -> StockSimilarityResponse:
+        """计算并写入缓存，持有计算锁时在计算期间定期续期并在结束后释放
+
+        Args:
+            redis: Redis连接对象
+            depth_request: 相似股票数量为缓存长度的请求对象
+            token: 计算锁令牌，为空表示未持有锁
+            progress: 进度回调
+
+        Returns:
+            StockSimilarityResponse: 按缓存长度截取的计算结果
+        """
+        cache_key = SimilarityCacheService.cache_key(depth_request)
+        heartbeat = asyncio.ensure_future(self._keep_lock(redis, cache_key, token)) if token else None
+        try:
+            response = await self.calculate_similarity(depth_request, progress)
+            if not response.similarStocks:
+                return response
+            # 由缓存内容截取结果，保证命中与未命中时返回的数据一致
+            value = await SimilarityCacheService.set(redis, depth_request, response)
+            return SimilarityCacheService.decode(value, depth_request.similarCount)
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+                await SimilarityCacheService.release_lock(redis, cache_key, token)
+
+    @staticmethod
+    async def _keep_lock(redis, cache_key: str, token: str):
+        """计算期间定期续期计算锁"""
+        while True:
+            await asyncio.sleep(StockConfig.stock_similarity_lock_ttl / 3)
+            try:
+                if not await SimilarityCacheService.refresh_lock(redis, cache_key, token):
+                    logger.warning(f"相似性计算锁已失效: {cache_key}")
+                    return
+            except Exception as e:
+                logger.error(f"相似性计算锁续期失败: {e}")
+
+    async def calculate_similarity(self, request: StockSimilarityRequest,
+                                   progress: Optional[ProgressCallback] = None) -> StockSimilarityResponse:
         """计算股票相似性
 
         Args:
             request: 包含计算参数的请求对象
+            progress: 进度回调，为空时不汇报进度
 
         Returns:
             StockSimilarityResponse: 计算结果响应
         """
         try:
+            # 向量化方法在逐日特征库覆盖请求区间时直接从特征库读取，不再查询 ClickHouse
+            if request.similarityMethod in BATCH_SIMILARITY_METHODS:
+                store = DailyFeatureStore.open(StockConfig.stock_feature_store_path)
+                if store is not None and store.covers(request.startDate, request.endDate) \
+                        and request.stockCode in store.code_index:
+                    return await self._calculate_similarity_from_store(request, store, progress)
             # 1. 获取基准股票数据
             base_stock_data = await self.similar_dao.get_stock_data(
                 request.stockCode,
@@ -39,78 +243,85 @@ class StockSimilarityService:
             )
             # 2. 获取所有同板块股票列表用于比较
 
-            section_stocks_list =await self.get_section_all_stock_code(request.stockCode, request.sectionLevel)
-            all_stocks = await self.similar_dao.get_section_stock_info(section_stocks_list,request.startDate,request.endDate)
+            section_stocks_list = await self.get_section_all_stock_code(
+                request.stockCode, request.sectionLevel, request.startDate, request.endDate
+            )
+            # 板块行情优先由进程内缓存的板块面板截取
+            all_stocks = await SectorPanelService.get_section_stock_info(
+                request.stockCode, request.sectionLevel, section_stocks_list, request.startDate, request.endDate
+            )
             # 检查数据框是否为空
             if all_stocks.empty:
                 logger.warning("没有找到任何股票数据")
                 return StockSimilarityResponse(similarStocks=[],performanceData=[])
             # 3. 计算每只股票与基准股票的相似度
             similar_stocks = []
-            unique_codes = all_stocks['code'].unique()
-            # 如果请求的相似性方法是图匹配或者最大公共子图
-            if request.similarityMethod in ["graphEditing", "maxCommonSubgraph"]:
-                # 构建基础股票的图
-                base_stock_graph = self._create_price_graph(base_stock_data, request.indicators)
-
-                for code in unique_codes:
-                    if code == request.stockCode:
-                        continue  # 跳过基准股票自身
-
-                    # 获取当前细分行业股票的所有数据行
-                    stock_df = all_stocks[all_stocks['code'] == code]
-
-                    # 构建比较股票的图
-                    stock_graph = self._create_price_graph(stock_df, request.indicators)
-
-                    # 根据方法选择相应的相似度计算函数
-                    if request.similarityMethod == "maxCommonSubgraph":
-                        similarity = self._calculate_mcs_similarity(base_stock_graph, stock_graph, request.indicators)
-                    else:  # graphMatching
-                        similarity = self._calculate_graph_similarity(base_stock_graph, stock_graph, request.indicators)
-
-                    # 获取股票名称
-                    stock_info = await self.similar_dao.get_stock_info(code)
-                    stock_name = stock_info['name']
-
-                    similar_stocks.append({
-                        "code": code,
-                        "name": stock_name,
-                        "similarity": float(similarity)  # 确保转换为float类型
-                    })
+            # 候选股票数量及DTW前K搜索的剪枝统计
+            candidate_codes = all_stocks.loc[all_stocks['code'] != request.stockCode, 'code']
+            search_stats = {'candidateCount': int(candidate_codes.nunique())}
+            # 相似度计算为CPU密集型，将候选股票打包为紧凑的 numpy 数组后交给进程池计算，避免阻塞事件循环
+            payload = pack_stock_frame(all_stocks[all_stocks['code'] != request.stockCode])
+            if request.similarityMethod in BATCH_SIMILARITY_METHODS:
+                # 向量化方法：构建对齐的 股票 × 交易日 面板后一次性计算所有候选股票
+                scores, batch_stats = await ProcessPoolUtil.run(
+                    score_stock_batch,
+                    base_stock_data,
+                    payload,
+                    request.stockCode,
+                    request.indicators,
+                    request.similarityMethod,
+                    request.dtwWindow,
+                    request.similarCount
+                )
+                search_stats.update(batch_stats)
+                scored = list(scores.items())
             else:
-                # 使用其他相似度计算方法
-                for code in unique_codes:
-                    if code == request.stockCode:
-                        continue  # 跳过基准股票自身
-
-                    # 获取当前股票的所有数据行
-                    stock_df = all_stocks[all_stocks['code'] == code]
-
-                    # 计算相似度
-                    similarity = self._calculate_stock_similarity(
-                        base_stock_data,
-                        stock_df,
-                        request.indicators,
-                        request.similarityMethod
+                # 逐对计算的方法（图编辑距离、最大公共子图等）按批分发到多个计算进程
+                chunks = split_stock_payload(payload, StockConfig.stock_pool_chunk_size)
+                partial_scored = []
+                scored_count = 0
+
+                async def report(index: int, chunk_result: List[tuple]):
+                    # 每批计算完成后汇报已计算部分的前K个相似股票
+                    nonlocal scored_count
+                    scored_count += len(chunks[index]['codes'])
+                    partial_scored.extend(chunk_result)
+                    partial_stocks = await self._rank_similar_stocks(partial_scored, request.similarCount)
+                    await progress(
+                        scored_count, len(payload['codes']), [SimilarStock(**stock) for stock in partial_stocks]
                     )
 
-                    # 获取股票名称
-                    stock_info = await self.similar_dao.get_stock_info(code)
-                    stock_name = stock_info['name']
-
-                    similar_stocks.append({
-                        "code": code,
-                        "name": stock_name,
-                        "similarity": similarity
-                    })
-            # 4. 按相似度排序并截取指定数量
-            similar_stocks.sort(key=lambda x: x['similarity'], reverse=True)
-            similar_stocks = similar_stocks[:request.similarCount]
+                if request.similarityMethod == 'graphEditing':
+                    # 图编辑距离：基准股票的价格图只构建一次，每批候选股票以数组运算一次性计算
+                    base_graph = PriceChainGraph.from_frame(base_stock_data, request.indicators)
+                    score_func, args_list = score_graph_chunk, [(base_graph, chunk) for chunk in chunks]
+                elif request.similarityMethod == 'maxCommonSubgraph':
+                    # 最大公共子图：价格图为按交易日相连的路径，以最长公共对齐子路径的动态规划精确计算
+                    base_graph = PriceChainGraph.from_frame(base_stock_data, request.indicators)
+                    score_func = score_mcs_chunk
+                    args_list = [(base_graph, chunk, request.indicators, StockConfig.stock_mcs_edge_tolerance)
+                                 for chunk in chunks]
+                else:
+                    score_func = score_stock_chunk
+                    args_list = [(base_stock_data, chunk, request.indicators, request.similarityMethod)
+                                 for chunk in chunks]
+                chunk_results = await ProcessPoolUtil.map(
+                    score_func, args_list, report if progress is not None else None
+                )
+                scored = [item for chunk_result in chunk_results for item in chunk_result]
+            similar_stocks = await self._rank_similar_stocks(scored, request.similarCount)
+            if progress is not None and request.similarityMethod in BATCH_SIMILARITY_METHODS:
+                await progress(len(payload['codes']), len(payload['codes']),
+                               [SimilarStock(**stock) for stock in similar_stocks])
             #5. 获取性能比较数据
+            similar_codes = [stock['code'] for stock in similar_stocks]
             performance_data = await self._get_performance_comparison(
                 base_stock_data,
-                [stock['code'] for stock in similar_stocks],
+                similar_codes,
+                SectionPanel.from_frame(
+                    all_stocks[all_stocks['code'].isin(similar_codes)],
+                    pd.DatetimeIndex(base_stock_data.index)
+                )
             )
             # 6. 构建响应对象
             response = StockSimilarityResponse(
@@ -122,6 +333,7 @@ class StockSimilarityService:
                     ) for stock in similar_stocks
                 ],
                 performanceData=performance_data,
+                **search_stats
             )
 
             return response
@@ -130,723 +342,189 @@ class StockSimilarityService:
             logger.error(f"Error calculating stock similarity: {e}")
             raise
 
-    async def get_section_all_stock_code(self,stock_code, section_level):
-        """
-        根据当前股票代码获取相同版块下的其他股票代码，并将输入的股票代码添加到返回值列表中。
-        :param section_level: 版块等级，1 表示当前具体等级分类下的股票，0 表示股票所在大版的股票。
-        :param stock_code:
-        :return: 包含输入股票代码以及符合条件的其他股票代码组成的列表。
-        """
-        stock_code_list = []
-        lc_csiinduspe = await self.similar_dao.get_stock_nums(stock_code, section_level)
-        if lc_csiinduspe.empty:
-            return [stock_code]
-        csi_indus_code = lc_csiinduspe['CSIIndusCode'].iloc[0]
-        if csi_indus_code is None:
-            return [stock_code]
-        board = lc_csiinduspe['board'].iloc[0]
-        first_industry_code = lc_csiinduspe['FirstIndustryCode'].iloc[0]
-        secu_name = lc_csiinduspe['SecuName'].iloc[0]
-        is_ST = 1 if any(secu_name.startswith(prefix) for prefix in ['ST', '*ST']) else 0
-
-        if (first_industry_code == csi_indus_code) or (section_level == 1):
-            temp_stock_code_list, _ = await self.similar_dao.get_stock(stock_code, csi_indus_code, board, 'CSIIndusCode',
-                                                                       is_ST)
-        else:
-            temp_stock_code_list, _ = await self.similar_dao.get_stock(stock_code, first_industry_code, board,
-                                                           'FirstIndustryCode', is_ST)
-
-        stock_code_list = [stock_code] + temp_stock_code_list
-
-        print(f"共找到{len(stock_code_list)}只股票")
-        return stock_code_list
-    def _calculate_stock_similarity(
-
+    async def _calculate_similarity_from_store(
             self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str],
-            method: str
-    ) -> float:
-        """计算两只股票的相似度
+            request: StockSimilarityRequest,
+            store: DailyFeatureStore,
+            progress: Optional[ProgressCallback] = None
+    ) -> StockSimilarityResponse:
+        """使用逐日特征库计算向量化方法的相似度，板块面板及累计收益率均直接由特征库构建
 
         Args:
-            stock1: 第一只股票数据
-            stock2: 第二只股票数据
-            indicators: 用于计算的指标列表
-            method: 相似性计算方法
-
-        Returns:
-            float: 相似度得分
-        """
-        if 'timestamps' in stock2.columns:
-            # 将该列转换为日期类型并设置为索引
-            stock2['timestamps'] = pd.to_datetime(stock2['timestamps'])
-            stock2.set_index('timestamps', inplace=True)
-        # 找到两只股票共同的交易日
-        common_dates = stock1.index.intersection(stock2.index)
-        if len(common_dates) < 2:
-            logger.warning("股票对的共同交易日少于2天，无法计算相似度")
-            return 0.0
-
-        stock1_aligned = stock1.loc[common_dates]
-        stock2_aligned = stock2.loc[common_dates]
-        # 根据指标选择和计算方法进行计算
-        if method == "dtw":
-            return self._calculate_dtw_similarity(stock1_aligned, stock2_aligned, indicators)
-        elif method == "pearson":
-            return self._calculate_pearson_similarity(stock1_aligned, stock2_aligned, indicators)
-        elif method == "euclidean":
-            return self._calculate_euclidean_similarity(stock1_aligned, stock2_aligned, indicators)
-        elif method == "coIntegration":
-            return self._calculate_cointegration_similarity(stock1_aligned, stock2_aligned, indicators)
-        elif method == "shape":
-            return self._calculate_shape_similarity(stock1_aligned, stock2_aligned, indicators)
-        elif method == "position":
-            return self._calculate_position_similarity(stock1_aligned, stock2_aligned, indicators)
-        else:
-            logger.warning(f"不支持的相似性计算方法: {method}，使用dtw代替")
-            return self._calculate_dtw_similarity(stock1_aligned, stock2_aligned, indicators)
-
-    def _calculate_dtw_similarity(
-            self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str]
-    ) -> float:
-        """使用DTW计算两只股票的相似度
-
-        Args:
-            stock1: 第一只股票数据
-            stock2: 第二只股票数据
-            indicators: 用于计算的指标列表
+            request: 包含计算参数的请求对象
+            store: 覆盖请求区间的逐日特征库
+            progress: 进度回调
 
         Returns:
-            float: 相似度得分
+            StockSimilarityResponse: 计算结果响应
         """
-        dtw_distances = []
-
-        # 根据选择的指标计算DTW距离
-        if "close" in indicators:
-            stock1_close_change = (stock1['close'] - stock1['ycp']) / stock1['ycp']
-            stock2_close_change = (stock2['close'] - stock2['ycp']) / stock2['ycp']
-            distance, _ = fastdtw(stock1_close_change.values, stock2_close_change.values,
-                                  dist=lambda x, y: ((x - y) ** 2) ** 0.5)
-            dtw_distances.append(distance)
-
-        if "high" in indicators:
-            # 计算最高价涨幅
-            stock1_high_change = (stock1['high'] - stock1['ycp']) / stock1['ycp']
-            stock2_high_change = (stock2['high'] - stock2['ycp']) / stock2['ycp']
-            distance, _ = fastdtw(stock1_high_change.values, stock2_high_change.values,
-                                  dist=lambda x, y: ((x - y) ** 2) ** 0.5)
-            dtw_distances.append(distance)
-
-        if "low" in indicators:
-            # 计算最低价涨幅
-            stock1_low_change = (stock1['low'] - stock1['ycp']) / stock1['ycp']
-            stock2_low_change = (stock2['low'] - stock2['ycp']) / stock2['ycp']
-            distance, _ = fastdtw(stock1_low_change.values, stock2_low_change.values,
-                                  dist=lambda x, y: ((x - y) ** 2) ** 0.5)
-            dtw_distances.append(distance)
-
-        if "turnover" in indicators:
-            # 计算相对换手率
-            stock1_turnover = stock1['vol'] / stock1['vol'].max()
-            stock2_turnover = stock2['vol'] / stock2['vol'].max()
-            distance, _ = fastdtw(stock1_turnover.values, stock2_turnover.values,
-                                  dist=lambda x, y: ((x - y) ** 2) ** 0.5)
-            dtw_distances.append(distance)
-
-        # 如果没有选择任何指标，返回0
-        if not dtw_distances:
-            return 0.0
-
-        # 计算平均DTW距离
-
-        avg_dtw = np.mean(dtw_distances)
-        # 转换为相似度得分（距离越小，相似度越高）
-        similarity = 1 / (1 + avg_dtw)
-        return similarity
-
-    def _calculate_cointegration_similarity(
-            self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str]
-    ) -> float:
-        """使用协整性检验计算两只股票的相似度
-
-        Args:
-            stock1: 第一只股票数据
-            stock2: 第二只股票数据
-            indicators: 用于计算的指标列表
+        base_stock_data = store.stock_frame(request.stockCode, request.startDate, request.endDate)
+        section_stocks_list = await self.get_section_all_stock_code(
+            request.stockCode, request.sectionLevel, request.startDate, request.endDate
+        )
+        # 计算进程自行打开特征库的内存映射文件，只需传递股票代码和日期
+        scores, batch_stats = await ProcessPoolUtil.run(
+            score_store_batch,
+            StockConfig.stock_feature_store_path,
+            request.stockCode,
+            section_stocks_list,
+            request.startDate,
+            request.endDate,
+            request.indicators,
+            request.similarityMethod,
+            request.dtwWindow,
+            request.similarCount
+        )
+        search_stats = {'candidateCount': batch_stats.pop('panelCount', 0), **batch_stats}
+        if base_stock_data.empty or not search_stats['candidateCount']:
+            logger.warning("没有找到任何股票数据")
+            return StockSimilarityResponse(similarStocks=[], performanceData=[])
+        similar_stocks = await self._rank_similar_stocks(list(scores.items()), request.similarCount)
+        if progress is not None:
+            await progress(search_stats['candidateCount'], search_stats['candidateCount'],
+                           [SimilarStock(**stock) for stock in similar_stocks])
+        similar_codes = [stock['code'] for stock in similar_stocks]
+        performance_data = await self._get_performance_comparison(
+            base_stock_data,
+            similar_codes,
+            store.section_panel(similar_codes, pd.DatetimeIndex(base_stock_data.index))
+        )
+        return StockSimilarityResponse(
+            similarStocks=[
+                SimilarStock(
+                    code=stock['code'],
+                    name=stock['name'],
+                    similarity=stock['similarity']
+                ) for stock in similar_stocks
+            ],
+            performanceData=performance_data,
+            **search_stats
+        )
 
-        Returns:
-            float: 相似度得分
-        """
-        p_values = []
-
-        # 检查数据长度是否足够
-        if len(stock1) <= 25 or len(stock2) <= 25:
-            return 0.0
-
-        # 根据选择的指标计算协整性p值
-        if "close" in indicators:
-            stock1_close_change = (stock1['close'] - stock1['ycp']) / stock1['ycp']
-            stock2_close_change = (stock2['close'] - stock2['ycp']) / stock2['ycp']
-            _, p_val, _ = ts.coint(stock1_close_change.values, stock2_close_change.values)
-            p_values.append(p_val)
-
-        if "high" in indicators:
-            # 计算最高价涨幅
-            stock1_high_change = (stock1['high'] - stock1['ycp']) / stock1['ycp']
-            stock2_high_change = (stock2['high'] - stock2['ycp']) / stock2['ycp']
-            _, p_val, _ = ts.coint(stock1_high_change.values, stock2_high_change.values)
-            p_values.append(p_val)
-
-        if "low" in indicators:
-            # 计算最低价涨幅
-            stock1_low_change = (stock1['low'] - stock1['ycp']) / stock1['ycp']
-            stock2_low_change = (stock2['low'] - stock2['ycp']) / stock2['ycp']
-            _, p_val, _ = ts.coint(stock1_low_change.values, stock2_low_change.values)
-            p_values.append(p_val)
-
-        if "turnover" in indicators:
-            # 计算相对换手率
-            stock1_turnover = stock1['vol'] / stock1['vol'].max()
-            stock2_turnover = stock2['vol'] / stock2['vol'].max()
-            _, p_val, _ = ts.coint(stock1_turnover.values, stock2_turnover.values)
-            p_values.append(p_val)
-
-        # 如果没有选择任何指标，返回0
-        if not p_values:
-            return 0.0
-
-        # 计算平均p值
-        avg_p_val = np.mean(p_values)
-
-        # 转换为相似度得分（p值越小，协整性越强，相似度越高）
-        # 使用1-p值作为相似度，但限制在0到1之间
-        similarity = 1/(1+avg_p_val)
-        return similarity
-
-    def _calculate_pearson_similarity(
-            self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str]
-    ) -> float:
-        """使用皮尔逊相关系数计算两只股票的相似度
+    async def search_pattern(self, request: PatternSearchRequest) -> PatternSearchResponse:
+        """在板块内所有股票的历史中搜索与基准形态最接近的子序列（任意起始日期）
 
         Args:
-            stock1: 第一只股票数据
-            stock2: 第二只股票数据
-            indicators: 用于计算的指标列表
+            request: 包含基准形态及搜索范围的请求对象
 
         Returns:
-            float: 相似度得分
-        """
-        try:
-            # 1. 数据预处理优化
-            if len(stock1) <= 25 or len(stock2) <= 25:
-                return 0.0
-
-            # 2. 一次性转换所有数值列
-            numeric_cols = ['close', 'high', 'low', 'ycp', 'vol']
-            for df in [stock1, stock2]:
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # 3. 预计算所有指标的变化率
-            changes = {}
-            for df, prefix in [(stock1, '1'), (stock2, '2')]:
-                changes[f'close_{prefix}'] = (df['close'] - df['ycp']) / df['ycp']
-                changes[f'high_{prefix}'] = (df['high'] - df['ycp']) / df['ycp']
-                changes[f'low_{prefix}'] = (df['low'] - df['ycp']) / df['ycp']
-                changes[f'turnover_{prefix}'] = df['vol'] / df['vol'].max()
-
-            # 4. 使用向量化操作计算相关系数
-            pearson_values = []
-            for indicator in indicators:
-                if indicator == "close":
-                    corr = np.corrcoef(changes['close_1'], changes['close_2'])[0, 1]
-                elif indicator == "high":
-                    corr = np.corrcoef(changes['high_1'], changes['high_2'])[0, 1]
-                elif indicator == "low":
-                    corr = np.corrcoef(changes['low_1'], changes['low_2'])[0, 1]
-                elif indicator == "turnover":
-                    corr = np.corrcoef(changes['turnover_1'], changes['turnover_2'])[0, 1]
-                
-                if not np.isnan(corr):
-                    pearson_values.append(corr)
-
-            # 5. 计算最终相似度
-            if not pearson_values:
-                return 0.0
-
-            avg_pearson = np.mean(pearson_values)
-            return max(0.0, avg_pearson) if avg_pearson > 0 else 0.0
-
-        except Exception as e:
-            logger.error(f"计算皮尔逊相关系数时出错: {e}")
-            return 0.0
-
-    def _calculate_euclidean_similarity(
-            self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str]
-    ) -> float:
-        """使用欧氏距离计算两只股票的相似度"""
-        # 首先确保所有数值列都是float类型
-        numeric_cols = ['close', 'high', 'low', 'ycp', 'vol']
-        for col in numeric_cols:
-            if col in stock1.columns:
-                stock1[col] = stock1[col].astype(float)
-            if col in stock2.columns:
-                stock2[col] = stock2[col].astype(float)
-
-        distances = []
-
-        if "close" in indicators:
-            # 标准化收盘价
-            stock1_close_change = (stock1['close'] - stock1['ycp']) / stock1['ycp']
-            stock2_close_change = (stock2['close'] - stock2['ycp']) / stock2['ycp']
-            dist = np.sqrt(np.sum((stock1_close_change.values - stock2_close_change.values) ** 2))
-            distances.append(dist)
-
-        # 其余代码保持不变...
-
-        if not distances:
-            return 0.0
-
-        # 平均距离
-        avg_dist = np.mean(distances)
-
-        # 转换为相似度得分
-        similarity = 1 / (1 + avg_dist)
-
-        return similarity
-
-    def _create_price_graph(self, df: pd.DataFrame, indicators: List[str]) -> nx.Graph:
+            PatternSearchResponse: 按距离升序排列的匹配
         """
-        将单个股票的K线数据转换为图结构，根据指定的指标创建节点特征
+        if not request.historyEndDate:
+            await TradingCalendarUtil.ensure_loaded()
+        history_end = request.historyEndDate or str(TradingCalendarUtil.latest_trading_day())
+        history_start = request.historyStartDate or str(
+            (pd.Timestamp(request.endDate) - pd.DateOffset(years=PATTERN_HISTORY_YEARS)).date()
+        )
+        section_stocks_list = await self.get_section_all_stock_code(
+            request.stockCode, request.sectionLevel, request.startDate, request.endDate
+        )
+        store = DailyFeatureStore.open(StockConfig.stock_feature_store_path)
+        if store is not None and store.covers(request.startDate, history_end) \
+                and request.stockCode in store.code_index:
+            # 特征库未覆盖的更早历史不参与搜索
+            history_start = max(history_start, store.date_range()[0])
+            matches, window_length, candidate_count = await ProcessPoolUtil.run(
+                search_store_pattern,
+                StockConfig.stock_feature_store_path,
+                request.stockCode,
+                section_stocks_list,
+                request.startDate,
+                request.endDate,
+                history_start,
+                history_end,
+                request.topK
+            )
+        else:
+            base_stock_data = await self.similar_dao.get_stock_data(request.stockCode, request.startDate,
+                                                                    request.endDate)
+            history = await SectorPanelService.get_section_stock_info(
+                request.stockCode, request.sectionLevel, section_stocks_list, history_start, history_end
+            )
+            if base_stock_data.empty or history.empty:
+                return PatternSearchResponse(matches=[])
+            dates = pd.DatetimeIndex(np.unique(pd.to_datetime(history['timestamps'])))
+            panel = SectionPanel.from_frame(history, dates)
+            query = base_stock_data['close'].to_numpy(dtype=float)
+            matches = await ProcessPoolUtil.run(
+                find_pattern_matches,
+                query,
+                panel.codes,
+                dates.values,
+                panel.values['close'],
+                panel.mask,
+                request.topK,
+                request.stockCode,
+                int(dates.searchsorted(pd.Timestamp(request.startDate)))
+            )
+            window_length, candidate_count = len(query), len(panel)
+
+        pattern_matches = []
+        for code, start_date, end_date, distance in matches:
+            stock_info = await SecurityMasterService.get_stock_info(code)
+            pattern_matches.append(PatternMatch(
+                code=code,
+                name=stock_info['name'],
+                startDate=start_date,
+                endDate=end_date,
+                distance=distance
+            ))
+        return PatternSearchResponse(matches=pattern_matches, windowLength=window_length,
+                                     candidateCount=candidate_count)
+
+    async def _rank_similar_stocks(self, scored: List[tuple], similar_count: int) -> List[Dict[str, Any]]:
+        """按相似度排序并截取指定数量，补充股票名称
 
         Args:
-            df: 包含K线数据的DataFrame，以timestamps为索引
-            indicators: 用于构建图的指标列表
+            scored: (股票代码, 相似度得分) 列表
+            similar_count: 需要返回的相似股票数量
 
         Returns:
-            nx.Graph: NetworkX图对象
-        """
-        G = nx.Graph()
-        # 首先确保所有数值列都是float类型
-        numeric_cols = ['close', 'high', 'low', 'ycp', 'vol']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(float)
-        # 确保df有一个副本以避免修改原始数据
-        df = df.copy()
-
-        # 预先计算相对换手率，如果需要且有相关数据
-        if "turnover" in indicators and 'vol' in df.columns:
-            max_vol = df['vol'].max()
-            if max_vol != 0:
-                df['relative_turnover'] = df['vol'].apply(lambda x: x / max_vol)
-            else:
-                df['relative_turnover'] = df['vol'].apply(lambda x: float('0'))
-
-        # 为每个交易日创建节点，只包含指定的指标特征
-        for idx, row in df.iterrows():
-            node_features = {'date': idx}
-
-            # 根据指定的指标添加对应的特征，但要确保列存在
-            if "close" in indicators and 'close' in df.columns:
-                close_change = (row['close'] - row['ycp']) / row['ycp'] if row['ycp'] != 0 else float('0')
-                node_features['close_change'] = close_change
-            if "high" in indicators and 'high' in df.columns and 'ycp' in df.columns:
-                # 计算最高价涨幅
-                high_change = (row['high'] - row['ycp']) / row['ycp'] if row['ycp'] != 0 else float('0')
-                node_features['high_change'] = high_change
-
-            if "low" in indicators and 'low' in df.columns and 'ycp' in df.columns:
-                # 计算最低价涨幅
-                low_change = (row['low'] - row['ycp']) / row['ycp'] if row['ycp'] != 0 else float('0')
-                node_features['low_change'] = low_change
-
-            if "turnover" in indicators and 'relative_turnover' in df.columns:
-                node_features['relative_turnover'] = row['relative_turnover']
-
-            G.add_node(idx, **node_features)
-
-        # 创建边连接相邻的交易日
-        dates = list(df.index)
-        for i in range(len(dates) - 1):
-            current_date = dates[i]
-            next_date = dates[i + 1]
-
-            # 初始化边权重
-            edge_weight = float('0')
-            edge_count = 0
-
-            # 根据指定的指标计算边的权重，检查特征是否存在
-            if "close" in indicators and 'close_change' in G.nodes[current_date] and 'close_change' in G.nodes[next_date]:
-                close_diff = abs(G.nodes[next_date]['close_change'] - G.nodes[current_date]['close_change'])
-                edge_weight += close_diff
-                edge_count += 1
-
-            if "high" in indicators and 'high_change' in G.nodes[current_date] and 'high_change' in G.nodes[next_date]:
-                high_diff = abs(G.nodes[next_date]['high_change'] - G.nodes[current_date]['high_change'])
-                edge_weight += high_diff
-                edge_count += 1
-
-            if "low" in indicators and 'low_change' in G.nodes[current_date] and 'low_change' in G.nodes[next_date]:
-                low_diff = abs(G.nodes[next_date]['low_change'] - G.nodes[current_date]['low_change'])
-                edge_weight += low_diff
-                edge_count += 1
-
-            if "turnover" in indicators and 'relative_turnover' in G.nodes[current_date] and 'relative_turnover' in \
-                    G.nodes[next_date]:
-                turnover_diff = abs(
-                    G.nodes[next_date]['relative_turnover'] - G.nodes[current_date]['relative_turnover'])
-                edge_weight += turnover_diff
-                edge_count += 1
-
-            # 计算平均边权重，确保不同指标数量下的权重可比
-            if edge_count > 0:
-                edge_weight = edge_weight / float(str(edge_count))
-            else:
-                edge_weight = float('0')  # 如果没有共同特征，设置权重为0
-
-            G.add_edge(current_date, next_date, weight=edge_weight)
-        return G
-
-    def _calculate_mcs_similarity(self, G1: nx.Graph, G2: nx.Graph, indicators: List[str]) -> float:
+            List[Dict[str, Any]]: 包含 code、name、similarity 的相似股票列表
         """
-        计算两个图之间的最大公共子图相似度，添加性能限制和内存保护
+        # 4. 按相似度排序并截取指定数量，只为截取后的股票获取名称
+        ranked = sorted(scored, key=lambda x: x[1], reverse=True)[:similar_count]
+        similar_stocks = []
+        for code, similarity in ranked:
+            # 获取股票名称
+            stock_info = await SecurityMasterService.get_stock_info(code)
+            stock_name = stock_info['name']
+
+            similar_stocks.append({
+                "code": code,
+                "name": stock_name,
+                "similarity": similarity
+            })
+        return similar_stocks
+
+    async def get_section_all_stock_code(self,stock_code, section_level, start_date=None, end_date=None):
         """
-        # 如果任一图为空，则返回0
-        if G1.number_of_nodes() == 0 or G2.number_of_nodes() == 0:
-            return 0.0
-
-        # 添加节点数量限制
-        MAX_NODES = 100  # 设置最大节点数限制
-        if G1.number_of_nodes() > MAX_NODES or G2.number_of_nodes() > MAX_NODES:
-            logger.warning(f"图节点数超过限制: G1={G1.number_of_nodes()}, G2={G2.number_of_nodes()}")
-            # 如果节点数过多，使用简化的相似度计算方法
-            return self._calculate_simplified_similarity(G1, G2, indicators)
-
-        try:
-            # 1. 构建产品图，使用更高效的数据结构
-            product_graph = nx.Graph()
-            node_pairs = []
-
-            # 2. 预计算节点特征，减少重复计算
-            node_features = {}
-            for node1 in G1.nodes():
-                for node2 in G2.nodes():
-                    # 检查两个节点是否有相同的特征集
-                    compatible = True
-                    for indicator in indicators:
-                        if not self._check_node_compatibility(G1.nodes[node1], G2.nodes[node2], indicator):
-                            compatible = False
-                            break
-
-                    if compatible:
-                        node_pairs.append((node1, node2))
-
-            # 3. 批量添加节点
-            for node_pair in node_pairs:
-                product_graph.add_node(node_pair)
-
-            # 4. 优化边添加过程
-            for i, (node1_a, node2_a) in enumerate(node_pairs):
-                for node1_b, node2_b in node_pairs[i+1:]:
-                    if self._check_edge_compatibility(G1, G2, node1_a, node2_a, node1_b, node2_b):
-                        weight_sim = self._calculate_edge_similarity(G1, G2, node1_a, node2_a, node1_b, node2_b)
-                        if weight_sim > 0.0001:
-                            product_graph.add_edge((node1_a, node2_a), (node1_b, node2_b), weight=weight_sim)
-
-            # 5. 使用改进的贪婪算法寻找最大团
-            max_clique = self._find_max_clique(product_graph)
-
-            # 6. 计算相似度
-            mcs_size = len(max_clique)
-            g1_size = G1.number_of_nodes()
-            g2_size = G2.number_of_nodes()
-
-            # 使用Tanimoto系数计算相似度
-            similarity = float(mcs_size) / (float(g1_size) + float(g2_size) - float(mcs_size))
-            return float(similarity)
-
-        except Exception as e:
-            logger.error(f"计算最大公共子图相似度时出错: {e}")
-            return 0.0
-
-    def _check_node_compatibility(self, node1_features, node2_features, indicator):
-        """检查两个节点的特征是否兼容"""
-        if indicator == "close":
-            return 'close_change' in node1_features and 'close_change' in node2_features
-        elif indicator == "high":
-            return 'high_change' in node1_features and 'high_change' in node2_features
-        elif indicator == "low":
-            return 'low_change' in node1_features and 'low_change' in node2_features
-        elif indicator == "turnover":
-            return 'relative_turnover' in node1_features and 'relative_turnover' in node2_features
-        return False
-
-    def _check_edge_compatibility(self, G1, G2, node1_a, node2_a, node1_b, node2_b):
-        """检查边是否兼容"""
-        return (G1.has_edge(node1_a, node1_b) and G2.has_edge(node2_a, node2_b))
-
-    def _calculate_edge_similarity(self, G1, G2, node1_a, node2_a, node1_b, node2_b):
-        """计算边相似度"""
-        weight1 = G1[node1_a][node1_b]['weight']
-        weight2 = G2[node2_a][node2_b]['weight']
-        return 1.0 - abs(weight1 - weight2)
-
-    def _find_max_clique(self, graph):
-        """使用改进的贪婪算法寻找最大团"""
-        if not graph.nodes():
-            return []
-
-        # 按度数排序节点
-        nodes_by_degree = sorted(graph.nodes(),
-                               key=lambda n: graph.degree(n),
-                               reverse=True)
-
-        max_clique = []
-        for node in nodes_by_degree:
-            if all(graph.has_edge(node, clique_node) for clique_node in max_clique):
-                max_clique.append(node)
-
-        return max_clique
-
-    def _calculate_simplified_similarity(self, G1: nx.Graph, G2: nx.Graph, indicators: List[str]) -> float:
-        """
-        当图规模过大时使用的简化相似度计算方法
-        """
-        try:
-            # 1. 随机采样节点
-            sample_size = min(50, min(G1.number_of_nodes(), G2.number_of_nodes()))
-            G1_nodes = random.sample(list(G1.nodes()), sample_size)
-            G2_nodes = random.sample(list(G2.nodes()), sample_size)
-
-            # 2. 计算节点特征相似度
-            feature_similarities = []
-            for indicator in indicators:
-                if indicator == "close":
-                    feature_similarities.append(self._calculate_feature_similarity(G1, G2, G1_nodes, G2_nodes, 'close_change'))
-                elif indicator == "high":
-                    feature_similarities.append(self._calculate_feature_similarity(G1, G2, G1_nodes, G2_nodes, 'high_change'))
-                elif indicator == "low":
-                    feature_similarities.append(self._calculate_feature_similarity(G1, G2, G1_nodes, G2_nodes, 'low_change'))
-                elif indicator == "turnover":
-                    feature_similarities.append(self._calculate_feature_similarity(G1, G2, G1_nodes, G2_nodes, 'relative_turnover'))
-
-            # 3. 返回平均相似度
-            return sum(feature_similarities) / len(feature_similarities) if feature_similarities else 0.0
-
-        except Exception as e:
-            logger.error(f"计算简化相似度时出错: {e}")
-            return 0.0
-
-    def _calculate_feature_similarity(self, G1, G2, G1_nodes, G2_nodes, feature_name):
-        """计算特定特征的相似度"""
-        try:
-            values1 = [G1.nodes[node][feature_name] for node in G1_nodes if feature_name in G1.nodes[node]]
-            values2 = [G2.nodes[node][feature_name] for node in G2_nodes if feature_name in G2.nodes[node]]
-            
-            if not values1 or not values2:
-                return 0.0
-
-            # 计算特征值的统计相似度
-            mean1, mean2 = np.mean(values1), np.mean(values2)
-            std1, std2 = np.std(values1), np.std(values2)
-            
-            if std1 == 0 or std2 == 0:
-                return 0.0
-
-            # 使用统计特征的相似度
-            mean_sim = 1.0 / (1.0 + abs(mean1 - mean2))
-            std_sim = 1.0 / (1.0 + abs(std1 - std2))
-            
-            return (mean_sim + std_sim) / 2.0
-
-        except Exception as e:
-            logger.error(f"计算特征相似度时出错: {e}")
-            return 0.0
-
-    def _calculate_graph_similarity(self, G1: nx.Graph, G2: nx.Graph, indicators: List[str]) -> float:
+        根据当前股票代码获取相同版块下的其他股票代码，并将输入的股票代码添加到返回值列表中。
+        :param section_level: 版块等级，1 表示当前具体等级分类下的股票，0 表示股票所在大版的股票，
+                              2 表示全市场（由近似最近邻索引召回候选股票）。
+        :param stock_code:
+        :param start_date: 开始日期，全市场范围使用
+        :param end_date: 结束日期，全市场范围使用
+        :return: 包含输入股票代码以及符合条件的其他股票代码组成的列表。
         """
-        计算两个图之间的相似度，基于图编辑距离的价格轨迹相似度，
-        根据指定的指标单独计算相似度，然后综合得出最终相似度
-
-        Args:
-            G1: 第一个图
-            G2: 第二个图
-            indicators: 用于计算相似度的指标列表
+        if section_level == MARKET_SECTION_LEVEL:
+            return await MarketIndexService.candidate_codes(stock_code, start_date, end_date)
+        # 行业分类及成分股均从内存中的证券主数据获取
+        section_key = await SecurityMasterService.get_section_key(stock_code, section_level)
+        if section_key is None:
+            return [stock_code]
+        temp_stock_code_list = await SecurityMasterService.get_section_members(*section_key, exclude_code=stock_code)
 
-        Returns:
-            float: 相似度得分，范围在0-1之间，1表示完全相似
-        """
-        logger.warning("==== 进入图编辑距离相似度计算 ====")
-        # 获取两个图的共同节点
-        common_dates = set(G1.nodes()) & set(G2.nodes())
-        if not common_dates:
-            return 0.0
-        logger.warning(f"共同节点数: {len(common_dates)}")
-
-        # 为每个指标单独计算相似度
-        similarity_scores = []
-
-        # 对于每个指标，首先检查所有共同节点是否都有该特征
-        # 计算"close"指标的相似度
-        if "close" in indicators:
-            close_nodes = [date for date in common_dates if 'close_change' in G1.nodes[date] and 'close_change' in G2.nodes[date]]
-            if close_nodes:
-                close_diff_total = float('0')
-                for date in close_nodes:
-                    node1 = G1.nodes[date]
-                    node2 = G2.nodes[date]
-                    # 计算收盘价差异
-                    close_diff = abs(node1['close_change'] - node2['close_change'])
-
-                    close_diff_total += close_diff
-
-                # 计算平均差异并转换为相似度分数
-                if len(close_nodes) > 0:
-                    avg_close_diff = close_diff_total / float(len(close_nodes))
-                    close_similarity = 1.0 / (1.0 + avg_close_diff)  # 距离越大相似度越小，但不会直接为0
-                    logger.warning(f"close指标: 平均差异={avg_close_diff}, 相似度={close_similarity}")
-                    # 确保结果在0-1之间
-                    close_similarity = max(min(close_similarity, float('1')), float('0'))
-                    similarity_scores.append(close_similarity)
-
-        # 计算"high"指标的相似度
-        if "high" in indicators:
-            high_nodes = [date for date in common_dates if
-                          'high_change' in G1.nodes[date] and 'high_change' in G2.nodes[date]]
-            if high_nodes:
-                high_diff_total = float('0')
-                for date in high_nodes:
-                    node1 = G1.nodes[date]
-                    node2 = G2.nodes[date]
-                    # 计算最高价涨幅差异
-                    high_diff = abs(node1['high_change'] - node2['high_change'])
-                    high_diff_total += high_diff
-
-                # 计算平均差异并转换为相似度分数
-                if len(high_nodes) > 0:
-                    avg_high_diff = high_diff_total / float(str(len(high_nodes)))
-                    high_similarity = float('1') / (float('1') + avg_high_diff)  # 使用倒数转换为相似度
-                    logger.warning(f"high指标: 平均差异={avg_high_diff}, 相似度={high_similarity}")
-                    # 确保结果在0-1之间
-                    high_similarity = max(min(high_similarity, float('1')), float('0'))
-                    similarity_scores.append(high_similarity)
-
-        # 计算"low"指标的相似度
-        if "low" in indicators:
-            low_nodes = [date for date in common_dates if
-                         'low_change' in G1.nodes[date] and 'low_change' in G2.nodes[date]]
-            if low_nodes:
-                low_diff_total = float('0')
-                for date in low_nodes:
-                    node1 = G1.nodes[date]
-                    node2 = G2.nodes[date]
-                    # 计算最低价涨幅差异
-                    low_diff = abs(node1['low_change'] - node2['low_change'])
-                    low_diff_total += low_diff
-
-                # 计算平均差异并转换为相似度分数
-                if len(low_nodes) > 0:
-                    avg_low_diff = low_diff_total / float(str(len(low_nodes)))
-                    low_similarity = float('1') / (float('1') + avg_low_diff)  # 使用倒数转换为相似度
-                    logger.warning(f"low指标: 平均差异={avg_low_diff}, 相似度={low_similarity}")
-                    # 确保结果在0-1之间
-                    low_similarity = max(min(low_similarity, float('1')), float('0'))
-                    similarity_scores.append(low_similarity)
-
-        # 计算"turnover"指标的相似度
-        if "turnover" in indicators:
-            turnover_nodes = [date for date in common_dates if
-                              'relative_turnover' in G1.nodes[date] and 'relative_turnover' in G2.nodes[date]]
-            if turnover_nodes:
-                turnover_diff_total = float('0')
-                for date in turnover_nodes:
-                    node1 = G1.nodes[date]
-                    node2 = G2.nodes[date]
-                    # 计算相对换手率差异
-                    turnover_diff = abs(node1['relative_turnover'] - node2['relative_turnover'])
-                    turnover_diff_total += turnover_diff
-
-                # 计算平均差异并转换为相似度分数
-                if len(turnover_nodes) > 0:
-                    avg_turnover_diff = turnover_diff_total / float(str(len(turnover_nodes)))
-                    turnover_similarity = float('1') - avg_turnover_diff  # 直接转换为相似度
-                    logger.warning(f"turnover指标: 平均差异={avg_turnover_diff}, 相似度={turnover_similarity}")
-                    # 确保结果在0-1之间
-                    turnover_similarity = max(min(turnover_similarity, float('1')), float('0'))
-                    similarity_scores.append(turnover_similarity)
-
-        # 计算边相似度，仅当有共同边时
-        common_edges = set()
-        try:
-            # 获取两个图的所有边
-            G1_edges = [(min(u, v), max(u, v)) for u, v in G1.edges()]
-            G2_edges = [(min(u, v), max(u, v)) for u, v in G2.edges()]
+        stock_code_list = [stock_code] + temp_stock_code_list
 
-            # 找到共同的边
-            common_edges = set(G1_edges) & set(G2_edges)
-            logger.warning(f"共同边数: {len(common_edges)}")
-        except Exception as e:
-            logger.warning(f"计算边相似度时出错: {e}")
-
-        # 只有当存在共同边时才计算边相似度
-        if common_edges:
-            edge_diff_total = float('0')
-            edge_count = 0
-
-            for edge in common_edges:
-                try:
-                    # 确保边存在于两个图中
-                    if G1.has_edge(*edge) and G2.has_edge(*edge):
-                        weight1 = G1.get_edge_data(*edge).get('weight', float('0'))
-                        weight2 = G2.get_edge_data(*edge).get('weight', float('0'))
-                        edge_diff = abs(weight1 - weight2)
-                        edge_diff_total += edge_diff
-                        edge_count += 1
-                except Exception as e:
-                    logger.warning(f"处理边 {edge} 时出错: {e}")
-                    continue
-
-            if edge_count > 0:
-                avg_edge_diff = edge_diff_total / float(edge_count)
-                edge_similarity = 1.0 / (1.0 + avg_edge_diff)  # 距离越大相似度越小，但不会直接为0
-                logger.warning(f"边相似度: 平均差异={avg_edge_diff}, 相似度={edge_similarity}")
-                # 确保结果在0-1之间
-                edge_similarity = max(min(edge_similarity, float('1')), float('0'))
-                similarity_scores.append(edge_similarity)
-
-        # 如果没有任何相似度分数，返回0
-        if not similarity_scores:
-            return 0.0
-
-        # 计算所有相似度分数的平均值作为最终相似度
-        final_similarity = sum(similarity_scores) / float(len(similarity_scores))
-
-        # 确保结果在0-1之间并返回
-        final_similarity = max(min(final_similarity, float('1')), float('0'))
-        logger.warning(f"所有分数: {similarity_scores}")
-        logger.warning(f"最终相似度: {final_similarity}")
-        return float(final_similarity)  # 将float转换为float返回
+        print(f"共找到{len(stock_code_list)}只股票")
+        return stock_code_list
 
     async def _get_performance_comparison(
             self,
             base_stock_data: pd.DataFrame,
-            similar_stock_codes: List[str]
+            similar_stock_codes: List[str],
+            panel: SectionPanel
     ) -> PerformanceData:
         """获取基准股票和相似股票的性能对比数据
 
@@ -854,23 +532,23 @@ class StockSimilarityService:
             base_stock_data: 基准股票数据 DataFrame，index 是 timestamps，
                             列名有'code', 'open', 'close', 'high', 'low', 'ycp', 'vol'
             similar_stock_codes: 相似股票代码列表
+            panel: 按基准股票交易日对齐的相似股票行情面板，由计算相似度时已获取的数据构建，不再逐只查询
 
         Returns:
             PerformanceData: 性能对比数据
         """
-        # 提取基准股票代码和日期范围
+        # 提取基准股票代码
         base_stock_code = base_stock_data['code'].iloc[0]
-        start_date = base_stock_data.index.min()
-        end_date = base_stock_data.index.max()
 
         # 获取基准股票信息
-        base_stock_info = await self.similar_dao.get_stock_info(base_stock_code)
+        base_stock_info = await SecurityMasterService.get_stock_info(base_stock_code)
 
         # 获取所有日期
         dates = base_stock_data.index.tolist()
 
         # 标准化基准股票的收盘价，计算累计收益率
-        base_stock_return = (base_stock_data['close'] / base_stock_data['close'].iloc[0] - 1) * 100
+        base_close = base_stock_data['close'].astype(float)
+        base_stock_return = (base_close / base_close.iloc[0] - 1) * 100
 
         # 准备股票数据
         stocks_data = []
@@ -884,39 +562,22 @@ class StockSimilarityService:
             )
         )
 
-        # 添加相似股票
+        # 添加相似股票：一次性计算所有相似股票的累计收益率
+        returns = cumulative_returns(panel)
+        rows = {code: row for row, code in enumerate(panel.codes)}
         for stock_code in similar_stock_codes:
-            try:
-                # 使用日期范围从开始到结束获取股票数据
-                similar_stock_data = await self.similar_dao.get_stock_data(
-                    stock_code,
-                    start_date.strftime('%Y-%m-%d'),
-                    end_date.strftime('%Y-%m-%d')
+            row = rows.get(stock_code)
+            # 与基准股票没有共同交易日的股票不展示
+            if row is None or not panel.mask[row].any():
+                continue
+            similar_stock_info = await SecurityMasterService.get_stock_info(stock_code)
+            stocks_data.append(
+                StockPerformanceData(
+                    code=stock_code,
+                    name=similar_stock_info['name'],
+                    data=returns[row].tolist()
                 )
-                similar_stock_info = await self.similar_dao.get_stock_info(stock_code)
-
-                # 只取与基准股票相同的日期
-                common_dates = base_stock_data.index.intersection(similar_stock_data.index)
-
-                if len(common_dates) > 0:
-                    similar_stock_aligned = similar_stock_data.loc[common_dates]
-                    similar_stock_return = (similar_stock_aligned['close'] / similar_stock_aligned['close'].iloc[
-                        0] - 1) * 100
-
-                    # 确保数据长度相同，缺失的填充NaN
-                    full_return = pd.Series(index=dates)
-                    for date in common_dates:
-                        full_return[date] = similar_stock_return[date]
-
-                    stocks_data.append(
-                        StockPerformanceData(
-                            code=stock_code,
-                            name=similar_stock_info['name'],
-                            data=full_return.fillna(method='ffill').fillna(0).tolist()
-                        )
-                    )
-            except Exception as e:
-                logger.error(f"Error processing performance data for stock {stock_code}: {e}")
+            )
 
         # 将时间戳转换为字符串格式，适合前端显示
         date_strings = [date.strftime('%Y-%m-%d') for date in dates]
@@ -926,146 +587,6 @@ class StockSimilarityService:
             stocks=stocks_data
         )
 
-    def _calculate_shape_similarity(
-            self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str]
-    ) -> float:
-        """使用K线形状（上影线、实体、下影线）计算两只股票的相似度
-
-        Args:
-            stock1: 第一只股票数据
-            stock2: 第二只股票数据
-            indicators: 用于计算的指标列表（未用到，可保留）
-
-        Returns:
-            float: 相似度得分
-        """
-        # 权重设置
-        upper_weight = 0.33
-        body_weight = 0.34
-        lower_weight = 0.33
-        # 首先确保所有数值列都是float类型
-        numeric_cols = ['close', 'high', 'low', 'ycp','open']
-        for col in numeric_cols:
-            if col in stock1.columns:
-                stock1[col] = stock1[col].astype(float)
-            if col in stock2.columns:
-                stock2[col] = stock2[col].astype(float)
-        # 对齐日期
-        common_dates = stock1.index.intersection(stock2.index)
-        if len(common_dates) < 2:
-            logger.warning("股票对的共同交易日少于2天，无法计算形状相似度")
-            return 0.0
-
-        stock1_aligned = stock1.loc[common_dates]
-        stock2_aligned = stock2.loc[common_dates]
-
-        # 计算上影线、实体、下影线长度序列
-        def calc_shape_parts(df):
-            # 上影线
-            upper = np.where(
-                df['open'] > df['close'],
-                (df['high'] - df['open']) / (df['ycp'] * 0.1),
-                (df['high'] - df['close']) / (df['ycp'] * 0.1)
-            )
-            # 下影线
-            lower = np.where(
-                df['open'] > df['close'],
-                (df['close'] - df['low']) / (df['ycp'] * 0.1),
-                (df['open'] - df['low']) / (df['ycp'] * 0.1)
-            )
-            # 实体
-            body = np.abs(df['open'] - df['close']) / (df['ycp'] * 0.1)
-            return upper, body, lower
-
-        upper1, body1, lower1 = calc_shape_parts(stock1_aligned)
-        upper2, body2, lower2 = calc_shape_parts(stock2_aligned)
-
-        # 计算各部分的总和
-        sum_upper1, sum_upper2 = np.sum(upper1), np.sum(upper2)
-        sum_body1, sum_body2 = np.sum(body1), np.sum(body2)
-        sum_lower1, sum_lower2 = np.sum(lower1), np.sum(lower2)
-
-        # 相似度计算函数
-        def part_similarity(sum1, sum2):
-            if sum1 == 0 and sum2 == 0:
-                return 1.0
-            if (sum1 == 0 and sum2 != 0) or (sum1 != 0 and sum2 == 0):
-                return 0.0
-            return min(sum1, sum2) / max(sum1, sum2)
-
-        upper_sim = part_similarity(sum_upper1, sum_upper2)
-        body_sim = part_similarity(sum_body1, sum_body2)
-        lower_sim = part_similarity(sum_lower1, sum_lower2)
-
-        # 加权总相似度
-        similarity = upper_weight * upper_sim + body_weight * body_sim + lower_weight * lower_sim
-        return float(similarity)
-
-    def _calculate_position_similarity(
-            self,
-            stock1: pd.DataFrame,
-            stock2: pd.DataFrame,
-            indicators: List[str]
-    ) -> float:
-        """
-        使用位置序列计算两只股票的相似度
-
-        位置定义：
-        - 第一天位置为1
-        - 之后的位置为 (收盘价-作收价)/(作收价*0.1)
-
-        两个序列的位置相似性 = 较小的所有天数的位置和 / 较大的所有天数位置和
-        如果有且只有一个位置和为0，则相似度为0；如果两个都是0，则相似度为1。
-
-        Args:
-            stock1: 第一只股票数据
-            stock2: 第二只股票数据
-            indicators: 用于计算的指标列表（未用到，可保留）
-
-        Returns:
-            float: 相似度得分
-        """
-        numeric_cols = ['close','ycp']
-        for col in numeric_cols:
-            if col in stock1.columns:
-                stock1[col] = stock1[col].astype(float)
-            if col in stock2.columns:
-                stock2[col] = stock2[col].astype(float)
-        # 对齐日期
-        common_dates = stock1.index.intersection(stock2.index)
-        if len(common_dates) < 2:
-            logger.warning("股票对的共同交易日少于2天，无法计算位置相似度")
-            return 0.0
-
-        stock1_aligned = stock1.loc[common_dates]
-        stock2_aligned = stock2.loc[common_dates]
-
-        # 计算位置序列
-        def calc_position(df):
-            pos = np.zeros(len(df))
-            pos[0] = 1  # 第一天为1
-            if len(df) > 1:
-                # 从第二天开始
-                pos[1:] = (df['close'].values[1:] - df['ycp'].values[1:]) / (df['ycp'].values[1:] * 0.1)
-            return pos
-
-        pos1 = calc_position(stock1_aligned)
-        pos2 = calc_position(stock2_aligned)
-
-        sum_pos1 = np.sum(pos1)
-        sum_pos2 = np.sum(pos2)
-
-        # 相似度计算
-        if sum_pos1 == 0 and sum_pos2 == 0:
-            return 1.0
-        if (sum_pos1 == 0 and sum_pos2 != 0) or (sum_pos1 != 0 and sum_pos2 == 0):
-            return 0.0
-        similarity = min(sum_pos1, sum_pos2) / max(sum_pos1, sum_pos2)
-        return float(similarity)
-
     async def search_history(self, keyword: str) -> List[StockBase]:
         """
         搜索查询历史（支持模糊搜索）
@@ -0,0 +1,320 @@
+import base64
+import hashlib
+import json
+import uuid
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config.enums import RedisInitKeyConfig
+from config.env import StockConfig
+from module_stock.entity.vo.similar_vo import (
+    PerformanceData,
+    SimilarStock,
+    StockPerformanceData,
+    StockSimilarityRequest,
+    StockSimilarityResponse,
+)
+from utils.trading_calendar_util import TradingCalendarUtil
+import logging
+logger = logging.getLogger(__name__)
+
+# 命中统计哈希中的字段
+HIT_FIELD = 'hit'
+MISS_FIELD = 'miss'
+# 统计缓存条目数时每次 SCAN 返回的键数量
+STATS_SCAN_COUNT = 1000
+
+# 仅在锁仍属于自己时释放或续期，避免误删其他进程在锁过期后重新获取的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+REFRESH_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SimilarityCacheService:
+    """
+    相似性计算结果缓存
+
+    以规范化后的请求指纹（股票代码、日期、范围、排序去重后的指标、方法及DTW窗口）和数据版本（最新交易日）为键，
+    缓存完整的排序结果及累计收益率曲线，相似股票数量不超过缓存长度的请求直接由缓存返回。
+    新的日线数据入库后最新交易日变化，旧版本的缓存不再被命中并在过期后自动删除。
+    """
+
+    @staticmethod
+    def fingerprint(request: StockSimilarityRequest) -> str:
+        """
+        规范化请求并计算指纹，不包含相似股票数量
+
+        :param request: 相似性计算请求
+        :return: 指纹
+        """
+        normalized = {
+            'code': request.stockCode,
+            'start': str(request.startDate)[:10],
+            'end': str(request.endDate)[:10],
+            'section': request.sectionLevel,
+            'indicators': sorted(set(request.indicators)),
+            'method': request.similarityMethod,
+            'dtwWindow': request.dtwWindow if request.similarityMethod == 'dtw' else None,
+        }
+        return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def available() -> bool:
+        """
+        缓存是否可用：缓存键包含最新交易日，交易日历未加载时不可用
+
+        :return: 是否可用
+        """
+        return TradingCalendarUtil.is_loaded()
+
+    @classmethod
+    def cache_key(cls, request: StockSimilarityRequest) -> str:
+        """
+        缓存键名，包含数据版本
+
+        :param request: 相似性计算请求
+        :return: 缓存键名
+        """
+        version = TradingCalendarUtil.latest_trading_day().strftime('%Y%m%d')
+        return f'{RedisInitKeyConfig.STOCK_SIMILARITY.key}:{version}:{cls.fingerprint(request)}'
+
+    @staticmethod
+    def cache_depth(request: StockSimilarityRequest) -> int:
+        """
+        缓存未命中时需要计算并缓存的相似股票数量
+
+        :param request: 相似性计算请求
+        :return: 数量
+        """
+        return max(request.similarCount, StockConfig.stock_similarity_cache_depth)
+
+    @staticmethod
+    def encode(response: StockSimilarityResponse, complete: bool) -> str:
+        """
+        将计算结果编码为紧凑的字符串：累计收益率曲线保存为 float32 数组，整体经 zlib 压缩后 base64 编码
+
+        :param response: 计算结果
+        :param complete: 结果是否已包含全部候选股票
+        :return: 编码后的字符串
+        """
+        performance = response.performanceData
+        curves = np.array([stock.data for stock in performance.stocks], dtype=np.float32)
+        record = {
+            'similar': [[stock.code, stock.name, stock.similarity] for stock in response.similarStocks],
+            'dates': performance.dates,
+            'curveCodes': [[stock.code, stock.name] for stock in performance.stocks],
+            'curves': base64.b64encode(curves.tobytes()).decode('ascii'),
+            'stats': {
+                'candidateCount': response.candidateCount,
+                'prunedCount': response.prunedCount,
+                'abandonedCount': response.abandonedCount,
+            },
+            'complete': complete,
+        }
+        return base64.b64encode(zlib.compress(json.dumps(record).encode('utf-8'))).decode('ascii')
+
+    @staticmethod
+    def decode(value: str, similar_count: int) -> Optional[StockSimilarityResponse]:
+        """
+        解码缓存内容并截取指定数量的相似股票，缓存长度不足时返回None
+
+        :param value: 缓存内容
+        :param similar_count: 相似股票数量
+        :return: 计算结果
+        """
+        record = json.loads(zlib.decompress(base64.b64decode(value)))
+        if len(record['similar']) < similar_count and not record['complete']:
+            return None
+        curves = np.frombuffer(base64.b64decode(record['curves']), dtype=np.float32).reshape(
+            len(record['curveCodes']), -1
+        ) if record['curveCodes'] else np.empty((0, 0), dtype=np.float32)
+        response = StockSimilarityResponse(
+            similarStocks=[
+                SimilarStock(code=code, name=name, similarity=score) for code, name, score in record['similar']
+            ],
+            performanceData=PerformanceData(dates=record['dates'], stocks=[
+                StockPerformanceData(code=code, name=name, data=curves[row].astype(float).tolist())
+                for row, (code, name) in enumerate(record['curveCodes'])
+            ]),
+            **record['stats']
+        )
+        return SimilarityCacheService.truncate(response, similar_count)
+
+    @staticmethod
+    def truncate(response: StockSimilarityResponse, similar_count: int) -> StockSimilarityResponse:
+        """
+        截取前若干只相似股票及其收益率曲线，不修改原结果
+
+        :param response: 计算结果
+        :param similar_count: 相似股票数量
+        :return: 截取后的结果
+        """
+        similar = response.similarStocks[:similar_count]
+        kept_codes = {stock.code for stock in similar}
+        stocks = [
+            stock for row, stock in enumerate(response.performanceData.stocks)
+            # 第一条曲线为基准股票
+            if row == 0 or stock.code in kept_codes
+        ]
+        return response.model_copy(update={
+            'similarStocks': similar,
+            'performanceData': PerformanceData(dates=response.performanceData.dates, stocks=stocks),
+        })
+
+    @classmethod
+    async def read(cls, redis, cache_key: str, similar_count: int) -> Optional[StockSimilarityResponse]:
+        """
+        读取并解码缓存，不记录命中统计
+
+        :param redis: Redis连接对象
+        :param cache_key: 缓存键名
+        :param similar_count: 相似股票数量
+        :return: 缓存存在且长度足够时为计算结果，否则为None
+        """
+        try:
+            value = await redis.get(cache_key)
+            if value:
+                return cls.decode(value, similar_count)
+        except Exception as e:
+            logger.error(f"读取相似性结果缓存失败: {e}")
+        return None
+
+    @classmethod
+    async def get(cls, redis, request: StockSimilarityRequest) -> Optional[StockSimilarityResponse]:
+        """
+        读取缓存并记录命中统计
+
+        :param redis: Redis连接对象
+        :param request: 相似性计算请求
+        :return: 命中时为计算结果，否则为None
+        """
+        if not cls.available():
+            return None
+        response = await cls.read(redis, cls.cache_key(request), request.similarCount)
+        await cls.record(redis, response is not None)
+        return response
+
+    @classmethod
+    async def set(cls, redis, request: StockSimilarityRequest, response: StockSimilarityResponse) -> str:
+        """
+        写入缓存
+
+        :param redis: Redis连接对象
+        :param request: 计算时使用的请求（相似股票数量为缓存长度）
+        :param response: 计算结果
+        :return: 编码后的缓存内容
+        """
+        value = cls.encode(response, len(response.similarStocks) < request.similarCount)
+        try:
+            await redis.set(cls.cache_key(request), value, ex=StockConfig.stock_similarity_cache_ttl)
+        except Exception as e:
+            logger.error(f"写入相似性结果缓存失败: {e}")
+        return value
+
+    @staticmethod
+    async def record(redis, hit: bool):
+        """
+        累加命中或未命中次数
+
+        :param redis: Redis连接对象
+        :param hit: 是否命中
+        """
+        try:
+            await redis.hincrby(RedisInitKeyConfig.STOCK_SIMILARITY_STATS.key, HIT_FIELD if hit else MISS_FIELD, 1)
+        except Exception as e:
+            logger.error(f"记录相似性结果缓存命中统计失败: {e}")
+
+    @staticmethod
+    def lock_key(cache_key: str) -> str:
+        """
+        计算锁键名，与缓存键名一一对应
+
+        :param cache_key: 缓存键名
+        :return: 锁键名
+        """
+        return f'{RedisInitKeyConfig.STOCK_SIMILARITY_LOCK.key}:{cache_key.split(":", 1)[1]}'
+
+    @classmethod
+    async def acquire_lock(cls, redis, cache_key: str) -> Optional[str]:
+        """
+        尝试获取计算锁，锁带有过期时间，持有者异常退出后由过期自动释放
+
+        :param redis: Redis连接对象
+        :param cache_key: 缓存键名
+        :return: 获取成功时为锁令牌，否则为None
+        """
+        token = uuid.uuid4().hex
+        acquired = await redis.set(cls.lock_key(cache_key), token, nx=True, ex=StockConfig.stock_similarity_lock_ttl)
+        return token if acquired else None
+
+    @classmethod
+    async def refresh_lock(cls, redis, cache_key: str, token: str) -> bool:
+        """
+        续期计算锁
+
+        :param redis: Redis连接对象
+        :param cache_key: 缓存键名
+        :param token: 锁令牌
+        :return: 锁是否仍由自己持有
+        """
+        return bool(await redis.eval(
+            REFRESH_LOCK_SCRIPT, 1, cls.lock_key(cache_key), token, StockConfig.stock_similarity_lock_ttl
+        ))
+
+    @classmethod
+    async def release_lock(cls, redis, cache_key: str, token: str):
+        """
+        释放计算锁
+
+        :param redis: Redis连接对象
+        :param cache_key: 缓存键名
+        :param token: 锁令牌
+        """
+        try:
+            await redis.eval(RELEASE_LOCK_SCRIPT, 1, cls.lock_key(cache_key), token)
+        except Exception as e:
+            logger.error(f"释放相似性计算锁失败: {e}")
+
+    @classmethod
+    async def lock_exists(cls, redis, cache_key: str) -> bool:
+        """
+        计算锁是否存在
+
+        :param redis: Redis连接对象
+        :param cache_key: 缓存键名
+        :return: 是否存在
+        """
+        return bool(await redis.exists(cls.lock_key(cache_key)))
+
+    @staticmethod
+    async def stats(redis) -> Dict[str, Any]:
+        """
+        缓存命中统计，供缓存监控展示
+
+        :param redis: Redis连接对象
+        :return: 命中次数、未命中次数、命中率及缓存条目数
+        """
+        counters = await redis.hgetall(RedisInitKeyConfig.STOCK_SIMILARITY_STATS.key)
+        hits, misses = int(counters.get(HIT_FIELD, 0)), int(counters.get(MISS_FIELD, 0))
+        # 以 SCAN 增量遍历计数，不使用会阻塞 Redis 的 KEYS
+        key_count = 0
+        pattern = f'{RedisInitKeyConfig.STOCK_SIMILARITY.key}:*'
+        async for _ in redis.scan_iter(match=pattern, count=STATS_SCAN_COUNT):
+            key_count += 1
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hitRate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'keys': key_count,
+        }
@@ -0,0 +1,191 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from config.database import AsyncSessionLocal
+from config.enums import RedisInitKeyConfig
+from config.env import StockConfig
+from module_stock.dao.history_dao import HistoryDAO
+from module_stock.entity.vo.history_vo import SimilarStockResultVO
+from module_stock.entity.vo.similar_vo import (
+    SimilarStock,
+    SimilarityJobStatus,
+    StockSimilarityRequest,
+    StockSimilarityResponse,
+)
+from module_stock.service.security_master_service import SecurityMasterService
+from module_stock.service.similar_service import StockSimilarityService
+import logging
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+# 状态查询返回的字段，不含请求参数及计算结果
+STATUS_FIELDS = ['status', 'progress', 'scoredCount', 'candidateCount', 'message', 'historyId', 'userId',
+                 'createTime', 'updateTime']
+
+
+class SimilarityJobService:
+    """
+    相似性异步计算任务
+
+    提交后立即返回任务ID，任务在本进程内排队，同时执行的任务数不超过 stock_job_workers，
+    计算本身仍由相似度计算进程池完成。任务状态、进度及结果保存在 Redis 哈希中，任意服务进程均可查询；
+    任务完成后自动写入查询历史。
+    """
+
+    _semaphore: Optional[asyncio.Semaphore] = None
+    # 持有正在执行的任务，避免任务对象被回收
+    _tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f'{RedisInitKeyConfig.STOCK_SIMILARITY_JOB.key}:{job_id}'
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(max(StockConfig.stock_job_workers, 1))
+        return cls._semaphore
+
+    @classmethod
+    async def _update(cls, redis, job_id: str, **fields):
+        fields['updateTime'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        await redis.hset(cls._job_key(job_id), mapping={key: str(value) for key, value in fields.items()})
+        await redis.expire(cls._job_key(job_id), StockConfig.stock_job_ttl)
+
+    @classmethod
+    async def submit(cls, redis, request: StockSimilarityRequest, user_id: Optional[int]) -> str:
+        """
+        提交异步计算任务
+
+        :param redis: Redis连接对象
+        :param request: 相似性计算请求
+        :param user_id: 提交任务的用户ID
+        :return: 任务ID
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        await cls._update(
+            redis, job_id, status=JOB_QUEUED, progress=0, scoredCount=0, candidateCount=0,
+            userId=user_id if user_id is not None else '', request=request.model_dump_json(), createTime=now
+        )
+        task = asyncio.ensure_future(cls._run(redis, job_id, request, user_id))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+        logger.info(f"相似性异步计算任务已提交: {job_id}，股票代码: {request.stockCode}")
+        return job_id
+
+    @classmethod
+    async def _run(cls, redis, job_id: str, request: StockSimilarityRequest, user_id: Optional[int]):
+        """
+        执行任务：等待空闲的任务名额后计算，按已计算的候选股票数量更新进度，完成后保存结果并写入查询历史
+        """
+        async with cls._get_semaphore():
+            try:
+                await cls._update(redis, job_id, status=JOB_RUNNING)
+
+                async def progress(scored: int, total: int, similar_stocks: List[SimilarStock]):
+                    await cls._update(
+                        redis, job_id, scoredCount=scored, candidateCount=total,
+                        progress=int(scored * 100 / total) if total else 100
+                    )
+
+                # 与同步接口共用结果缓存及并发请求合并，相同的并发任务只计算一次
+                response = await StockSimilarityService().calculate_similarity_cached(redis, request, progress)
+                history_id = await cls._save_history(request, response, user_id)
+                await cls._update(
+                    redis, job_id, status=JOB_DONE, progress=100, result=response.model_dump_json(),
+                    historyId=history_id if history_id is not None else ''
+                )
+                logger.info(f"相似性异步计算任务完成: {job_id}")
+            except Exception as e:
+                logger.error(f"相似性异步计算任务失败 {job_id}: {e}")
+                try:
+                    await cls._update(redis, job_id, status=JOB_FAILED, message=str(e))
+                except Exception as update_error:
+                    logger.error(f"更新相似性异步计算任务状态失败 {job_id}: {update_error}")
+
+    @staticmethod
+    async def _save_history(
+        request: StockSimilarityRequest, response: StockSimilarityResponse, user_id: Optional[int]
+    ) -> Optional[int]:
+        """
+        将任务结果写入查询历史，写入失败不影响任务结果
+
+        :return: 查询历史ID，写入失败时为None
+        """
+        try:
+            stock_info = await SecurityMasterService.get_stock_info(request.stockCode)
+            async with AsyncSessionLocal() as db:
+                return await HistoryDAO.create_history(
+                    db,
+                    stock_code=request.stockCode,
+                    stock_name=stock_info['name'],
+                    start_date=request.startDate,
+                    end_date=request.endDate,
+                    indicators=request.indicators,
+                    method=request.similarityMethod,
+                    compare_scope=str(request.sectionLevel),
+                    similar_results=[
+                        SimilarStockResultVO(stock_code=stock.code, stock_name=stock.name,
+                                             similarity=stock.similarity)
+                        for stock in response.similarStocks
+                    ],
+                    similar_count=request.similarCount,
+                    user_id=user_id,
+                )
+        except Exception as e:
+            logger.error(f"异步计算任务写入查询历史失败: {e}")
+            return None
+
+    @staticmethod
+    def _owned(fields: Dict[str, Optional[str]], user_id: Optional[int]) -> bool:
+        # 任务只对提交者可见
+        owner = str(user_id) if user_id is not None else ''
+        return fields.get('status') is not None and fields.get('userId', '') == owner
+
+    @classmethod
+    async def get_status(cls, redis, job_id: str, user_id: Optional[int]) -> Optional[SimilarityJobStatus]:
+        """
+        查询任务状态
+
+        :param redis: Redis连接对象
+        :param job_id: 任务ID
+        :param user_id: 查询的用户ID
+        :return: 任务状态，任务不存在、已过期或不属于该用户时为None
+        """
+        fields = dict(zip(STATUS_FIELDS, await redis.hmget(cls._job_key(job_id), STATUS_FIELDS)))
+        if not cls._owned(fields, user_id):
+            return None
+        return SimilarityJobStatus(
+            jobId=job_id,
+            status=fields['status'],
+            progress=int(fields['progress'] or 0),
+            scoredCount=int(fields['scoredCount'] or 0),
+            candidateCount=int(fields['candidateCount'] or 0),
+            message=fields['message'],
+            historyId=int(fields['historyId']) if fields['historyId'] else None,
+            createTime=fields['createTime'],
+            updateTime=fields['updateTime'],
+        )
+
+    @classmethod
+    async def get_result(cls, redis, job_id: str, user_id: Optional[int]) -> Optional[StockSimilarityResponse]:
+        """
+        获取已完成任务的计算结果
+
+        :param redis: Redis连接对象
+        :param job_id: 任务ID
+        :param user_id: 查询的用户ID
+        :return: 计算结果，任务未完成、不存在或不属于该用户时为None
+        """
+        fields = dict(zip(['status', 'userId', 'result'],
+                          await redis.hmget(cls._job_key(job_id), ['status', 'userId', 'result'])))
+        if not cls._owned(fields, user_id) or fields['status'] != JOB_DONE:
+            return None
+        return StockSimilarityResponse.model_validate_json(fields['result'])
@@ -1 +1,2 @@
 from . import scheduler_test  # noqa: F401
+from . import stock_task  # noqa: F401
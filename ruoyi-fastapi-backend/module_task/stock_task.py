@@ -0,0 +1,111 @@
+from datetime import date
+
+from config.env import StockConfig
+from module_stock.dao.similar_dao import SimilarDao
+from module_stock.service.market_index_service import MarketIndexService
+from module_stock.service.market_snapshot_service import MarketSnapshotService
+from module_stock.service.sector_panel_service import SectorPanelService
+from module_stock.service.security_master_service import SecurityMasterService
+from utils import ck_util
+from utils.daily_replica_util import DailyBarReplica
+from utils.feature_store_util import DailyFeatureStore
+from utils.trading_calendar_util import TradingCalendarUtil
+import logging
+logger = logging.getLogger(__name__)
+
+# 逐日特征库每次从 ClickHouse 读取的交易日数量
+FEATURE_STORE_CHUNK_DAYS = 60
+
+
+async def refresh_security_master():
+    """
+    定时刷新内存中的证券主数据
+    """
+    await SecurityMasterService.refresh_security_master()
+
+
+async def refresh_trading_calendar():
+    """
+    定时刷新内存中的交易日历，并重新加载行情快照以包含最新交易日分批入库的日线
+    """
+    await TradingCalendarUtil.refresh_trading_calendar()
+    await MarketSnapshotService.refresh_market_snapshot()
+
+
+def _sync_daily_replica_sync():
+    """
+    从副本覆盖的最后一个交易日（副本为空时从配置的起始日期）开始，按年读取全市场日线并写入日线本地副本
+    """
+    _, cover_end = DailyBarReplica.coverage()
+    # 最后一个交易日会被重新读取并整体重写，覆盖当日数据分批入库的情况
+    start_date = date.fromisoformat(str(cover_end) if cover_end is not None
+                                    else StockConfig.stock_replica_start_date)
+    end_date = TradingCalendarUtil.latest_trading_day()
+    for year in range(start_date.year, end_date.year + 1):
+        chunk_start = max(start_date, date(year, 1, 1))
+        chunk_end = min(end_date, date(year, 12, 31))
+        frame = DailyBarReplica.fetch_clickhouse(None, chunk_start, chunk_end)
+        DailyBarReplica.append_range(frame, chunk_start, chunk_end)
+
+
+async def sync_daily_replica():
+    """
+    定时将新入库的日线增量同步到日线本地副本，离线模式下不同步
+    """
+    if DailyBarReplica.mode() != 'readthrough':
+        return
+    try:
+        await ck_util.run_job(_sync_daily_replica_sync)
+    except Exception as e:
+        logger.error(f"同步日线本地副本失败: {e}")
+
+
+def _append_feature_store_sync():
+    """
+    从特征库的最后一个交易日（不存在时从配置的起始日期）开始，按交易日分批读取全市场日线并追加到特征库
+    """
+    path = StockConfig.stock_feature_store_path
+    store = DailyFeatureStore.open(path)
+    # 最后一个交易日会被重新读取并整体重写，覆盖当日数据分批入库的情况
+    start_date = store.last_date if store is not None and store.last_date is not None \
+        else StockConfig.stock_feature_store_start_date
+    trading_days = TradingCalendarUtil.trading_days_between(start_date, TradingCalendarUtil.latest_trading_day())
+    appended = 0
+    for offset in range(0, len(trading_days), FEATURE_STORE_CHUNK_DAYS):
+        chunk = trading_days[offset:offset + FEATURE_STORE_CHUNK_DAYS]
+        frame = SimilarDao.get_market_daily_sync(str(chunk[0]), str(chunk[-1]))
+        appended += DailyFeatureStore.append_frame(path, frame)
+    store = DailyFeatureStore.open(path)
+    if store is not None:
+        first_date, last_date = store.date_range()
+        logger.info(f"逐日特征库追加完成，新增交易日: {appended}，覆盖范围: {first_date} ~ {last_date}")
+
+
+async def append_feature_store():
+    """
+    定时将新入库的日线行情增量追加到逐日特征库
+    """
+    try:
+        await ck_util.run_job(_append_feature_store_sync)
+    except Exception as e:
+        logger.error(f"追加逐日特征库失败: {e}")
+
+
+async def rebuild_market_index():
+    """
+    每晚为标准窗口长度重建全市场近似最近邻检索索引
+    """
+    try:
+        await MarketIndexService.rebuild_indexes()
+    except Exception as e:
+        logger.error(f"重建全市场检索索引失败: {e}")
+
+
+async def warm_sector_panels():
+    """
+    最新交易日变化后按查询历史预热热门行业分组的板块面板
+    """
+    try:
+        await SectorPanelService.warm_up()
+    except Exception as e:
+        logger.error(f"预热板块面板失败: {e}")
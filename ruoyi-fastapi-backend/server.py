@@ -1,7 +1,8 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from config.env import AppConfig
+from config.env import AppConfig, StockConfig
 from config.get_db import init_create_table
+from config.get_executor import ProcessPoolUtil
 from config.get_redis import RedisUtil
 from config.get_scheduler import SchedulerUtil
 from controller.similar_controller import similarController
@@ -25,13 +26,27 @@ from module_admin.controller.server_controller import serverController
 from module_admin.controller.user_controller import userController
 from module_generator.controller.gen_controller import genController
 from sub_applications.handle import handle_sub_applications
+from utils import ck_util
 from utils.common_util import worship
+from utils.daily_replica_util import DailyBarReplica
 from utils.log_util import logger
 from module_stock.controller.stock_controller import stockController
 from module_stock.controller.similar_controller import similarController
 from module_stock.controller.follow_controller import followController
 from module_stock.controller.kLine_controller import klineController
 from module_stock.controller.history_controller import historyController
+from module_stock.service.market_index_service import MarketIndexService
+from module_stock.service.market_snapshot_service import MarketSnapshotService
+from module_stock.service.security_master_service import SecurityMasterService
+from module_task.stock_task import (
+    append_feature_store,
+    rebuild_market_index,
+    refresh_security_master,
+    refresh_trading_calendar,
+    sync_daily_replica,
+    warm_sector_panels,
+)
+from utils.trading_calendar_util import TradingCalendarUtil
 # 生命周期事件
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -42,10 +57,39 @@ async def lifespan(app: FastAPI):
     await RedisUtil.init_sys_dict(app.state.redis)
     await RedisUtil.init_sys_config(app.state.redis)
     await SchedulerUtil.init_system_scheduler()
+    await ProcessPoolUtil.init_process_pool()
+    await ck_util.run_job(DailyBarReplica.init_replica)
+    await SecurityMasterService.refresh_security_master()
+    await TradingCalendarUtil.refresh_trading_calendar()
+    await MarketSnapshotService.refresh_market_snapshot()
+    MarketIndexService.load_indexes()
+    await warm_sector_panels()
+    SchedulerUtil.add_system_job(
+        'stock_security_master', '刷新证券主数据', refresh_security_master, StockConfig.stock_security_master_cron
+    )
+    SchedulerUtil.add_system_job(
+        'stock_trading_calendar',
+        '刷新交易日历及行情快照',
+        refresh_trading_calendar,
+        StockConfig.stock_trading_calendar_cron,
+    )
+    SchedulerUtil.add_system_job(
+        'stock_daily_replica', '同步日线本地副本', sync_daily_replica, StockConfig.stock_replica_cron
+    )
+    SchedulerUtil.add_system_job(
+        'stock_feature_store', '追加逐日特征库', append_feature_store, StockConfig.stock_feature_store_cron
+    )
+    SchedulerUtil.add_system_job(
+        'stock_market_index', '重建全市场检索索引', rebuild_market_index, StockConfig.stock_ann_cron
+    )
+    SchedulerUtil.add_system_job(
+        'stock_sector_panel', '预热板块面板', warm_sector_panels, StockConfig.stock_sector_panel_cron
+    )
     logger.info(f'{AppConfig.app_name}启动成功')
     yield
     await RedisUtil.close_redis_pool(app)
     await SchedulerUtil.close_system_scheduler()
+    await ProcessPoolUtil.close_process_pool()
 
 
 # 初始化FastAPI对象
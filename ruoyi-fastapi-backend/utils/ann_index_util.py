@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+
+
+# 分段聚合近似（PAA）的段数
+PAA_SEGMENTS = 32
+# 随机投影后的嵌入维度
+EMBEDDING_DIM = 16
+# 随机投影矩阵的随机种子，构建索引与查询必须一致
+PROJECTION_SEED = 20240601
+# 窗口内有效交易日占比低于该值的股票不参与索引
+MIN_WINDOW_COVERAGE = 0.8
+
+
+def paa(values: np.ndarray, segments: int) -> np.ndarray:
+    """
+    分段聚合近似：将每行序列按时间均匀切分为若干段并取各段均值
+
+    :param values: 形状为 序列数 × 长度 的矩阵
+    :param segments: 段数，超过序列长度时取序列长度
+    :return: 形状为 序列数 × 段数 的矩阵
+    """
+    length = values.shape[1]
+    segments = min(segments, length)
+    starts = np.linspace(0, length, segments, endpoint=False).astype(np.int64)
+    counts = np.diff(np.append(starts, length))
+    return np.add.reduceat(values, starts, axis=1) / counts
+
+
+def projection_matrix(segments: int, dim: int = EMBEDDING_DIM, seed: int = PROJECTION_SEED) -> np.ndarray:
+    """
+    高斯随机投影矩阵，近似保持 PAA 向量之间的欧氏距离
+
+    :param segments: 输入维度（PAA段数）
+    :param dim: 输出维度
+    :param seed: 随机种子
+    :return: 形状为 segments × dim 的矩阵
+    """
+    return np.random.default_rng(seed).normal(0.0, 1.0 / np.sqrt(dim), size=(segments, dim))
+
+
+def window_embeddings(close: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算窗口嵌入：收盘价序列按时间前后填充停牌日后 z 标准化，再经 PAA 降维和随机投影，最后归一化为单位向量，
+    嵌入间的欧氏距离单调对应于 PAA 序列间的相关系数
+
+    :param close: 形状为 股票 × 交易日 的收盘价矩阵
+    :param mask: 有效性掩码
+    :return: (嵌入矩阵, 可用于检索的股票掩码)
+    """
+    filled = pd.DataFrame(np.where(mask, close, np.nan)).ffill(axis=1).bfill(axis=1).to_numpy()
+    # 整个窗口都没有数据的股票填充后仍为空值
+    valid = (mask.mean(axis=1) >= MIN_WINDOW_COVERAGE) & np.isfinite(filled).all(axis=1)
+    filled = np.where(valid[:, None], filled, 0.0)
+    std = filled.std(axis=1, keepdims=True)
+    valid &= std[:, 0] > 0
+    z = np.where(valid[:, None], (filled - filled.mean(axis=1, keepdims=True)) / np.where(std > 0, std, 1.0), 0.0)
+    reduced = paa(z, PAA_SEGMENTS)
+    embedded = reduced @ projection_matrix(reduced.shape[1])
+    norm = np.linalg.norm(embedded, axis=1, keepdims=True)
+    valid &= norm[:, 0] > 0
+    return np.where(valid[:, None], embedded / np.where(norm > 0, norm, 1.0), 0.0), valid
+
+
+def _squared_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    return (points * points).sum(axis=1)[:, None] - 2 * points @ centers.T + (centers * centers).sum(axis=1)[None, :]
+
+
+class IvfIndex:
+    """
+    倒排文件（IVF）近似最近邻索引
+
+    用 k-means 将嵌入划分为若干簇，检索时只在离查询向量最近的若干个簇内精确计算距离，
+    全部使用 numpy 实现
+    """
+
+    def __init__(self, codes: np.ndarray, embeddings: np.ndarray, centroids: np.ndarray,
+                 order: np.ndarray, offsets: np.ndarray, dates: np.ndarray):
+        self.codes = codes
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.dates = dates
+        self.code_index = {code: i for i, code in enumerate(codes)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, codes: np.ndarray, embeddings: np.ndarray, dates: np.ndarray,
+              n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> 'IvfIndex':
+        """
+        构建索引
+
+        :param codes: 股票代码
+        :param embeddings: 对应的嵌入矩阵
+        :param dates: 嵌入使用的窗口交易日
+        :param n_lists: 簇数量，为空时取股票数量的平方根
+        :param iterations: k-means 迭代次数
+        :param seed: 随机种子
+        :return: 索引
+        """
+        n = len(codes)
+        n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        centroids = embeddings[rng.choice(n, n_lists, replace=False)].copy() if n else \
+            np.zeros((0, embeddings.shape[1]))
+        assign = np.zeros(n, dtype=np.int64)
+        for _ in range(iterations if n else 0):
+            assign = _squared_distances(embeddings, centroids).argmin(axis=1)
+            counts = np.bincount(assign, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, embeddings)
+            # 空簇保留上一轮的中心
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        order = np.argsort(assign, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return cls(np.asarray(codes, dtype=str), embeddings, centroids, order, offsets,
+                   np.asarray(dates, dtype='datetime64[D]'))
+
+    def search(self, query: np.ndarray, k: int, n_probe: int = 8) -> List[str]:
+        """
+        检索与查询向量最近的 k 只股票
+
+        :param query: 查询嵌入
+        :param k: 返回数量
+        :param n_probe: 至少检索的簇数量，簇内股票总数不足 k 时继续检索更远的簇
+        :return: 按距离升序排列的股票代码
+        """
+        if not len(self.codes):
+            return []
+        lists = np.argsort(_squared_distances(query[None, :], self.centroids)[0])
+        sizes = np.cumsum(np.diff(self.offsets)[lists])
+        lists = lists[:max(n_probe, int(np.searchsorted(sizes, k)) + 1)]
+        ids = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        return nearest_codes(self.codes[ids], self.embeddings[ids], query, k)
+
+    def matches(self, dates: np.ndarray) -> bool:
+        """
+        索引的窗口交易日是否与给定交易日完全一致
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        return len(dates) == len(self.dates) and bool((dates == self.dates).all())
+
+    def save(self, path: str):
+        np.savez(path, codes=self.codes, embeddings=self.embeddings, centroids=self.centroids,
+                 order=self.order, offsets=self.offsets, dates=self.dates)
+
+    @classmethod
+    def load(cls, path: str) -> 'IvfIndex':
+        with np.load(path) as data:
+            return cls(data['codes'], data['embeddings'], data['centroids'], data['order'], data['offsets'],
+                       data['dates'])
+
+
+def nearest_codes(codes: np.ndarray, embeddings: np.ndarray, query: np.ndarray, k: int) -> List[str]:
+    """
+    在嵌入空间中精确检索与查询向量最近的 k 只股票
+
+    :param codes: 股票代码
+    :param embeddings: 对应的嵌入矩阵
+    :param query: 查询嵌入
+    :param k: 返回数量
+    :return: 按距离升序排列的股票代码
+    """
+    distances = ((embeddings - query) ** 2).sum(axis=1)
+    k = min(k, len(codes))
+    if k <= 0:
+        return []
+    top = np.argpartition(distances, k - 1)[:k]
+    return [str(code) for code in codes[top[np.argsort(distances[top], kind='stable')]]]
+
+
+def build_window_index(codes: np.ndarray, dates: np.ndarray, close: np.ndarray, mask: np.ndarray) -> IvfIndex:
+    """
+    计算全市场窗口嵌入并构建索引，在计算进程池中执行
+
+    :param codes: 股票代码
+    :param dates: 窗口交易日
+    :param close: 形状为 股票 × 交易日 的收盘价矩阵
+    :param mask: 有效性掩码
+    :return: 索引
+    """
+    embeddings, valid = window_embeddings(close, mask)
+    return IvfIndex.build(codes[valid], embeddings[valid], dates)
+
+
+def window_nearest_codes(codes: np.ndarray, close: np.ndarray, mask: np.ndarray, stock_code: str,
+                         k: int) -> Optional[List[str]]:
+    """
+    计算全市场窗口嵌入，精确检索与指定股票最近的 k 只其他股票，在计算进程池中执行
+
+    :param codes: 股票代码
+    :param close: 形状为 股票 × 交易日 的收盘价矩阵
+    :param mask: 有效性掩码
+    :param stock_code: 指定股票代码
+    :param k: 返回数量
+    :return: 按距离升序排列的股票代码，不含指定股票；指定股票不存在或有效交易日不足时为None
+    """
+    embeddings, valid = window_embeddings(close, mask)
+    position = np.flatnonzero(codes == stock_code)
+    if not len(position) or not valid[position[0]]:
+        return None
+    keep = valid & (codes != stock_code)
+    return nearest_codes(codes[keep], embeddings[keep], embeddings[position[0]], k)
@@ -1,8 +1,19 @@
+import asyncio
+import bisect
 import clickhouse_connect
+import numpy as np
+import pandas as pd
+import threading
+from clickhouse_connect.driver.exceptions import OperationalError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from config.env import ClickHouseConfig
-from queue import Queue
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
 import time
 import sshtunnel
+from utils.data_util import select_dataframe_columns
 
 
 CK_HOST = ClickHouseConfig.ck_host
@@ -12,6 +23,12 @@ CK_PASSWORD = ClickHouseConfig.ck_password  # 添加密码配置
 CK_CONNECT_TIMEOUT = 30     
 CK_SEND_RECEIVE_TIMEOUT = 30 
 CK_COMPRESSION = ClickHouseConfig.ck_compression
+CK_POOL_SIZE = ClickHouseConfig.ck_pool_size
+CK_POOL_MIN_SIZE = ClickHouseConfig.ck_pool_min_size
+CK_POOL_ACQUIRE_TIMEOUT = ClickHouseConfig.ck_pool_acquire_timeout
+CK_POOL_IDLE_TIMEOUT = ClickHouseConfig.ck_pool_idle_timeout
+CK_POOL_VALIDATE_IDLE = ClickHouseConfig.ck_pool_validate_idle
+CK_QUERY_TIMEOUT = ClickHouseConfig.ck_query_timeout
 
 # SSH 跳板机配置
 SSH_HOST = 'isrc.iscas.ac.cn'  # 跳板机地址
@@ -19,6 +36,9 @@ SSH_PORT = 5022  # 跳板机 SSH 端口
 SSH_USERNAME = 'xuran'  # 跳板机用户名
 SSH_KEY_PATH = r'C:\Users\isrc\.ssh\id_rsa'  # 使用原始字符串避免转义问题
 
+# 获取连接等待时间直方图的分桶上界（毫秒），最后一个桶为超过最大上界的等待
+WAIT_TIME_BUCKETS_MS = [1, 10, 100, 1000, 5000]
+
 
 def create_ssh_tunnel():
     """创建 SSH 隧道"""
@@ -40,11 +60,8 @@ def create_ssh_tunnel():
         raise
 
 
-def create_client_with_retry(max_retries=3, retry_delay=5):
-    """创建带重试的 ClickHouse 客户端"""
-    tunnel = create_ssh_tunnel()
-    local_port = tunnel.local_bind_port
-
+def create_client_with_retry(local_port: int, max_retries=3, retry_delay=5):
+    """通过已建立的隧道创建带重试的 ClickHouse 客户端"""
     for attempt in range(max_retries):
         try:
             client = clickhouse_connect.get_client(
@@ -56,73 +73,379 @@ def create_client_with_retry(max_retries=3, retry_delay=5):
                 send_receive_timeout=CK_SEND_RECEIVE_TIMEOUT,
                 compression=CK_COMPRESSION
             )
-            return client, tunnel
+            return client
         except Exception as e:
             if attempt == max_retries - 1:  # 最后一次尝试
-                tunnel.close()
                 raise e
             print(f"连接尝试 {attempt + 1} 失败，{retry_delay} 秒后重试...")
             time.sleep(retry_delay)
 
 
+class ClickHousePoolTimeout(TimeoutError):
+    """
+    在获取连接的等待时间内没有可用连接
+    """
+
+
 class ClickHousePool:
-    def __init__(self, maxsize=10):
-        self.pool = Queue(maxsize)
-        self.tunnels = []  # 保存所有隧道连接
-        for _ in range(maxsize):
-            client, tunnel = create_client_with_retry()
-            self.pool.put(client)
-            self.tunnels.append(tunnel)
+    """
+    弹性 ClickHouse 连接池
+
+    连接在首次使用时按需创建，最多 maxsize 个，所有连接共享同一条 SSH 隧道；
+    取出空闲超过 validate_idle 秒的连接时先校验是否可用，不可用的连接直接丢弃并重新获取，
+    刚归还的连接直接复用，不为每次查询增加一次往返；
+    池满时最多等待 acquire_timeout 秒，超时抛出 ClickHousePoolTimeout；
+    空闲超过 idle_timeout 秒的连接在取出、归还时及由后台线程定期回收，回收后不少于 minsize 个。
+    """
+
+    def __init__(self, minsize=1, maxsize=10, acquire_timeout=10, idle_timeout=300, validate_idle=30):
+        self.minsize = max(0, min(minsize, maxsize))
+        self.maxsize = maxsize
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.validate_idle = validate_idle
+        self.tunnel = None
+        # 定期回收空闲连接的后台线程，在首次创建连接时启动
+        self.reaper = None
+        self.closed = threading.Event()
+        # 空闲连接及其归还时间，先进后出，优先复用最近使用过的连接
+        self.idle = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+        self.tunnel_lock = threading.Lock()
+        # 统计信息
+        self.acquire_count = 0
+        self.timeout_count = 0
+        self.broken_count = 0
+        self.created_count = 0
+        self.wait_time_histogram = [0] * (len(WAIT_TIME_BUCKETS_MS) + 1)
+
+    def _get_local_port(self) -> int:
+        """获取共享隧道的本地端口，隧道未建立或已断开时重新建立"""
+        with self.tunnel_lock:
+            if self.tunnel is None or not self.tunnel.is_active:
+                if self.tunnel is not None:
+                    self._close_quietly(self.tunnel)
+                self.tunnel = create_ssh_tunnel()
+            return self.tunnel.local_bind_port
+
+    def _validate(self, client) -> bool:
+        """校验连接是否可用"""
+        try:
+            return bool(client.ping())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(resource):
+        try:
+            resource.close()
+        except Exception:
+            pass
+
+    def _discard(self, client):
+        """丢弃连接并释放名额"""
+        self._close_quietly(client)
+        with self.condition:
+            self.size -= 1
+            self.broken_count += 1
+            self.condition.notify()
+
+    def _pop_expired(self, now: float) -> List[Any]:
+        """取出空闲超过 idle_timeout 的连接并释放名额，调用方需持有 condition 并在锁外关闭返回的连接"""
+        expired = []
+        # 空闲最久的连接位于队首
+        while self.size > self.minsize and self.idle and now - self.idle[0][1] > self.idle_timeout:
+            expired.append(self.idle.popleft()[0])
+            self.size -= 1
+        if expired:
+            self.condition.notify_all()
+        return expired
+
+    def reap_idle(self):
+        """回收空闲超过 idle_timeout 的连接，没有查询时连接池也能缩回 minsize"""
+        with self.condition:
+            expired = self._pop_expired(time.monotonic())
+        for client in expired:
+            self._close_quietly(client)
+
+    def _run_reaper(self):
+        while not self.closed.wait(max(self.idle_timeout / 2, 1)):
+            self.reap_idle()
+
+    def _ensure_reaper(self):
+        with self.condition:
+            if self.reaper is None:
+                self.reaper = threading.Thread(target=self._run_reaper, name='clickhouse-pool-reaper', daemon=True)
+                self.reaper.start()
+
+    def _record_wait(self, wait_seconds: float):
+        self.acquire_count += 1
+        index = bisect.bisect_left(WAIT_TIME_BUCKETS_MS, wait_seconds * 1000)
+        self.wait_time_histogram[index] += 1
+
+    def get_client(self, timeout: Optional[float] = None):
+        """
+        获取连接
+
+        :param timeout: 最长等待时间（秒），为空时使用连接池的默认值
+        :return: ClickHouse 客户端
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.size >= self.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeout_count += 1
+                        raise ClickHousePoolTimeout(f"获取 ClickHouse 连接超时（{timeout} 秒），连接池已满")
+                    self.condition.wait(remaining)
+                expired = self._pop_expired(time.monotonic())
+                if self.idle:
+                    client, returned_at = self.idle.pop()
+                else:
+                    # 先占用名额，在锁外创建连接
+                    client = None
+                    self.size += 1
+
+            for expired_client in expired:
+                self._close_quietly(expired_client)
+
+            if client is None:
+                self._ensure_reaper()
+                try:
+                    client = create_client_with_retry(self._get_local_port())
+                except Exception:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.created_count += 1
+                    self._record_wait(time.monotonic() - start)
+                return client
+
+            # 只校验空闲较久的连接，可能已被服务端或隧道断开
+            if time.monotonic() - returned_at <= self.validate_idle or self._validate(client):
+                with self.condition:
+                    self._record_wait(time.monotonic() - start)
+                return client
+            self._discard(client)
+
+    def release_client(self, client, broken: bool = False):
+        """
+        归还连接
+
+        :param client: ClickHouse 客户端
+        :param broken: 连接是否已损坏，损坏的连接不再放回池中
+        """
+        if broken:
+            self._discard(client)
+            return
+        now = time.monotonic()
+        with self.condition:
+            self.idle.append((client, now))
+            expired = self._pop_expired(now)
+            self.condition.notify()
+        for expired_client in expired:
+            self._close_quietly(expired_client)
+
+    @contextmanager
+    def connection(self):
+        """
+        借出连接的上下文，连接层异常时将连接作为损坏连接丢弃
+        """
+        client = self.get_client()
+        broken = False
+        try:
+            yield client
+        except OperationalError:
+            broken = True
+            raise
+        finally:
+            self.release_client(client, broken)
 
-    def get_client(self):
-        return self.pool.get()
+    def stats(self) -> Dict[str, Any]:
+        """
+        连接池实时统计信息
 
-    def release_client(self, client):
-        self.pool.put(client)
+        :return: 连接数、使用中、空闲、获取次数、超时次数、等待时间直方图等
+        """
+        with self.condition:
+            idle = len(self.idle)
+            labels = [f'<={bound}ms' for bound in WAIT_TIME_BUCKETS_MS] + [f'>{WAIT_TIME_BUCKETS_MS[-1]}ms']
+            return {
+                'min_size': self.minsize,
+                'max_size': self.maxsize,
+                'size': self.size,
+                'in_use': self.size - idle,
+                'idle': idle,
+                'acquire_count': self.acquire_count,
+                'timeout_count': self.timeout_count,
+                'broken_count': self.broken_count,
+                'created_count': self.created_count,
+                'wait_time_histogram': dict(zip(labels, self.wait_time_histogram)),
+                'tunnel_active': bool(self.tunnel is not None and self.tunnel.is_active),
+            }
 
     def close(self):
-        """关闭所有隧道连接"""
-        for tunnel in self.tunnels:
-            try:
-                tunnel.close()
-            except:
-                pass
+        """关闭所有连接及隧道"""
+        self.closed.set()
+        with self.condition:
+            clients = [client for client, _ in self.idle]
+            self.idle.clear()
+            self.size -= len(clients)
+        for client in clients:
+            self._close_quietly(client)
+        with self.tunnel_lock:
+            if self.tunnel is not None:
+                self._close_quietly(self.tunnel)
+                self.tunnel = None
 
 
-# 创建全局池
-try:
-    ch_pool = ClickHousePool(maxsize=10)
-except Exception as e:
-    print(f"初始化 ClickHouse 连接池失败: {str(e)}")
-    raise
+# 创建全局池，连接在首次查询时才建立
+ch_pool = ClickHousePool(
+    minsize=CK_POOL_MIN_SIZE,
+    maxsize=CK_POOL_SIZE,
+    acquire_timeout=CK_POOL_ACQUIRE_TIMEOUT,
+    idle_timeout=CK_POOL_IDLE_TIMEOUT,
+    validate_idle=CK_POOL_VALIDATE_IDLE,
+)
 
+# ClickHouse 专用线程池，线程数与连接池大小一致，线程不会因等待连接而堆积
+ck_executor = ThreadPoolExecutor(max_workers=CK_POOL_SIZE, thread_name_prefix='clickhouse')
 
-def query(sql: str):
-    client = ch_pool.get_client()
-    try:
-        result = client.query(sql)
+# 副本同步、特征库追加等长时间运行的任务使用单独的线程池，不占用 ck_executor 中服务请求查询的线程
+CK_JOB_WORKERS = 2
+job_executor = ThreadPoolExecutor(max_workers=CK_JOB_WORKERS, thread_name_prefix='clickhouse-job')
+
+
+def _query_settings(timeout: Optional[float]) -> Dict[str, Any]:
+    """单条查询的服务端设置：超过超时时间由 ClickHouse 主动中止查询"""
+    return {'max_execution_time': int(timeout or CK_QUERY_TIMEOUT)}
+
+
+def query(sql: str, timeout: Optional[float] = None):
+    with ch_pool.connection() as client:
+        return client.query(sql, settings=_query_settings(timeout))
+
+
+def query_df(sql: str, columns: Optional[List[str]] = None, timeout: Optional[float] = None) -> pd.DataFrame:
+    """
+    列式查询：由 clickhouse_connect 按列直接构建 DataFrame，
+    数值列为 numpy 类型、日期列为 datetime64，避免先逐行构建 Python 元组再转换
+
+    :param sql: 查询语句
+    :param columns: 需要返回的列，缺失的列填充为None，为空时返回全部列
+    :param timeout: 查询超时（秒），为空时使用配置的默认值
+    :return: 查询结果
+    """
+    with ch_pool.connection() as client:
+        df = client.query_df(sql, settings=_query_settings(timeout), use_none=True)
+    if columns is None:
+        return df
+    return select_dataframe_columns(df, columns)
+
+
+def query_np(sql: str, columns: Optional[List[str]] = None, timeout: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """
+    列式查询，由 clickhouse_connect 按列类型直接构建 numpy 数组，返回 列名 → numpy 数组 的映射，
+    可空数值列中的 NULL 为 NaN（整数列为0），字符串列为 object 数组
+
+    :param sql: 查询语句
+    :param columns: 需要返回的列，缺失的列填充为None，为空时返回全部列
+    :param timeout: 查询超时（秒），为空时使用配置的默认值
+    :return: 列名到 numpy 数组的映射
+    """
+    with ch_pool.connection() as client:
+        with client.query_np_stream(sql, settings=_query_settings(timeout), use_none=False) as stream:
+            blocks = list(stream)
+            names, np_types = list(stream.source.column_names), stream.source.np_types
+    if isinstance(np_types, np.dtype) and np_types.names:
+        # 各列类型不同时每个数据块为结构化数组
+        result = {name: np.concatenate([block[name] for block in blocks]) if blocks else np.empty(0, np_types[name])
+                  for name in names}
+    else:
+        # 各列类型相同时每个数据块为 行 × 列 的二维数组
+        result = {name: np.concatenate([block[:, index] for block in blocks]) if blocks else np.empty(0, np_types)
+                  for index, name in enumerate(names)}
+    if columns is None:
         return result
-    finally:
-        ch_pool.release_client(client)
+    row_count = len(next(iter(result.values()))) if result else 0
+    return {column: result[column] if column in result else np.full(row_count, None, dtype=object)
+            for column in columns}
+
+
+async def run_sync(func: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+    """
+    在 ClickHouse 专用线程池中执行同步查询函数，不阻塞事件循环
+
+    :param func: 同步查询函数
+    :param args: 函数参数
+    :param timeout: 等待超时（秒），为空时不限制等待时间，仅由每条查询自身的超时约束
+    :return: 函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(ck_executor, partial(func, *args))
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+
+async def run_job(func: Callable, *args: Any) -> Any:
+    """
+    在长任务线程池中执行耗时的同步任务（读取大量数据、写入磁盘），不阻塞事件循环，也不占用查询线程
+
+    :param func: 同步任务函数
+    :param args: 函数参数
+    :return: 函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(job_executor, partial(func, *args))
+
+
+async def async_query(sql: str, timeout: Optional[float] = None):
+    """
+    异步执行查询，超时后抛出 asyncio.TimeoutError
+
+    :param sql: 查询语句
+    :param timeout: 查询超时（秒），为空时使用配置的默认值
+    :return: 查询结果
+    """
+    timeout = timeout or CK_QUERY_TIMEOUT
+    return await run_sync(query, sql, timeout, timeout=timeout)
+
+
+async def async_query_df(
+    sql: str, columns: Optional[List[str]] = None, timeout: Optional[float] = None
+) -> pd.DataFrame:
+    """
+    异步列式查询，超时后抛出 asyncio.TimeoutError
+
+    :param sql: 查询语句
+    :param columns: 需要返回的列，为空时返回全部列
+    :param timeout: 查询超时（秒），为空时使用配置的默认值
+    :return: 查询结果
+    """
+    timeout = timeout or CK_QUERY_TIMEOUT
+    return await run_sync(query_df, sql, columns, timeout, timeout=timeout)
 
 
 def insert(db: str, table: str, data: list, column_names: list, column_types: list = None):
-    client = ch_pool.get_client()
-    try:
+    with ch_pool.connection() as client:
         client.insert(table=table, database=db, data=data, column_names=column_names, column_type_names=column_types)
-    finally:
-        ch_pool.release_client(client)
 
 
 def insert_df(db: str, table: str, df, column_names: list, column_types: list = None):
-    client = ch_pool.get_client()
-    try:
+    with ch_pool.connection() as client:
         client.insert_df(table=table, database=db, df=df, column_names=column_names, column_type_names=column_types)
-    finally:
-        ch_pool.release_client(client)
 
 
 # 在程序退出时关闭连接池
 import atexit
 
 atexit.register(ch_pool.close)
+atexit.register(ck_executor.shutdown, wait=False)
+atexit.register(job_executor.shutdown, wait=False)
@@ -0,0 +1,161 @@
+import numpy as np
+from scipy.special import ndtr
+from typing import Tuple
+
+
+# 与 statsmodels 一致的共线性判定阈值：协整回归的 R² 不小于该值时视为完全共线，检验统计量为 -inf
+COLLINEAR_RSQUARED = 1 - 100 * np.sqrt(np.finfo(float).eps)
+# MacKinnon (1994) 近似 p 值表中两变量协整检验（含常数项）的一行：
+# 统计量上下限、小 p 值区间与大 p 值区间的分界点及两段多项式系数（按升幂排列，已乘以表的缩放系数）
+MACKINNON_TAU_MAX = 0.92
+MACKINNON_TAU_MIN = -18.86
+MACKINNON_TAU_STAR = -2.62
+MACKINNON_SMALL_P = np.array([2.92, 1.5012, 0.039796])
+MACKINNON_LARGE_P = np.array([2.1945, 0.64695, -0.29198, -0.042377])
+
+
+def mackinnon_pvalue(stats: np.ndarray) -> np.ndarray:
+    """
+    按 MacKinnon 近似 p 值表批量将两变量协整检验统计量换算为 p 值，结果与 statsmodels 的 mackinnonp 一致
+
+    :param stats: 检验统计量
+    :return: p 值，统计量为空值时为空值
+    """
+    stats = np.asarray(stats, dtype=float)
+    with np.errstate(invalid='ignore', over='ignore'):
+        small = np.polynomial.polynomial.polyval(stats, MACKINNON_SMALL_P)
+        large = np.polynomial.polynomial.polyval(stats, MACKINNON_LARGE_P)
+        p_values = ndtr(np.where(stats <= MACKINNON_TAU_STAR, small, large))
+    p_values = np.where(stats > MACKINNON_TAU_MAX, 1.0, p_values)
+    return np.where(stats < MACKINNON_TAU_MIN, 0.0, p_values)
+
+
+def adf_max_lag(nobs: int) -> int:
+    """
+    ADF 检验（不含常数项）自动选择滞后阶数时的最大阶数，与 statsmodels 的 adfuller 一致
+
+    :param nobs: 序列长度
+    :return: 最大滞后阶数
+    """
+    return min(nobs // 2 - 1, int(np.ceil(12.0 * np.power(nobs / 100.0, 1 / 4.0))))
+
+
+def _lagged_design(x: np.ndarray, lag: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    构建 ADF 回归的设计矩阵：被解释变量为一阶差分，解释变量为上一期水平值及前 lag 期差分
+
+    :param x: 形状为 序列数 × 长度 的矩阵
+    :param lag: 差分滞后阶数
+    :return: (设计矩阵 序列数 × 样本数 × (lag + 1), 被解释变量 序列数 × 样本数)
+    """
+    diff = np.diff(x, axis=1)
+    length = diff.shape[1]
+    columns = [x[:, lag:length]] + [diff[:, lag - j:length - j] for j in range(1, lag + 1)]
+    return np.stack(columns, axis=2), diff[:, lag:]
+
+
+def _inverse(gram: np.ndarray) -> np.ndarray:
+    """
+    批量求 X'X 的逆矩阵，存在奇异矩阵时改用伪逆
+    """
+    try:
+        return np.linalg.inv(gram)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(gram)
+
+
+def _nested_ssr(gram: np.ndarray, moment: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """
+    批量计算以设计矩阵前 1、2、…、k 列依次回归的残差平方和。
+
+    X'X = LL' 时，前 j 列回归的残差平方和为 y'y 减去 L^-1 X'y 前 j 个分量的平方和，
+    一次 Cholesky 分解即可得到所有嵌套回归的结果
+
+    :param gram: 设计矩阵的 X'X，形状为 序列数 × k × k
+    :param moment: X'y，形状为 序列数 × k
+    :param total: y'y
+    :return: 形状为 k × 序列数 的残差平方和
+    """
+    try:
+        projected = np.linalg.solve(np.linalg.cholesky(gram), moment[:, :, None])[:, :, 0]
+        explained = np.cumsum(projected * projected, axis=1)
+    except np.linalg.LinAlgError:
+        # 存在非正定矩阵（如残差中含常数段）时逐个阶数以伪逆求解
+        explained = np.stack([
+            np.einsum('sij,si,sj->s', np.linalg.pinv(gram[:, :k, :k]), moment[:, :k], moment[:, :k])
+            for k in range(1, gram.shape[1] + 1)
+        ], axis=1)
+    return np.maximum(total[:, None] - explained, 0.0).T
+
+
+def batch_adf_statistic(x: np.ndarray) -> np.ndarray:
+    """
+    批量计算不含常数项的 ADF 检验统计量，滞后阶数按 AIC 自动选择，结果与 statsmodels 的
+    adfuller(x, regression='n', autolag='aic') 一致。
+
+    所有序列共用同一组候选滞后阶数：先在最大阶数对应的共同样本上一次性构建设计矩阵，
+    各阶数的回归为其前若干列的嵌套回归，由一次 Cholesky 分解得到全部残差平方和，按 AIC 为每条序列选出最优阶数；
+    再按选出的阶数分组，在各自完整的样本上重新回归，取水平项系数的 t 值
+
+    :param x: 形状为 序列数 × 长度 的矩阵，不含空值
+    :return: 每条序列的检验统计量
+    """
+    count, nobs = x.shape
+    max_lag = adf_max_lag(nobs)
+    if not count or max_lag < 0:
+        return np.full(count, np.nan)
+    design, target = _lagged_design(x, max_lag)
+    samples = target.shape[1]
+    ssr = _nested_ssr(design.transpose(0, 2, 1) @ design, np.einsum('smi,sm->si', design, target),
+                      np.einsum('sm,sm->s', target, target))
+    with np.errstate(divide='ignore'):
+        llf = -samples / 2.0 * (np.log(2 * np.pi) + np.log(ssr / samples) + 1)
+    criteria = -2 * llf + 2 * np.arange(1, max_lag + 2)[:, None]
+    best_lags = np.argmin(criteria, axis=0)
+
+    stats = np.empty(count)
+    for lag in np.unique(best_lags):
+        rows = np.flatnonzero(best_lags == lag)
+        design, target = _lagged_design(x[rows], int(lag))
+        gram_inv = _inverse(design.transpose(0, 2, 1) @ design)
+        params = np.einsum('sij,sj->si', gram_inv, np.einsum('smi,sm->si', design, target))
+        residuals = target - np.einsum('smk,sk->sm', design, params)
+        scale = np.einsum('sm,sm->s', residuals, residuals) / (target.shape[1] - lag - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stats[rows] = params[:, 0] / np.sqrt(gram_inv[:, 0, 0] * scale)
+    return stats
+
+
+def batch_coint(y0: np.ndarray, y1: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量进行 Engle-Granger 两步法协整检验，每一行为一对序列，结果与 statsmodels 的 coint(y0, y1) 一致。
+
+    第一步对每一行以 y1 和常数项回归 y0，得到残差矩阵；第二步对残差矩阵整体进行 ADF 检验，
+    统计量按 MacKinnon 近似 p 值表换算为 p 值
+
+    :param y0: 形状为 序列对数 × 长度 的被解释序列
+    :param y1: 形状与 y0 一致的解释序列
+    :return: (检验统计量, p 值)，包含空值或无穷值的行均为空值
+    """
+    count = y0.shape[0]
+    stats = np.full(count, np.nan)
+    finite = np.isfinite(y0).all(axis=1) & np.isfinite(y1).all(axis=1)
+    if not finite.any():
+        return stats, stats.copy()
+    y0, y1 = y0[finite], y1[finite]
+    centered0 = y0 - y0.mean(axis=1, keepdims=True)
+    centered1 = y1 - y1.mean(axis=1, keepdims=True)
+    var1 = np.einsum('sn,sn->s', centered1, centered1)
+    tss = np.einsum('sn,sn->s', centered0, centered0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # y1 为常数时回归只剩常数项
+        beta = np.where(var1 > 0, np.einsum('sn,sn->s', centered0, centered1) / var1, 0.0)
+        residuals = centered0 - beta[:, None] * centered1
+        rsquared = 1 - np.einsum('sn,sn->s', residuals, residuals) / tss
+    # R² 为空值（y0 为常数）时与 statsmodels 一样按共线处理
+    collinear = ~(rsquared < COLLINEAR_RSQUARED)
+    finite_stats = np.full(len(y0), -np.inf)
+    if (~collinear).any():
+        finite_stats[~collinear] = batch_adf_statistic(residuals[~collinear])
+    stats[finite] = finite_stats
+    return stats, mackinnon_pvalue(stats)
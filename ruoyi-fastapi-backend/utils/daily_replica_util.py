@@ -0,0 +1,416 @@
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.env import StockConfig
+from utils import ck_util
+import logging
+logger = logging.getLogger(__name__)
+
+# 副本中保存的日线数值列
+REPLICA_VALUE_COLUMNS = ['open', 'close', 'high', 'low', 'ycp', 'vol']
+# 查询结果的列，与 DAO 中读取 ods_stock.ll_stock_daily_sharing 的列一致
+REPLICA_COLUMNS = ['code'] + REPLICA_VALUE_COLUMNS + ['timestamps']
+META_FILE = 'meta.json'
+# 副本模式：off 不使用副本；readthrough 优先读取副本，副本未覆盖的日期区间回源 ClickHouse；
+# offline 只读取副本，不访问 ClickHouse，副本为空时从夹具数据集构建
+REPLICA_MODES = ('off', 'readthrough', 'offline')
+
+
+class DailyBarReplica:
+    """
+    日线行情本地列式副本
+
+    镜像 ods_stock.ll_stock_daily_sharing 中 category = 'stock' 的日线，按月分区（YYYY-MM），
+    每个分区内的行按 股票代码、交易日 排序，每列保存为一个内存映射的 .npy 文件，
+    并保存每只股票在分区中的起止行偏移，单只股票或板块的查询只需二分定位后切片。
+    meta.json 记录副本覆盖的连续日期区间及每个分区当前的文件代数，
+    重写分区时在锁外写入新一代目录，只在原子替换 meta.json 时持有读取使用的锁，
+    被替换的上一代目录保留到下一次写入再删除，正在读取旧分区的请求不受影响；
+    增量同步只重写涉及的月份。早期按年分区（YYYY）的副本仍可读取，写入涉及的年份时拆分为按月分区。
+    """
+
+    _meta: Optional[Dict] = None
+    _meta_version: Optional[int] = None
+    _partitions: Dict[str, Tuple[int, Dict[str, np.ndarray]]] = {}
+    # 读取使用的锁，只保护内存中的 meta 及分区缓存
+    _lock = threading.RLock()
+    # 写入使用的锁，串行化副本的写入，不阻塞读取
+    _write_lock = threading.Lock()
+
+    @classmethod
+    def mode(cls) -> str:
+        """
+        当前的副本模式
+
+        :return: off、readthrough 或 offline
+        """
+        mode = str(StockConfig.stock_replica_mode).lower()
+        return mode if mode in REPLICA_MODES else 'off'
+
+    @classmethod
+    def enabled(cls) -> bool:
+        """
+        DAO 是否通过副本读取日线
+
+        :return: 是否启用
+        """
+        return cls.mode() != 'off'
+
+    @classmethod
+    def is_offline(cls) -> bool:
+        """
+        是否为离线模式
+
+        :return: 是否离线
+        """
+        return cls.mode() == 'offline'
+
+    @staticmethod
+    def _root() -> str:
+        return StockConfig.stock_replica_path
+
+    @classmethod
+    def _partition_path(cls, key: str, generation: int) -> str:
+        return os.path.join(cls._root(), f'{key}.{generation}')
+
+    @staticmethod
+    def _partition_span(key: str) -> Tuple[np.datetime64, np.datetime64]:
+        """
+        分区覆盖的日期区间，分区键为 YYYY-MM（按月）或 YYYY（早期按年分区）
+        """
+        unit = 'M' if len(key) > 4 else 'Y'
+        first = np.datetime64(key, unit)
+        return first.astype('datetime64[D]'), (first + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+    @classmethod
+    def _overlapping_keys(cls, partitions: Dict[str, int], start: np.datetime64, end: np.datetime64) -> List[str]:
+        """
+        与 [start, end] 有交集的分区键
+        """
+        keys = []
+        for key in sorted(partitions):
+            key_start, key_end = cls._partition_span(key)
+            if key_start <= end and key_end >= start:
+                keys.append(key)
+        return keys
+
+    @classmethod
+    def _load_meta(cls) -> Optional[Dict]:
+        """
+        读取 meta.json，文件未变化时复用已读取的内容
+        """
+        meta_path = os.path.join(cls._root(), META_FILE)
+        try:
+            version = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with cls._lock:
+            if cls._meta is None or cls._meta_version != version:
+                with open(meta_path, encoding='utf-8') as f:
+                    cls._meta = json.load(f)
+                cls._meta_version = version
+            return cls._meta
+
+    @classmethod
+    def coverage(cls) -> Tuple[Optional[np.datetime64], Optional[np.datetime64]]:
+        """
+        副本覆盖的日期区间
+
+        :return: (开始日期, 结束日期)，副本为空时均为None
+        """
+        meta = cls._load_meta()
+        if not meta or not meta.get('start'):
+            return None, None
+        return np.datetime64(meta['start'], 'D'), np.datetime64(meta['end'], 'D')
+
+    @classmethod
+    def _partition(cls, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        以只读内存映射方式打开一个分区，分区代数未变化时复用
+        """
+        meta = cls._load_meta()
+        generation = (meta or {}).get('partitions', {}).get(key)
+        if generation is None:
+            return None
+        with cls._lock:
+            cached = cls._partitions.get(key)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+            path = cls._partition_path(key, generation)
+            arrays = {
+                name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                for name in ['codes', 'offsets', 'timestamps'] + REPLICA_VALUE_COLUMNS
+            }
+            cls._partitions[key] = (generation, arrays)
+            return arrays
+
+    @staticmethod
+    def _empty_frame() -> pd.DataFrame:
+        frame = pd.DataFrame({column: pd.Series(dtype=float) for column in REPLICA_COLUMNS})
+        frame['code'] = frame['code'].astype(object)
+        frame['timestamps'] = pd.to_datetime(frame['timestamps'])
+        return frame
+
+    @classmethod
+    def _read_partition(cls, key: str, codes: Optional[List[str]],
+                        start: np.datetime64, end: np.datetime64) -> Optional[pd.DataFrame]:
+        """
+        读取一个分区中指定股票在 [start, end] 内的行
+        """
+        part = cls._partition(key)
+        if part is None:
+            return None
+        part_codes, offsets, timestamps = part['codes'], part['offsets'], part['timestamps']
+        if codes is None:
+            rows = np.flatnonzero((timestamps >= start) & (timestamps <= end))
+        else:
+            ranges = []
+            for code in dict.fromkeys(codes):
+                position = int(np.searchsorted(part_codes, code))
+                if position == len(part_codes) or part_codes[position] != code:
+                    continue
+                lo, hi = int(offsets[position]), int(offsets[position + 1])
+                # 同一只股票的行按交易日排序，二分定位日期区间
+                days = timestamps[lo:hi]
+                ranges.append(np.arange(lo + np.searchsorted(days, start, side='left'),
+                                        lo + np.searchsorted(days, end, side='right')))
+            rows = np.concatenate(ranges) if ranges else np.array([], dtype=np.int64)
+        if not len(rows):
+            return None
+        code_ids = np.searchsorted(offsets, rows, side='right') - 1
+        frame = pd.DataFrame({'code': np.asarray(part_codes)[code_ids].astype(object)})
+        for column in REPLICA_VALUE_COLUMNS:
+            frame[column] = np.asarray(part[column][rows])
+        frame['timestamps'] = np.asarray(timestamps[rows]).astype('datetime64[ns]')
+        return frame
+
+    @classmethod
+    def read_local(cls, codes: Optional[List[str]], start_date, end_date) -> pd.DataFrame:
+        """
+        只从副本读取日线
+
+        :param codes: 股票代码列表，为None时读取全部股票
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 按 code、timestamps 排序的长表
+        """
+        start, end = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D')
+        if (codes is not None and not codes) or start > end:
+            return cls._empty_frame()
+        frames = []
+        partitions = (cls._load_meta() or {}).get('partitions', {})
+        for key in cls._overlapping_keys(partitions, start, end):
+            frame = cls._read_partition(key, codes, start, end)
+            if frame is not None:
+                frames.append(frame)
+        if not frames:
+            return cls._empty_frame()
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True).sort_values(['code', 'timestamps'], kind='stable',
+                                                                 ignore_index=True)
+
+    @classmethod
+    def fetch_clickhouse(cls, codes: Optional[List[str]], start_date, end_date) -> pd.DataFrame:
+        """
+        从 ClickHouse 读取日线，与副本的查询结果结构一致
+
+        :param codes: 股票代码列表，为None时读取全部股票
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 按 code、timestamps 排序的长表
+        """
+        if codes is not None and not codes:
+            return cls._empty_frame()
+        code_filter = ''
+        if codes is not None:
+            code_filter = 'AND code IN ({})'.format(', '.join(f"'{code}'" for code in codes))
+        query = f"""
+        SELECT code, open, close, high, low, ycp, vol, timestamps
+        FROM ods_stock.ll_stock_daily_sharing
+        WHERE category = 'stock'
+            {code_filter}
+            AND timestamps >= toDate('{start_date}')
+            AND timestamps <= toDate('{end_date}')
+        ORDER BY code, timestamps
+        """
+        return ck_util.query_df(query, REPLICA_COLUMNS)
+
+    @classmethod
+    def query_daily(cls, codes: Optional[List[str]], start_date, end_date) -> pd.DataFrame:
+        """
+        读取日线：副本覆盖的部分从本地读取，未覆盖的日期区间回源 ClickHouse（离线模式下忽略）
+
+        :param codes: 股票代码列表，为None时读取全部股票
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 按 code、timestamps 排序的长表
+        """
+        start, end = np.datetime64(str(start_date)[:10], 'D'), np.datetime64(str(end_date)[:10], 'D')
+        cover_start, cover_end = cls.coverage()
+        if cover_start is None or end < cover_start or start > cover_end:
+            # 副本与请求区间没有交集
+            if cls.is_offline():
+                logger.warning(f"离线副本未覆盖 {start} ~ {end}")
+                return cls._empty_frame()
+            return cls.fetch_clickhouse(codes, start, end)
+
+        frames = [cls.read_local(codes, max(start, cover_start), min(end, cover_end))]
+        missing = []
+        if start < cover_start:
+            missing.append((start, cover_start - np.timedelta64(1, 'D')))
+        if end > cover_end:
+            missing.append((cover_end + np.timedelta64(1, 'D'), end))
+        for missing_start, missing_end in missing:
+            if cls.is_offline():
+                logger.warning(f"离线副本未覆盖 {missing_start} ~ {missing_end}")
+                continue
+            frames.append(cls.fetch_clickhouse(codes, missing_start, missing_end))
+        frames = [frame for frame in frames if not frame.empty]
+        if len(frames) <= 1:
+            return frames[0] if frames else cls._empty_frame()
+        return pd.concat(frames, ignore_index=True).sort_values(['code', 'timestamps'], kind='stable',
+                                                                 ignore_index=True)
+
+    @classmethod
+    def append_range(cls, frame: pd.DataFrame, start_date, end_date):
+        """
+        用 frame 替换副本中 [start_date, end_date] 内的全部日线，只重写涉及的月分区，
+        覆盖区间扩展为与原区间的并集，调用方需保证写入的区间与原区间相连。
+        新分区在锁外写入新一代目录，读取只在替换 meta.json 的瞬间被阻塞
+
+        :param frame: 包含 code、timestamps 及日线数值列的长表，需为该区间内全市场的数据
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        """
+        start, end = np.datetime64(str(start_date)[:10], 'D'), np.datetime64(str(end_date)[:10], 'D')
+        root = cls._root()
+        os.makedirs(root, exist_ok=True)
+        with cls._write_lock:
+            meta = dict(cls._load_meta() or {'start': None, 'end': None, 'partitions': {}})
+            partitions = dict(meta['partitions'])
+            frame_days = pd.to_datetime(frame['timestamps']).to_numpy().astype('datetime64[D]')
+            frame_months = frame_days.astype('datetime64[M]')
+            # 与写入区间重叠的早期按年分区整体拆分为按月分区
+            legacy_keys = [key for key in cls._overlapping_keys(partitions, start, end) if len(key) == 4]
+            legacy_frames = [cls._read_partition(key, None, *cls._partition_span(key)) for key in legacy_keys]
+            legacy_frames = [part for part in legacy_frames if part is not None]
+            legacy = pd.concat(legacy_frames, ignore_index=True) if legacy_frames else cls._empty_frame()
+            legacy_months = legacy['timestamps'].to_numpy().astype('datetime64[M]')
+            months = set(np.arange(start.astype('datetime64[M]'), end.astype('datetime64[M]') + 1))
+            months.update(np.unique(legacy_months))
+
+            for month in sorted(months):
+                key = str(month)
+                # 保留分区中写入区间以外的行
+                existing = cls._read_partition(key, None, *cls._partition_span(key)) if key in partitions else None
+                kept = pd.concat([part for part in [existing, legacy[legacy_months == month]] if part is not None],
+                                 ignore_index=True)
+                kept_days = kept['timestamps'].to_numpy().astype('datetime64[D]')
+                kept = kept[(kept_days < start) | (kept_days > end)]
+                incoming = frame[frame_months == month][REPLICA_COLUMNS]
+                combined = pd.concat([kept, incoming], ignore_index=True) if not kept.empty else incoming
+                if combined.empty:
+                    partitions.pop(key, None)
+                    continue
+                generation = partitions.get(key, -1) + 1
+                cls._write_partition(cls._partition_path(key, generation), combined)
+                partitions[key] = generation
+            for key in legacy_keys:
+                partitions.pop(key, None)
+
+            # 被替换的上一代分区保留到下一次写入再删除，读取中的请求可能已读到旧的 meta 但尚未打开分区
+            previous = meta['partitions']
+            meta['retired'] = sorted(f'{key}.{generation}' for key, generation in previous.items()
+                                     if partitions.get(key) != generation)
+            meta['partitions'] = partitions
+            meta['start'] = str(min(start, np.datetime64(meta['start'], 'D')) if meta['start'] else start)
+            meta['end'] = str(max(end, np.datetime64(meta['end'], 'D')) if meta['end'] else end)
+            tmp_path = os.path.join(root, f'{META_FILE}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            with cls._lock:
+                os.replace(tmp_path, os.path.join(root, META_FILE))
+                cls._meta, cls._meta_version = meta, os.stat(os.path.join(root, META_FILE)).st_mtime_ns
+            cls._remove_stale_partitions(partitions, meta['retired'])
+        logger.info(f"日线副本已写入 {start} ~ {end}，行数: {len(frame)}，覆盖范围: {meta['start']} ~ {meta['end']}")
+
+    @staticmethod
+    def _write_partition(path: str, frame: pd.DataFrame):
+        """
+        将一个分区的日线按 code、timestamps 排序后写入分区目录
+        """
+        frame = frame.assign(
+            code=frame['code'].astype(str),
+            timestamps=pd.to_datetime(frame['timestamps']).to_numpy().astype('datetime64[D]'),
+        ).drop_duplicates(['code', 'timestamps'], keep='last').sort_values(['code', 'timestamps'], kind='stable')
+        code_ids, codes = pd.factorize(frame['code'], sort=True)
+        offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(code_ids, minlength=len(codes)), out=offsets[1:])
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        np.save(os.path.join(path, 'codes.npy'), np.asarray(codes, dtype=str))
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+        np.save(os.path.join(path, 'timestamps.npy'), frame['timestamps'].to_numpy(dtype='datetime64[D]'))
+        for column in REPLICA_VALUE_COLUMNS:
+            np.save(os.path.join(path, f'{column}.npy'),
+                    pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64))
+
+    @classmethod
+    def _remove_stale_partitions(cls, partitions: Dict[str, int], retired: List[str]):
+        """
+        删除更早写入中被替换的分区目录，本次写入替换的上一代分区保留到下一次写入，
+        已打开的内存映射在文件删除后仍可读取
+        """
+        root = cls._root()
+        keep = set(retired)
+        for name in os.listdir(root):
+            key, _, generation = name.rpartition('.')
+            if key[:4].isdigit() and generation.isdigit() and int(generation) != partitions.get(key) \
+                    and name not in keep:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    @classmethod
+    def trading_days(cls) -> np.ndarray:
+        """
+        副本中出现过的全部交易日
+
+        :return: 升序排列的交易日数组
+        """
+        meta = cls._load_meta() or {}
+        days = [np.unique(cls._partition(key)['timestamps']) for key in sorted(meta.get('partitions', {}))]
+        return np.unique(np.concatenate(days)) if days else np.array([], dtype='datetime64[D]')
+
+    @classmethod
+    def load_fixture(cls, fixture_path: str) -> bool:
+        """
+        从夹具数据集（CSV，列同 REPLICA_COLUMNS）构建副本，用于离线开发和基准测试
+
+        :param fixture_path: 夹具文件路径
+        :return: 是否构建成功
+        """
+        if not fixture_path or not os.path.exists(fixture_path):
+            logger.warning(f"日线夹具数据集不存在: {fixture_path}")
+            return False
+        frame = pd.read_csv(fixture_path, dtype={'code': str}, parse_dates=['timestamps'])
+        if frame.empty:
+            logger.warning(f"日线夹具数据集为空: {fixture_path}")
+            return False
+        cls.append_range(frame, frame['timestamps'].min(), frame['timestamps'].max())
+        return True
+
+    @classmethod
+    def init_replica(cls):
+        """
+        应用启动时初始化副本，离线模式下副本为空时从夹具数据集构建
+        """
+        if cls.is_offline() and cls.coverage()[0] is None:
+            cls.load_fixture(StockConfig.stock_replica_fixture_path)
+        cover_start, cover_end = cls.coverage()
+        logger.info(f"日线副本模式: {cls.mode()}，覆盖范围: {cover_start} ~ {cover_end}")
@@ -1,46 +1,68 @@
+import logging
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
 
-# 将查询结果转换为 Pandas DataFrame，并返回指定列
-# 修改 convert_result_to_dataframe 方法
-def convert_result_to_dataframe(result, columns_to_return):
-    if not result.result_rows:
-        print("警告：result.result_rows 为空，返回空 DataFrame")
-        return pd.DataFrame(columns=columns_to_return)
+# 日线行情的数值列，统一以 float32 保存
+DAILY_VALUE_COLUMNS = ['open', 'close', 'high', 'low', 'ycp', 'vol']
 
-    # 使用查询返回的实际列名
-    df = pd.DataFrame(result.result_rows, columns=result.column_names)
 
-    # 打印列名以调试
-    print(f"实际列名: {list(df.columns)}")
-    print(f"期望列名: {columns_to_return}")
+def select_dataframe_columns(df: pd.DataFrame, columns_to_return: list) -> pd.DataFrame:
+    """
+    按指定列返回 DataFrame：timestamps 列统一转换为日期类型，缺失的列填充为None
+
+    :param df: 查询结果
+    :param columns_to_return: 需要返回的列
+    :return: 只包含指定列的 DataFrame
+    """
+    if df.empty:
+        return pd.DataFrame(columns=columns_to_return)
 
-    # 检查 timestamps 列是否存在，如果存在则转换
-    if 'timestamps' in df.columns:
+    # 检查 timestamps 列是否存在，如果存在且不是日期类型则转换
+    if 'timestamps' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['timestamps']):
         try:
             df['timestamps'] = pd.to_datetime(df['timestamps'])
         except ValueError as e:
-            print(f"转换 timestamps 列时出错：{e}")
-            pass
+            logger.warning(f"转换 timestamps 列时出错：{e}")
 
     # 检查所有期望的列是否都存在
     missing_columns = [col for col in columns_to_return if col not in df.columns]
     if missing_columns:
-        print(f"警告：以下列不存在于查询结果中: {missing_columns}")
+        logger.warning(f"以下列不存在于查询结果中: {missing_columns}")
+        df = df.copy()
+        for col in missing_columns:
+            df[col] = None
+    return df[columns_to_return]
+
 
-        # 创建一个包含所有期望列的新 DataFrame
-        new_df = pd.DataFrame(columns=columns_to_return)
+def normalize_daily_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    统一日线行情长表的列类型：code 为分类类型，行情数值列为 float32，timestamps 为 datetime64。
+    板块行情的内存主要由股票代码字符串及 float64 / Decimal 数值列占用，在DAO返回前统一压缩一次，
+    之后的计算只读取这些列并在需要时转换为 float64 数组，不再逐列修改
+
+    :param df: 查询得到的日线长表，直接在其上替换列
+    :return: 列类型统一后的 DataFrame
+    """
+    if 'code' in df.columns and not isinstance(df['code'].dtype, pd.CategoricalDtype):
+        df['code'] = df['code'].astype('category')
+    for col in DAILY_VALUE_COLUMNS:
+        if col in df.columns and df[col].dtype != np.float32:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+    if 'timestamps' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['timestamps']):
+        df['timestamps'] = pd.to_datetime(df['timestamps'])
+    return df
 
-        # 将存在的列复制到新 DataFrame
-        for col in columns_to_return:
-            if col in df.columns:
-                new_df[col] = df[col]
-            else:
-                new_df[col] = None  # 或者设置默认值
 
-        return new_df
-    else:
-        return df[columns_to_return]
+# 将查询结果转换为 Pandas DataFrame，并返回指定列
+def convert_result_to_dataframe(result, columns_to_return):
+    if not result.result_rows:
+        return pd.DataFrame(columns=columns_to_return)
+
+    # 使用查询返回的实际列名
+    df = pd.DataFrame(result.result_rows, columns=result.column_names)
+    return select_dataframe_columns(df, columns_to_return)
 # def convert_result_to_dataframe(result, columns_to_return):
 #     df = pd.DataFrame(result.result_rows, columns=result.column_names)
 #     return df[columns_to_return]
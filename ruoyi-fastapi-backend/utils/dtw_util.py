@@ -0,0 +1,210 @@
+import numpy as np
+from typing import Optional, Union
+
+
+def _as_batch(series: np.ndarray) -> np.ndarray:
+    """
+    将序列统一整理为 (批量, 长度, 维度) 的三维数组
+    """
+    arr = np.asarray(series, dtype=float)
+    if arr.ndim == 1:
+        arr = arr[None, :, None]
+    elif arr.ndim == 2:
+        arr = arr[None, :, :]
+    return arr
+
+
+def dtw_distance_batch(
+    x: np.ndarray,
+    y: np.ndarray,
+    lengths: Optional[np.ndarray] = None,
+    window: Optional[int] = None,
+    max_cost: Optional[Union[float, np.ndarray]] = None,
+) -> np.ndarray:
+    """
+    批量计算多维序列的DTW距离（只计算距离，不回溯路径）
+
+    按反对角线推进动态规划，每一步对整条反对角线和所有候选序列同时做数组运算，
+    只保留最近的两条反对角线，内存占用为 O(批量 × 长度)。
+    每个时间点的代价为各维度绝对差的平均值，单维时与 |x - y| 一致。
+
+    任意规整路径都会经过相邻两条反对角线中的至少一条，因此当某对序列在相邻两条
+    反对角线上的最小累计代价都超过 max_cost 时，其最终距离必然超过 max_cost，
+    此时提前放弃该对序列的计算（早停），返回 inf。
+
+    :param x: 基准序列，形状为 (长度, 维度) 或 (批量, 长度, 维度)
+    :param y: 候选序列，形状为 (批量, 长度, 维度)
+    :param lengths: 每对序列的有效长度（两条序列等长，超出部分视为填充），为空时使用各自的完整长度
+    :param window: Sakoe-Chiba 窗口宽度，|i - j| 超过该值的单元不参与计算，为空时不限制
+    :param max_cost: 早停阈值，可为标量或每对序列各自的阈值，为空时不早停
+    :return: 每对序列的DTW距离，早停的序列为 inf
+    """
+    x, y = _as_batch(x), _as_batch(y)
+    batch = max(x.shape[0], y.shape[0])
+    x = np.broadcast_to(x, (batch,) + x.shape[1:])
+    y = np.broadcast_to(y, (batch,) + y.shape[1:])
+    n, m = x.shape[1], y.shape[1]
+    if lengths is None:
+        # 终点为 (n, m)
+        end_rows = np.full(batch, n)
+        end_diagonals = np.full(batch, n + m)
+    else:
+        # 终点为 (length, length)
+        end_rows = np.asarray(lengths, dtype=int)
+        end_diagonals = 2 * end_rows
+    result = np.full(batch, np.inf)
+    result[end_diagonals == 0] = 0.0
+    if n == 0 or m == 0 or not (end_diagonals > 0).any():
+        return result
+    band = max(n, m) if window is None else max(int(window), abs(n - m) if lengths is None else 0)
+    limit = None if max_cost is None else np.broadcast_to(np.asarray(max_cost, dtype=float), (batch,))
+
+    # active 为仍在计算的序列下标，prev2/prev1/cur 分别对应 k-2/k-1/k 条反对角线，按行号 i (0..n) 索引
+    active = np.flatnonzero(end_diagonals > 0)
+    xa, ya = x[active], y[active]
+    prev2 = np.full((len(active), n + 1), np.inf)
+    prev1 = np.full((len(active), n + 1), np.inf)
+    prev2[:, 0] = 0.0
+    for k in range(2, int(end_diagonals.max()) + 1):
+        cur = np.full((len(active), n + 1), np.inf)
+        lo = max(1, k - m, (k - band + 1) // 2)
+        hi = min(n, k - 1, (k + band) // 2)
+        if lo <= hi:
+            i = np.arange(lo, hi + 1)
+            j = k - i
+            cost = np.abs(xa[:, i - 1, :] - ya[:, j - 1, :]).mean(axis=2)
+            best = np.minimum(np.minimum(prev2[:, i - 1], prev1[:, i - 1]), prev1[:, i])
+            cur[:, i] = cost + best
+
+        done = end_diagonals[active] == k
+        if done.any():
+            result[active[done]] = cur[done, end_rows[active[done]]]
+        keep = ~done
+        if limit is not None:
+            # 超出有效长度的填充单元可能为 nan，取最小值时忽略
+            keep &= np.fmin(np.fmin.reduce(cur, axis=1), np.fmin.reduce(prev1, axis=1)) <= limit[active]
+        if not keep.all():
+            active, xa, ya, prev1, cur = active[keep], xa[keep], ya[keep], prev1[keep], cur[keep]
+            if len(active) == 0:
+                break
+        prev2, prev1 = prev1, cur
+    return result
+
+
+def dtw_distance(x: np.ndarray, y: np.ndarray, window: Optional[int] = None) -> float:
+    """
+    计算一对序列的DTW距离
+
+    :param x: 第一条序列，形状为 (长度,) 或 (长度, 维度)
+    :param y: 第二条序列，形状与 x 相同
+    :param window: Sakoe-Chiba 窗口宽度，为空时不限制
+    :return: DTW距离
+    """
+    return float(dtw_distance_batch(x, y, window=window)[0])
+
+
+def lb_kim(x: np.ndarray, y: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    LB_Kim 下界：任意规整路径都必须包含首尾两个点对
+
+    :param x: 基准序列，形状为 (批量, 长度, 维度)
+    :param y: 候选序列，形状为 (批量, 长度, 维度)
+    :param lengths: 每对序列的有效长度
+    :return: 每对序列DTW距离的下界
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    rows = np.arange(len(lengths))
+    last = np.maximum(lengths - 1, 0)
+    first_cost = np.abs(x[:, 0, :] - y[:, 0, :]).mean(axis=1)
+    last_cost = np.abs(x[rows, last, :] - y[rows, last, :]).mean(axis=1)
+    bound = np.where(lengths >= 2, first_cost + last_cost, first_cost)
+    return np.where(lengths > 0, bound, 0.0)
+
+
+def lb_keogh(x: np.ndarray, y: np.ndarray, lengths: np.ndarray, window: Optional[int] = None) -> np.ndarray:
+    """
+    LB_Keogh 下界：候选序列的每个点至少与窗口内的一个基准点匹配，
+    其代价不小于该点到基准序列窗口上下包络的距离
+
+    :param x: 基准序列，形状为 (批量, 长度, 维度)
+    :param y: 候选序列，形状为 (批量, 长度, 维度)
+    :param lengths: 每对序列的有效长度
+    :param window: Sakoe-Chiba 窗口宽度，为空时包络为整条序列的最大最小值
+    :return: 每对序列DTW距离的下界
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    steps = x.shape[1]
+    valid = np.arange(steps)[None, :] < lengths[:, None]
+    high = np.where(valid[:, :, None], x, -np.inf)
+    low = np.where(valid[:, :, None], x, np.inf)
+    if window is None or window >= steps:
+        upper = np.broadcast_to(high.max(axis=1, keepdims=True), x.shape)
+        lower = np.broadcast_to(low.min(axis=1, keepdims=True), x.shape)
+    else:
+        upper, lower = high.copy(), low.copy()
+        for offset in range(1, int(window) + 1):
+            upper[:, offset:] = np.maximum(upper[:, offset:], high[:, :-offset])
+            upper[:, :-offset] = np.maximum(upper[:, :-offset], high[:, offset:])
+            lower[:, offset:] = np.minimum(lower[:, offset:], low[:, :-offset])
+            lower[:, :-offset] = np.minimum(lower[:, :-offset], low[:, offset:])
+    with np.errstate(invalid='ignore'):
+        outside = np.maximum(y - upper, 0) + np.maximum(lower - y, 0)
+    return np.where(valid, outside.mean(axis=2), 0.0).sum(axis=1)
+
+
+def dtw_top_k(
+    x: np.ndarray,
+    y: np.ndarray,
+    lengths: np.ndarray,
+    k: int,
+    window: Optional[int] = None,
+    chunk_size: int = 32,
+) -> tuple:
+    """
+    DTW 前K近邻搜索
+
+    先为所有候选序列计算 LB_Kim 和双向 LB_Keogh 下界，再按下界从小到大分批计算完整DTW，
+    批量从 chunk_size 起逐批翻倍以减少反对角线循环次数。
+    维护当前第K小的距离作为阈值：下界超过阈值的候选序列直接剪枝，
+    正在计算的候选序列在部分累计代价超过阈值时提前放弃。
+
+    :param x: 基准序列，形状为 (批量, 长度, 维度)
+    :param y: 候选序列，形状为 (批量, 长度, 维度)
+    :param lengths: 每对序列的有效长度
+    :param k: 需要的近邻数量
+    :param window: Sakoe-Chiba 窗口宽度，为空时不限制
+    :param chunk_size: 第一批计算完整DTW的候选数量（不少于 k）
+    :return: (距离数组, 剪枝数量, 早停数量)，被剪枝的候选距离为 nan，早停的为 inf
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    batch = x.shape[0]
+    distances = np.full(batch, np.nan)
+    if batch == 0 or k <= 0:
+        return distances, batch, 0
+    bounds = np.maximum.reduce([
+        lb_kim(x, y, lengths),
+        lb_keogh(x, y, lengths, window),
+        lb_keogh(y, x, lengths, window),
+    ])
+    order = np.argsort(bounds, kind='stable')
+
+    best = np.empty(0)
+    pruned = abandoned = 0
+    start, size = 0, max(chunk_size, k)
+    while start < batch:
+        threshold = best[k - 1] if len(best) >= k else np.inf
+        chunk = order[start:start + size]
+        candidates = chunk[bounds[chunk] <= threshold]
+        pruned += len(chunk) - len(candidates)
+        if len(candidates) == 0:
+            # 候选按下界升序排列，之后的候选同样无法进入前K
+            pruned += batch - start - len(chunk)
+            break
+        result = dtw_distance_batch(
+            x[candidates], y[candidates], lengths=lengths[candidates], window=window, max_cost=threshold
+        )
+        distances[candidates] = result
+        abandoned += int(np.isinf(result).sum())
+        best = np.sort(np.concatenate([best, result[np.isfinite(result)]]))[:k]
+        start, size = start + len(chunk), size * 2
+    return distances, pruned, abandoned
@@ -0,0 +1,334 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.similarity_util import PANEL_PRICE_COLUMNS, SectionPanel
+import logging
+logger = logging.getLogger(__name__)
+
+# 由原始行情派生的逐日特征，计算方式与 similarity_util 中的批量相似度保持一致
+DERIVED_FEATURE_COLUMNS = ['close_change', 'high_change', 'low_change', 'upper', 'body', 'lower', 'position']
+# 特征库中保存的全部列
+FEATURE_COLUMNS = PANEL_PRICE_COLUMNS + DERIVED_FEATURE_COLUMNS
+META_FILE = 'meta.json'
+# 新建或扩容时预留的交易日、股票数量
+INITIAL_DAY_CAPACITY = 256
+INITIAL_CODE_CAPACITY = 1024
+
+
+def derive_features(raw: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    由原始行情计算逐日特征
+
+    :param raw: open、close、high、low、ycp 列对应的数组
+    :return: 特征名到数组的映射
+    """
+    o, c, h, lo, ycp = raw['open'], raw['close'], raw['high'], raw['low'], raw['ycp']
+    unit = ycp * 0.1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'close_change': (c - ycp) / ycp,
+            'high_change': (h - ycp) / ycp,
+            'low_change': (lo - ycp) / ycp,
+            'upper': np.where(o > c, (h - o) / unit, (h - c) / unit),
+            'body': np.abs(o - c) / unit,
+            'lower': np.where(o > c, (c - lo) / unit, (o - lo) / unit),
+            'position': (c - ycp) / unit,
+        }
+
+
+class DailyFeatureStore:
+    """
+    逐日特征库
+
+    以 交易日 × 股票 的布局为每个特征保存一个内存映射的 .npy 文件，
+    meta.json 记录已写入的交易日轴和 股票代码 → 列偏移 的索引。
+    追加新交易日只写入文件末尾的若干行，读取某个时间窗口时交易日轴上的切片为零拷贝视图，
+    多个计算进程打开同一组文件时共享操作系统的页缓存。
+    """
+
+    _cache: Dict[str, 'DailyFeatureStore'] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, path: str, meta: Dict, arrays: Dict[str, np.ndarray], version: int):
+        self.path = path
+        self.meta = meta
+        self.arrays = arrays
+        self.version = version
+        self.codes: List[str] = meta['codes']
+        self.dates = np.array(meta['dates'], dtype='datetime64[D]')
+        self.code_index = {code: offset for offset, code in enumerate(self.codes)}
+
+    @staticmethod
+    def _meta_path(path: str) -> str:
+        return os.path.join(path, META_FILE)
+
+    @staticmethod
+    def _column_path(path: str, column: str, generation: int) -> str:
+        return os.path.join(path, f'{column}.{generation}.npy')
+
+    @classmethod
+    def open(cls, path: str) -> Optional['DailyFeatureStore']:
+        """
+        以只读方式打开特征库，meta.json 未变化时复用已打开的实例
+
+        :param path: 特征库目录
+        :return: 特征库实例，不存在时为None
+        """
+        meta_path = cls._meta_path(path)
+        try:
+            version = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with cls._cache_lock:
+            store = cls._cache.get(path)
+            if store is not None and store.version == version:
+                return store
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = {
+                column: np.load(cls._column_path(path, column, meta['generation']), mmap_mode='r')
+                for column in meta['columns']
+            }
+            store = cls(path, meta, arrays, version)
+            cls._cache[path] = store
+            return store
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self) -> Optional[np.datetime64]:
+        return self.dates[-1] if len(self.dates) else None
+
+    def covers(self, start_date, end_date) -> bool:
+        """
+        特征库的交易日轴是否覆盖 [start_date, end_date]
+
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 是否覆盖
+        """
+        if not len(self.dates):
+            return False
+        return self.dates[0] <= np.datetime64(start_date, 'D') and np.datetime64(end_date, 'D') <= self.dates[-1]
+
+    def _window(self, start_date, end_date) -> slice:
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, 'D'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, 'D'), side='right')
+        return slice(int(lo), int(hi))
+
+    def window_dates(self, start_date, end_date) -> np.ndarray:
+        """
+        特征库在 [start_date, end_date] 内的交易日
+
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 与 window_view 的行一一对应的交易日
+        """
+        return self.dates[self._window(start_date, end_date)]
+
+    def window_view(self, column: str, start_date, end_date) -> np.ndarray:
+        """
+        某个特征在 [start_date, end_date] 内全部股票的零拷贝视图
+
+        :param column: 特征名
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 形状为 交易日 × 股票 的只读视图
+        """
+        return self.arrays[column][self._window(start_date, end_date), :len(self.codes)]
+
+    def stock_frame(self, code: str, start_date, end_date) -> pd.DataFrame:
+        """
+        读取单只股票在时间窗口内的原始行情，结构与 SimilarDao.get_stock_data 一致
+
+        :param code: 股票代码
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 以交易日为索引的行情，股票不存在时为空
+        """
+        window = self._window(start_date, end_date)
+        offset = self.code_index.get(code)
+        if offset is None:
+            return pd.DataFrame(columns=['code'] + PANEL_PRICE_COLUMNS)
+        close = self.arrays['close'][window, offset]
+        valid = ~np.isnan(close)
+        frame = pd.DataFrame(
+            {column: np.asarray(self.arrays[column][window, offset])[valid] for column in PANEL_PRICE_COLUMNS},
+            index=pd.DatetimeIndex(self.dates[window][valid].astype('datetime64[ns]'), name='date'),
+        )
+        frame.insert(0, 'code', code)
+        return frame
+
+    def base_values(self, code: str, dates: pd.DatetimeIndex) -> Dict[str, np.ndarray]:
+        """
+        将基准股票的原始行情及派生特征按面板交易日展开为一维数组
+
+        :param code: 股票代码
+        :param dates: 面板交易日
+        :return: 列名到一维数组的映射
+        """
+        rows = np.searchsorted(self.dates, dates.values.astype('datetime64[D]'))
+        offset = self.code_index[code]
+        return {column: np.asarray(self.arrays[column][rows, offset], dtype=float) for column in FEATURE_COLUMNS}
+
+    def section_panel(self, codes: List[str], dates: pd.DatetimeIndex,
+                      exclude_code: Optional[str] = None, columns: Optional[List[str]] = None) -> SectionPanel:
+        """
+        按基准股票的交易日构建板块面板，包含原始行情及派生特征
+
+        :param codes: 板块内的股票代码，不在特征库中的股票被忽略
+        :param dates: 对齐使用的交易日（均需在特征库的交易日轴上）
+        :param exclude_code: 需要排除的股票代码
+        :param columns: 需要读取的列，为空时读取全部列，有效性掩码始终由 close 列得到
+        :return: 板块行情面板
+        """
+        columns = list(dict.fromkeys(['close'] + list(columns))) if columns else FEATURE_COLUMNS
+        members = [code for code in dict.fromkeys(codes) if code != exclude_code and code in self.code_index]
+        offsets = np.array([self.code_index[code] for code in members], dtype=np.int64)
+        rows = np.searchsorted(self.dates, dates.values.astype('datetime64[D]'))
+        window = slice(int(rows[0]), int(rows[-1]) + 1) if len(rows) else slice(0, 0)
+        rows = rows - window.start
+        values = {}
+        for column in columns:
+            # 先在交易日轴上取零拷贝的窗口视图，再只取需要的交易日和股票
+            view = self.arrays[column][window]
+            values[column] = np.asarray(view[np.ix_(rows, offsets)].T, dtype=float)
+        mask = ~np.isnan(values['close'])
+        # 只保留在窗口内有行情的股票，与由长表构建的面板一致
+        keep = mask.any(axis=1)
+        return SectionPanel(
+            np.asarray(members, dtype=object)[keep],
+            dates,
+            {column: arr[keep] for column, arr in values.items()},
+            mask[keep],
+        )
+
+    @classmethod
+    def append_frame(cls, path: str, frame: pd.DataFrame) -> int:
+        """
+        将长表行情写入特征库，只允许写入不早于最后一个交易日的数据，
+        最后一个交易日会被整体重写以覆盖当日数据分批入库的情况
+
+        :param path: 特征库目录
+        :param frame: 包含 code、timestamps 及原始行情列的长表
+        :return: 新增的交易日数量
+        """
+        os.makedirs(path, exist_ok=True)
+        meta_path = cls._meta_path(path)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        else:
+            meta = {
+                'generation': 0,
+                'columns': FEATURE_COLUMNS,
+                'codes': [],
+                'dates': [],
+                'day_capacity': 0,
+                'code_capacity': 0,
+            }
+        dates = np.array(meta['dates'], dtype='datetime64[D]')
+        frame_dates = pd.to_datetime(frame['timestamps']).to_numpy().astype('datetime64[D]')
+        if len(dates):
+            keep = frame_dates >= dates[-1]
+            frame, frame_dates = frame[keep], frame_dates[keep]
+        if frame.empty:
+            return 0
+
+        new_dates = np.unique(frame_dates)
+        start_row = len(dates) - 1 if len(dates) and new_dates[0] == dates[-1] else len(dates)
+        all_dates = np.concatenate([dates[:start_row], new_dates])
+        codes = list(meta['codes'])
+        code_index = {code: offset for offset, code in enumerate(codes)}
+        for code in pd.unique(frame['code']):
+            if code not in code_index:
+                code_index[code] = len(codes)
+                codes.append(code)
+
+        arrays = cls._ensure_capacity(path, meta, len(all_dates), len(codes))
+        block_rows = np.searchsorted(new_dates, frame_dates)
+        block_cols = np.array([code_index[code] for code in frame['code']], dtype=np.int64)
+        raw = {}
+        for column in PANEL_PRICE_COLUMNS:
+            block = np.full((len(new_dates), len(codes)), np.nan)
+            block[block_rows, block_cols] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=float)
+            raw[column] = block
+        blocks = {**raw, **derive_features(raw)}
+        for column in FEATURE_COLUMNS:
+            arrays[column][start_row:len(all_dates), :len(codes)] = blocks[column]
+            arrays[column].flush()
+
+        meta['codes'] = codes
+        meta['dates'] = [str(day) for day in all_dates]
+        cls._write_meta(path, meta)
+        return len(all_dates) - len(dates)
+
+    @classmethod
+    def _ensure_capacity(cls, path: str, meta: Dict, day_count: int, code_count: int) -> Dict[str, np.memmap]:
+        """
+        打开可写的特征文件，容量不足时按倍数扩容到新一代文件并复制已有数据
+        """
+        generation = meta['generation']
+        if day_count <= meta['day_capacity'] and code_count <= meta['code_capacity']:
+            return {
+                column: np.load(cls._column_path(path, column, generation), mmap_mode='r+')
+                for column in FEATURE_COLUMNS
+            }
+
+        day_capacity = max(meta['day_capacity'], INITIAL_DAY_CAPACITY)
+        while day_capacity < day_count:
+            day_capacity *= 2
+        code_capacity = max(meta['code_capacity'], INITIAL_CODE_CAPACITY)
+        while code_capacity < code_count:
+            code_capacity *= 2
+        used_days, used_codes = len(meta['dates']), len(meta['codes'])
+        arrays = {}
+        for column in FEATURE_COLUMNS:
+            array = np.lib.format.open_memmap(
+                cls._column_path(path, column, generation + 1), mode='w+', dtype=np.float64,
+                shape=(day_capacity, code_capacity)
+            )
+            array[:] = np.nan
+            if used_days:
+                old = np.load(cls._column_path(path, column, generation), mmap_mode='r')
+                array[:used_days, :used_codes] = old[:used_days, :used_codes]
+                del old
+            arrays[column] = array
+        logger.info(f"特征库扩容: 交易日容量 {day_capacity}，股票容量 {code_capacity}")
+        meta.update(generation=generation + 1, day_capacity=day_capacity, code_capacity=code_capacity)
+        return arrays
+
+    @classmethod
+    def _write_meta(cls, path: str, meta: Dict):
+        """
+        原子替换 meta.json，并清理上一代的特征文件
+        """
+        meta_path = cls._meta_path(path)
+        tmp_path = f'{meta_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+        for name in os.listdir(path):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[2] == 'npy' and parts[1].isdigit() and int(parts[1]) < meta['generation']:
+                try:
+                    os.remove(os.path.join(path, name))
+                except OSError:
+                    # 仍被其他进程映射的旧文件在下次写入时再清理
+                    pass
+
+    def date_range(self) -> Tuple[Optional[str], Optional[str]]:
+        """
+        特征库覆盖的交易日范围
+
+        :return: (第一个交易日, 最后一个交易日)
+        """
+        if not len(self.dates):
+            return None, None
+        return str(self.dates[0]), str(self.dates[-1])
@@ -0,0 +1,89 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+def _znorm(query: np.ndarray) -> Optional[np.ndarray]:
+    std = query.std()
+    if not np.isfinite(std) or std == 0:
+        return None
+    return (query - query.mean()) / std
+
+
+def sliding_mean_std(series: np.ndarray, m: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按行计算长度为 m 的滑动窗口均值和标准差
+
+    :param series: 形状为 序列数 × 长度 的矩阵，不含空值
+    :param m: 窗口长度
+    :return: (均值, 标准差)，形状均为 序列数 × (长度 - m + 1)
+    """
+    # 先减去每行均值再累加，减小大数相减带来的精度损失
+    row_mean = series.mean(axis=1, keepdims=True)
+    centered = series - row_mean
+    zeros = np.zeros((series.shape[0], 1))
+    c1 = np.concatenate([zeros, np.cumsum(centered, axis=1)], axis=1)
+    c2 = np.concatenate([zeros, np.cumsum(centered * centered, axis=1)], axis=1)
+    mean = (c1[:, m:] - c1[:, :-m]) / m
+    var = np.maximum((c2[:, m:] - c2[:, :-m]) / m - mean * mean, 0.0)
+    return mean + row_mean, np.sqrt(var)
+
+
+def mass_distance_profiles(query: np.ndarray, series: np.ndarray, valid: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    MASS：用 FFT 一次性计算查询序列与多条序列所有位置子序列之间的 z 标准化欧氏距离
+
+    :param query: 长度为 m 的查询序列
+    :param series: 形状为 序列数 × 长度 的矩阵，空值所在的子序列距离为 inf
+    :param valid: 有效性掩码，为空时由 series 中的空值推断
+    :return: 形状为 序列数 × (长度 - m + 1) 的距离剖面
+    """
+    m = len(query)
+    count, length = series.shape
+    if m < 2 or length < m:
+        return np.full((count, max(length - m + 1, 0)), np.inf)
+    zq = _znorm(np.asarray(query, dtype=float))
+    if zq is None:
+        return np.full((count, length - m + 1), np.inf)
+    if valid is None:
+        valid = ~np.isnan(series)
+    filled = np.where(valid, series, 0.0)
+
+    # 滑动点积：序列与反转查询的卷积
+    size = 1 << int(np.ceil(np.log2(length + m - 1)))
+    products = np.fft.irfft(np.fft.rfft(filled, size, axis=1) * np.fft.rfft(zq[::-1], size)[None, :],
+                            size, axis=1)[:, m - 1:length]
+    _, std = sliding_mean_std(filled, m)
+    # z 标准化查询的各分量之和为0，点积与子序列均值无关
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distances = np.sqrt(np.maximum(2 * m * (1 - products / (m * std)), 0.0))
+
+    # 包含空值或为常数的子序列不参与匹配
+    missing = np.concatenate([np.zeros((count, 1)), np.cumsum(~valid, axis=1)], axis=1)
+    incomplete = (missing[:, m:] - missing[:, :-m]) > 0
+    distances[incomplete | (std <= 1e-12) | ~np.isfinite(distances)] = np.inf
+    return distances
+
+
+def top_matches(profiles: np.ndarray, k: int, exclusion: int) -> List[Tuple[int, int, float]]:
+    """
+    从多条距离剖面中选出距离最小的 k 个子序列，同一序列中相互重叠（起点相距不超过 exclusion）的匹配只保留最优者
+
+    :param profiles: 距离剖面
+    :param k: 返回数量
+    :param exclusion: 排除区半径
+    :return: (序列序号, 起始位置, 距离) 列表，按距离升序排列
+    """
+    profiles = np.array(profiles, dtype=float)
+    if not profiles.size:
+        return []
+    width = profiles.shape[1]
+    matches = []
+    while len(matches) < k:
+        flat = int(np.argmin(profiles))
+        row, start = divmod(flat, width)
+        distance = profiles[row, start]
+        if not np.isfinite(distance):
+            break
+        matches.append((row, start, float(distance)))
+        profiles[row, max(0, start - exclusion):start + exclusion + 1] = np.inf
+    return matches
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+from utils.similarity_util import INDICATOR_FEATURES, SectionPanel
+
+
+def graph_feature_names(indicators: List[str]) -> List[str]:
+    """
+    图节点使用的特征名称，顺序固定为 close、high、low、turnover
+
+    :param indicators: 指标列表
+    :return: 特征名称列表
+    """
+    return [feature for indicator, feature in INDICATOR_FEATURES.items() if indicator in indicators]
+
+
+def node_features(values: Dict[str, np.ndarray], mask: np.ndarray, feature_names: List[str]) -> np.ndarray:
+    """
+    计算价格图的节点特征：相对昨收的收盘价、最高价、最低价涨幅（昨收为0时为0）及相对换手率（成交量 / 窗口内最大成交量）
+
+    :param values: 列名到数组的映射，最后一维为交易日
+    :param mask: 有效性掩码，形状与数组一致
+    :param feature_names: 特征名称列表
+    :return: 最后一维为特征的数组
+    """
+    ycp = values['ycp']
+    columns = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for feature in feature_names:
+            if feature == 'relative_turnover':
+                vol = np.where(mask, values['vol'], np.nan)
+                max_vol = np.max(np.where(np.isnan(vol), -np.inf, vol), axis=-1, keepdims=True)
+                # 窗口内成交量全部为空时与 pandas 的 max 一致得到空值
+                max_vol = np.where(np.isinf(max_vol), np.nan, max_vol)
+                columns.append(np.where(max_vol != 0, vol / max_vol, 0.0))
+            else:
+                price = values[feature.split('_')[0]]
+                columns.append(np.where(ycp != 0, (price - ycp) / ycp, 0.0))
+    return np.stack(columns, axis=-1) if columns else np.zeros(mask.shape + (0,))
+
+
+def next_positions(mask: np.ndarray) -> np.ndarray:
+    """
+    每个位置之后下一个有效交易日的位置，不存在时为交易日数
+
+    :param mask: 有效性掩码，最后一维为交易日
+    :return: 与掩码形状一致的位置数组
+    """
+    length = mask.shape[-1]
+    positions = np.where(mask, np.arange(length), length)
+    following = np.minimum.accumulate(positions[..., ::-1], axis=-1)[..., ::-1]
+    return np.concatenate([following[..., 1:], np.full(mask.shape[:-1] + (1,), length)], axis=-1)
+
+
+def edge_weights(features: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算链式图的边：每个有效交易日与下一个有效交易日相连，边权重为两端节点各特征差的绝对值的平均值
+
+    :param features: 节点特征，形状为 (..., 交易日, 特征)
+    :param mask: 有效性掩码，形状为 (..., 交易日)
+    :return: (边终点位置, 边权重)，均以边的起点位置索引，起点无边时终点位置为交易日数
+    """
+    length = mask.shape[-1]
+    following = next_positions(mask)
+    has_edge = mask & (following < length)
+    if not features.shape[-1]:
+        return np.where(has_edge, following, length), np.zeros(mask.shape)
+    target = np.take_along_axis(features, np.minimum(following, length - 1)[..., None], axis=-2)
+    weights = np.abs(target - features).mean(axis=-1)
+    return np.where(has_edge, following, length), np.where(has_edge, weights, 0.0)
+
+
+class PriceChainGraph:
+    """
+    数组形式的日线价格图
+
+    每个交易日为一个节点，相邻交易日之间有一条边，用节点特征矩阵、边权重向量及交易日索引表示，
+    与 networkx 构建的价格图等价，可对整个板块的候选股票一次性计算图编辑相似度
+    """
+
+    def __init__(self, dates: np.ndarray, features: np.ndarray, weights: np.ndarray, feature_names: List[str]):
+        self.dates = dates
+        self.features = features
+        self.weights = weights
+        self.feature_names = feature_names
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, indicators: List[str]) -> 'PriceChainGraph':
+        """
+        由单只股票的行情构建价格图
+
+        :param df: 以交易日为索引的行情数据
+        :param indicators: 用于构建图的指标列表
+        :return: 价格图
+        """
+        feature_names = graph_feature_names(indicators)
+        values = {col: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+                  for col in ['close', 'high', 'low', 'ycp', 'vol']}
+        mask = np.ones(len(df), dtype=bool)
+        features = node_features(values, mask, feature_names)
+        _, weights = edge_weights(features, mask)
+        return cls(pd.to_datetime(df.index).to_numpy(dtype='datetime64[ns]'), features, weights[:-1], feature_names)
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def graph_edit_similarity_batch(base: PriceChainGraph, panel: SectionPanel) -> np.ndarray:
+    """
+    批量计算基准股票价格图与板块内每只候选股票价格图的图编辑相似度
+
+    对每个特征，按共同交易日节点特征差的平均绝对值换算相似度（涨幅特征为 1 / (1 + 差值)，相对换手率为 1 - 差值）；
+    对两图共有的边（起止交易日均相同），按边权重差的平均绝对值换算为 1 / (1 + 差值)；
+    最终相似度为以上各项的平均值，截断到 [0, 1]，没有共同交易日时为0
+
+    :param base: 基准股票价格图
+    :param panel: 候选股票面板，交易日需包含基准股票的全部交易日
+    :return: 每只候选股票的相似度
+    """
+    count, length = panel.mask.shape
+    if not count:
+        return np.zeros(0)
+    base_positions = panel.dates.get_indexer(pd.DatetimeIndex(base.dates))
+    base_mask = np.zeros(length, dtype=bool)
+    base_mask[base_positions] = True
+    base_features = np.zeros((length, len(base.feature_names)))
+    base_features[base_positions] = base.features
+
+    features = node_features(panel.values, panel.mask, base.feature_names)
+    common = panel.mask & base_mask
+    common_count = common.sum(axis=1)
+    scores = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, feature in enumerate(base.feature_names):
+            diff = np.where(common, np.abs(features[..., i] - base_features[:, i]), 0.0).sum(axis=1) / common_count
+            similarity = 1.0 - diff if feature == 'relative_turnover' else 1.0 / (1.0 + diff)
+            scores.append(np.clip(similarity, 0.0, 1.0))
+
+        # 共有的边：起点在两图中都有效，且下一个有效交易日相同
+        base_following = np.full(length, length)
+        base_following[base_positions[:-1]] = base_positions[1:]
+        base_weights = np.zeros(length)
+        base_weights[base_positions[:-1]] = base.weights
+        following, weights = edge_weights(features, panel.mask)
+        shared = common & (following == base_following) & (following < length)
+        shared_count = shared.sum(axis=1)
+        edge_diff = np.where(shared, np.abs(weights - base_weights), 0.0).sum(axis=1) / shared_count
+        edge_similarity = np.clip(1.0 / (1.0 + edge_diff), 0.0, 1.0)
+
+    total = np.sum(scores, axis=0) if scores else np.zeros(count)
+    total = total + np.where(shared_count > 0, edge_similarity, 0.0)
+    terms = len(scores) + (shared_count > 0)
+    final = np.where(terms > 0, total / np.maximum(terms, 1), 0.0)
+    return np.where(common_count > 0, np.clip(final, 0.0, 1.0), 0.0)
+
+
+def longest_common_subpath(base_weights: np.ndarray, weights: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    链式图的最长公共对齐子路径：两条路径中连续若干条边逐一对应、且对应边权重之差不超过容差时构成公共子路径。
+    按基准路径的边逐行动态规划（以某对边结尾的公共子路径长度 = 前一对边结尾的长度 + 1），
+    只保留上一行，内存与候选路径的总长度成正比
+
+    :param base_weights: 基准路径的边权重
+    :param weights: 形状为 候选路径数 × 最大边数 的边权重矩阵，空值表示不存在的边
+    :param tolerance: 边权重容差
+    :return: 每条候选路径与基准路径的最长公共子路径的边数
+    """
+    count, width = weights.shape
+    best = np.zeros(count, dtype=np.int64)
+    if not width:
+        return best
+    run = np.zeros((count, width + 1), dtype=np.int64)
+    with np.errstate(invalid='ignore'):
+        for weight in base_weights:
+            run[:, 1:] = np.where(np.abs(weights - weight) <= tolerance, run[:, :-1] + 1, 0)
+            np.maximum(best, run[:, 1:].max(axis=1), out=best)
+    return best
+
+
+def max_common_subgraph_similarity(base: PriceChainGraph, values: Dict[str, np.ndarray], mask: np.ndarray,
+                                   tolerance: float) -> np.ndarray:
+    """
+    批量计算基准股票价格图与每只候选股票价格图的最大公共子图相似度
+
+    价格图是按交易日相连的路径，最大公共连通子图即最长公共对齐子路径，节点数为其边数加1
+    （没有可对应的边时为单个节点），相似度为 Tanimoto 系数 公共节点数 / (节点数1 + 节点数2 - 公共节点数)
+
+    :param base: 基准股票价格图
+    :param values: 列名到 候选股票 × 位置 数组的映射，每只候选股票的行情按交易日顺序从位置0开始排列
+    :param mask: 有效性掩码，每行为连续的前缀
+    :param tolerance: 边权重容差
+    :return: 每只候选股票的相似度
+    """
+    count = mask.shape[0]
+    sizes = mask.sum(axis=1)
+    if not count or not len(base):
+        return np.zeros(count)
+    features = node_features(values, mask, base.feature_names)
+    following, weights = edge_weights(features, mask)
+    weights = np.where(following < mask.shape[1], weights, np.nan)
+    common = longest_common_subpath(base.weights, weights[:, :-1], tolerance) + 1
+    common = np.where(sizes > 0, common, 0)
+    return np.where(sizes > 0, common / (len(base) + sizes - common), 0.0)
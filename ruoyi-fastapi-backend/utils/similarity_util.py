@@ -0,0 +1,393 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from utils.coint_util import batch_coint
+from utils.dtw_util import dtw_distance_batch, dtw_top_k
+
+
+# 行情面板中保存的价格列
+PANEL_PRICE_COLUMNS = ['open', 'close', 'high', 'low', 'ycp', 'vol']
+# 指标与特征名称的对应关系
+INDICATOR_FEATURES = {
+    'close': 'close_change',
+    'high': 'high_change',
+    'low': 'low_change',
+    'turnover': 'relative_turnover',
+}
+
+
+class SectionPanel:
+    """
+    板块行情面板
+
+    将长表形式的板块行情（code, timestamps, open, close, ...）按基准股票的交易日对齐，
+    整理为 股票 × 交易日 的二维数组，并用有效性掩码标记每只股票在每个交易日是否有数据，
+    以便对所有候选股票一次性进行向量化计算
+    """
+
+    def __init__(self, codes: np.ndarray, dates: pd.DatetimeIndex, values: Dict[str, np.ndarray], mask: np.ndarray):
+        self.codes = codes
+        self.dates = dates
+        self.values = values
+        self.mask = mask
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, dates: pd.DatetimeIndex, exclude_code: Optional[str] = None):
+        """
+        由长表行情数据构建面板
+
+        :param frame: 包含code、timestamps及价格列的行情数据
+        :param dates: 对齐使用的交易日（通常为基准股票的交易日）
+        :param exclude_code: 需要排除的股票代码（通常为基准股票自身）
+        :return: 板块行情面板
+        """
+        if exclude_code is not None:
+            frame = frame[frame['code'] != exclude_code]
+        code_idx, codes = pd.factorize(frame['code'], sort=False)
+        date_idx = dates.get_indexer(pd.to_datetime(frame['timestamps']))
+        keep = date_idx >= 0
+        rows, cols = code_idx[keep], date_idx[keep]
+
+        shape = (len(codes), len(dates))
+        mask = np.zeros(shape, dtype=bool)
+        mask[rows, cols] = True
+        values = {}
+        for col in PANEL_PRICE_COLUMNS:
+            if col not in frame.columns:
+                continue
+            arr = np.full(shape, np.nan)
+            arr[rows, cols] = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=float)[keep]
+            values[col] = arr
+
+        return cls(np.asarray(codes, dtype=object), dates, values, mask)
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def base_values(base_df: pd.DataFrame, dates: pd.DatetimeIndex) -> Dict[str, np.ndarray]:
+    """
+    将基准股票的行情按面板交易日展开为一维数组
+
+    :param base_df: 以交易日为索引的基准股票行情
+    :param dates: 面板交易日
+    :return: 列名到一维数组的映射
+    """
+    aligned = base_df.reindex(dates)
+    return {
+        col: pd.to_numeric(aligned[col], errors='coerce').to_numpy(dtype=float)
+        for col in PANEL_PRICE_COLUMNS
+        if col in aligned.columns
+    }
+
+
+def _masked(arr: np.ndarray, mask: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    """
+    将掩码之外的位置填充为指定值
+    """
+    return np.where(mask, arr, fill)
+
+
+def _masked_max(arr: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    按行计算掩码范围内的最大值
+    """
+    return np.where(mask, arr, -np.inf).max(axis=1)
+
+
+def indicator_matrices(base: Dict[str, np.ndarray], panel: SectionPanel, indicator: str):
+    """
+    计算某个指标在基准股票与所有候选股票上的特征矩阵
+
+    与逐对计算一致，相对换手率按照每对股票的共同交易日内的最大成交量归一化；
+    行情中已包含特征库预先计算的涨跌幅特征时直接使用
+
+    :param base: 基准股票一维数组
+    :param panel: 板块行情面板
+    :param indicator: 指标名称（close/high/low/turnover）
+    :return: (基准特征矩阵, 候选特征矩阵)，形状均为 股票 × 交易日
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if indicator in ('close', 'high', 'low'):
+            feature = INDICATOR_FEATURES[indicator]
+            base_feature = base[feature] if feature in base else (base[indicator] - base['ycp']) / base['ycp']
+            stock_feature = panel.values.get(feature)
+            if stock_feature is None:
+                stock_feature = (panel.values[indicator] - panel.values['ycp']) / panel.values['ycp']
+            return np.broadcast_to(base_feature, stock_feature.shape), stock_feature
+        if indicator == 'turnover':
+            base_vol = np.broadcast_to(base['vol'], panel.mask.shape)
+            base_feature = base_vol / _masked_max(base_vol, panel.mask)[:, None]
+            stock_feature = panel.values['vol'] / _masked_max(panel.values['vol'], panel.mask)[:, None]
+            return base_feature, stock_feature
+    raise ValueError(f'不支持的指标: {indicator}')
+
+
+def common_counts(panel: SectionPanel, base: Dict[str, np.ndarray]) -> tuple:
+    """
+    计算每只候选股票与基准股票的共同交易日掩码及数量
+
+    :return: (共同交易日掩码, 共同交易日数量)
+    """
+    mask = panel.mask & ~np.isnan(base['close'])[None, :]
+    return mask, mask.sum(axis=1)
+
+
+def cumulative_returns(panel: SectionPanel) -> np.ndarray:
+    """
+    计算面板中每只股票相对其首个有效交易日收盘价的累计收益率（百分比）
+
+    缺失交易日沿用前一交易日的收益率，首个有效交易日之前填充为0
+
+    :param panel: 板块行情面板
+    :return: 累计收益率矩阵，形状为 股票 × 交易日
+    """
+    close = np.where(panel.mask, panel.values['close'], np.nan)
+    rows = np.arange(len(panel))
+    first = panel.mask.argmax(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (close / close[rows, first][:, None] - 1) * 100
+    # 向前填充：每个位置取不晚于它的最后一个非空位置的值
+    filled = np.where(np.isnan(returns), 0, np.arange(returns.shape[1])[None, :])
+    returns = returns[rows[:, None], np.maximum.accumulate(filled, axis=1)]
+    return np.where(np.isnan(returns), 0.0, returns)
+
+
+def masked_correlation(target: np.ndarray, values: np.ndarray, mask: np.ndarray, min_overlap: int = 2) -> np.ndarray:
+    """
+    计算一条目标序列与矩阵每一行在共同有效位置上的皮尔逊相关系数，
+    结果与逐行对齐后调用 pandas Series.corr 一致
+
+    :param target: 目标序列，形状为 (交易日,)
+    :param values: 候选序列矩阵，形状为 股票 × 交易日
+    :param mask: 候选序列的有效性掩码，形状与 values 相同
+    :param min_overlap: 最少共同有效交易日数量，不足时相关系数为 nan
+    :return: 每一行的相关系数，方差为0或共同交易日不足时为 nan
+    """
+    mask = mask & ~np.isnan(values) & ~np.isnan(target)[None, :]
+    counts = mask.sum(axis=1)
+    n = np.maximum(counts, 1)
+    x = np.broadcast_to(target, values.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = _masked(x, mask).sum(axis=1) / n
+        y_mean = _masked(values, mask).sum(axis=1) / n
+        dx = _masked(x - x_mean[:, None], mask)
+        dy = _masked(values - y_mean[:, None], mask)
+        corr = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+    corr = np.clip(corr, -1.0, 1.0)
+    return np.where(counts >= max(min_overlap, 2), corr, np.nan)
+
+
+def batch_pearson_similarity(base: Dict[str, np.ndarray], panel: SectionPanel, indicators: List[str]) -> np.ndarray:
+    """
+    批量计算皮尔逊相似度，结果与逐对计算的 _calculate_pearson_similarity 一致
+
+    :return: 每只候选股票的相似度
+    """
+    mask, counts = common_counts(panel, base)
+    total = np.zeros(len(panel))
+    valid = np.zeros(len(panel))
+    n = np.maximum(counts, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for indicator in indicators:
+            if indicator not in INDICATOR_FEATURES:
+                continue
+            x, y = indicator_matrices(base, panel, indicator)
+            x_mean = _masked(x, mask).sum(axis=1) / n
+            y_mean = _masked(y, mask).sum(axis=1) / n
+            dx = _masked(x - x_mean[:, None], mask)
+            dy = _masked(y - y_mean[:, None], mask)
+            corr = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+            corr = np.clip(corr, -1.0, 1.0)
+            ok = ~np.isnan(corr)
+            total += np.where(ok, corr, 0.0)
+            valid += ok
+        avg = total / valid
+    scores = np.where(valid > 0, np.maximum(avg, 0.0), 0.0)
+    return np.where(counts > 25, np.nan_to_num(scores), 0.0)
+
+
+def batch_euclidean_similarity(base: Dict[str, np.ndarray], panel: SectionPanel, indicators: List[str]) -> np.ndarray:
+    """
+    批量计算欧氏距离相似度，结果与逐对计算的 _calculate_euclidean_similarity 一致
+
+    :return: 每只候选股票的相似度
+    """
+    mask, counts = common_counts(panel, base)
+    if 'close' not in indicators:
+        return np.zeros(len(panel))
+    x, y = indicator_matrices(base, panel, 'close')
+    dist = np.sqrt(_masked((x - y) ** 2, mask).sum(axis=1))
+    return np.where(counts >= 2, 1 / (1 + dist), 0.0)
+
+
+def _part_similarity(sum1: np.ndarray, sum2: np.ndarray) -> np.ndarray:
+    """
+    两组累计值的相似度：都为0时为1，仅一个为0时为0，否则为较小值/较大值
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.minimum(sum1, sum2) / np.maximum(sum1, sum2)
+    return np.where(
+        (sum1 == 0) & (sum2 == 0),
+        1.0,
+        np.where((sum1 == 0) | (sum2 == 0), 0.0, ratio),
+    )
+
+
+def _shape_part_sums(values: Dict[str, np.ndarray], mask: np.ndarray):
+    """
+    计算上影线、实体、下影线在共同交易日内的累计值，已有特征库预先计算的值时直接使用
+    """
+    if 'upper' in values:
+        upper, body, lower = values['upper'], values['body'], values['lower']
+    else:
+        o, c, h, lo = values['open'], values['close'], values['high'], values['low']
+        unit = values['ycp'] * 0.1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            upper = np.where(o > c, (h - o) / unit, (h - c) / unit)
+            lower = np.where(o > c, (c - lo) / unit, (o - lo) / unit)
+            body = np.abs(o - c) / unit
+    return _masked(upper, mask).sum(axis=1), _masked(body, mask).sum(axis=1), _masked(lower, mask).sum(axis=1)
+
+
+def batch_shape_similarity(base: Dict[str, np.ndarray], panel: SectionPanel, indicators: List[str]) -> np.ndarray:
+    """
+    批量计算K线形状相似度，结果与逐对计算的 _calculate_shape_similarity 一致
+
+    :return: 每只候选股票的相似度
+    """
+    mask, counts = common_counts(panel, base)
+    base_matrix = {col: np.broadcast_to(arr, mask.shape) for col, arr in base.items()}
+    upper1, body1, lower1 = _shape_part_sums(base_matrix, mask)
+    upper2, body2, lower2 = _shape_part_sums(panel.values, mask)
+    similarity = (
+        0.33 * _part_similarity(upper1, upper2)
+        + 0.34 * _part_similarity(body1, body2)
+        + 0.33 * _part_similarity(lower1, lower2)
+    )
+    return np.where(counts >= 2, similarity, 0.0)
+
+
+def batch_position_similarity(base: Dict[str, np.ndarray], panel: SectionPanel, indicators: List[str]) -> np.ndarray:
+    """
+    批量计算位置序列相似度，结果与逐对计算的 _calculate_position_similarity 一致
+
+    位置序列的第一天（共同交易日中的第一天）固定为1
+
+    :return: 每只候选股票的相似度
+    """
+    mask, counts = common_counts(panel, base)
+    first = np.argmax(mask, axis=1)
+    rows = np.arange(len(panel))
+
+    def position_sums(values):
+        if 'position' in values:
+            pos = values['position']
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                pos = (values['close'] - values['ycp']) / (values['ycp'] * 0.1)
+        pos = np.array(_masked(np.broadcast_to(pos, mask.shape), mask))
+        pos[rows, first] = 1.0
+        return _masked(pos, mask).sum(axis=1)
+
+    sum1 = position_sums(base)
+    sum2 = position_sums(panel.values)
+    return np.where(counts >= 2, _part_similarity(sum1, sum2), 0.0)
+
+
+def stacked_features(base: Dict[str, np.ndarray], panel: SectionPanel, indicators: List[str]) -> tuple:
+    """
+    将所选指标堆叠为多维序列，并把每只股票的共同交易日压缩到序列前部
+
+    :return: (基准序列, 候选序列, 有效长度)，序列形状为 股票 × 交易日 × 指标数
+    """
+    mask, counts = common_counts(panel, base)
+    selected = [indicator for indicator in INDICATOR_FEATURES if indicator in indicators]
+    # 稳定排序使有效交易日保持原有先后顺序并排在前面
+    order = np.argsort(~mask, axis=1, kind='stable')
+    base_series, stock_series = [], []
+    for indicator in selected:
+        x, y = indicator_matrices(base, panel, indicator)
+        base_series.append(np.take_along_axis(np.asarray(x), order, axis=1))
+        stock_series.append(np.take_along_axis(y, order, axis=1))
+    if not selected:
+        empty = np.zeros(mask.shape + (0,))
+        return empty, empty, counts
+    # 有效长度之外为填充位置，统一置0
+    padding = (np.arange(mask.shape[1])[None, :] >= counts[:, None])[:, :, None]
+    x = np.where(padding, 0.0, np.stack(base_series, axis=2))
+    y = np.where(padding, 0.0, np.stack(stock_series, axis=2))
+    return x, y, counts
+
+
+def batch_dtw_similarity(
+    base: Dict[str, np.ndarray],
+    panel: SectionPanel,
+    indicators: List[str],
+    window: Optional[int] = None,
+    top_k: Optional[int] = None,
+    stats: Optional[dict] = None,
+) -> np.ndarray:
+    """
+    批量计算DTW相似度，所选指标作为一条多维序列一次完成规整
+
+    指定 top_k 时使用下界剪枝与早停只求前K个最相似的股票，
+    未能进入前K的候选股票相似度为 nan
+
+    :param window: Sakoe-Chiba 窗口宽度（交易日），为空时不限制
+    :param top_k: 只需要的最相似股票数量，为空时计算全部候选股票
+    :param stats: 用于回传剪枝统计（prunedCount、abandonedCount）的字典
+    :return: 每只候选股票的相似度
+    """
+    x, y, counts = stacked_features(base, panel, indicators)
+    if x.shape[2] == 0:
+        return np.zeros(len(panel))
+    scores = np.zeros(len(panel))
+    comparable = np.flatnonzero(counts >= 2)
+    if top_k is None:
+        distances = dtw_distance_batch(x[comparable], y[comparable], lengths=counts[comparable], window=window)
+    else:
+        distances, pruned, abandoned = dtw_top_k(
+            x[comparable], y[comparable], counts[comparable], top_k, window=window
+        )
+        if stats is not None:
+            stats['prunedCount'] = stats.get('prunedCount', 0) + pruned
+            stats['abandonedCount'] = stats.get('abandonedCount', 0) + abandoned
+    with np.errstate(invalid='ignore'):
+        # 被剪枝（nan）与早停（inf）的候选股票均视为未进入前K
+        scores[comparable] = np.where(np.isfinite(distances), 1 / (1 + distances), np.nan)
+    return scores
+
+
+def batch_cointegration_similarity(
+    base: Dict[str, np.ndarray], panel: SectionPanel, indicators: List[str]
+) -> np.ndarray:
+    """
+    批量计算协整相似度，结果与逐对计算的 _calculate_cointegration_similarity 一致
+
+    共同交易日数量相同的候选股票作为一组，每个指标对整组一次完成 Engle-Granger 协整检验；
+    序列中含无效值（如昨收为0）的候选股票相似度为 nan
+
+    :return: 每只候选股票的相似度
+    """
+    x, y, counts = stacked_features(base, panel, indicators)
+    scores = np.zeros(len(panel))
+    if x.shape[2] == 0:
+        return scores
+    for length in np.unique(counts[counts > 25]):
+        rows = np.flatnonzero(counts == length)
+        p_values = [batch_coint(x[rows, :length, i], y[rows, :length, i])[1] for i in range(x.shape[2])]
+        # p 值越小协整性越强，相似度越高
+        scores[rows] = 1 / (1 + np.mean(p_values, axis=0))
+    return scores
+
+
+# 支持批量计算的相似性方法
+BATCH_SIMILARITY_METHODS = {
+    'dtw': batch_dtw_similarity,
+    'pearson': batch_pearson_similarity,
+    'euclidean': batch_euclidean_similarity,
+    'shape': batch_shape_similarity,
+    'position': batch_position_similarity,
+    'coIntegration': batch_cointegration_similarity,
+}
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+from datetime import date, datetime
+from typing import List, Optional, Union
+
+import numpy as np
+
+from utils import ck_util
+from utils.daily_replica_util import DailyBarReplica
+import logging
+logger = logging.getLogger(__name__)
+
+DateLike = Union[str, date, datetime, np.datetime64]
+
+
+class TradingCalendarUtil:
+    """
+    交易日历工具类
+
+    在内存中维护按升序排列的交易日数组（以日线表中出现过的日期为准）及最新交易日，
+    启动时加载并由定时任务定期增量刷新。启动加载失败时，查询方法在 ck_executor 等工作线程中先同步加载一次；
+    在事件循环线程中不查询数据库而抛出异常，异步调用方应先 await ensure_loaded，可选的缓存应以 is_loaded 判断后跳过。
+    所有按日期的定位均通过二分查找完成，时间复杂度为 O(log n)。
+    """
+
+    trading_days: np.ndarray = np.array([], dtype='datetime64[D]')
+    update_time: Optional[datetime] = None
+    _load_lock = threading.Lock()
+
+    @classmethod
+    def _load_trading_days(cls, after: Optional[np.datetime64] = None) -> np.ndarray:
+        """
+        从日线表查询交易日，离线模式下使用日线本地副本中的全部交易日
+
+        :param after: 只查询该日期之后的交易日，为空时查询全部交易日
+        :return: 升序排列的交易日数组
+        """
+        if DailyBarReplica.is_offline():
+            return DailyBarReplica.trading_days()
+        after_filter = f"AND timestamps >= toDate('{after + np.timedelta64(1, 'D')}')" if after is not None else ''
+        query = f"""
+        SELECT DISTINCT toDate(timestamps) AS trade_date
+        FROM ods_stock.ll_stock_daily_sharing
+        WHERE category = 'stock'
+            {after_filter}
+        ORDER BY trade_date
+        """
+        trade_dates = ck_util.query_np(query, ['trade_date'])['trade_date']
+        return np.unique(np.asarray(trade_dates, dtype='datetime64[D]'))
+
+    @classmethod
+    def refresh_sync(cls) -> bool:
+        """
+        同步刷新交易日历并原子替换内存数据，已加载时只查询最新交易日之后的交易日并追加，
+        刷新失败时保留上一次的数据
+
+        :return: 是否刷新成功
+        """
+        previous = cls.trading_days if cls.is_loaded() else None
+        try:
+            trading_days = cls._load_trading_days(previous[-1] if previous is not None else None)
+            if previous is not None:
+                trading_days = np.union1d(previous, trading_days)
+        except Exception as e:
+            logger.error(f"刷新交易日历失败，继续使用上一次的数据: {e}")
+            return False
+        if len(trading_days) == 0:
+            logger.warning("交易日历为空，继续使用上一次的数据")
+            return False
+        cls.trading_days = trading_days
+        cls.update_time = datetime.now()
+        logger.info(f"交易日历加载成功，交易日数: {len(trading_days)}，最新交易日: {trading_days[-1]}")
+        return True
+
+    @classmethod
+    async def refresh_trading_calendar(cls) -> bool:
+        """
+        异步刷新交易日历
+
+        :return: 是否刷新成功
+        """
+        return await ck_util.run_sync(cls.refresh_sync)
+
+    @classmethod
+    async def ensure_loaded(cls) -> bool:
+        """
+        未加载时在 ck_executor 中加载交易日历，供事件循环中的调用方在使用查询方法前调用
+
+        :return: 是否已加载
+        """
+        if not cls.is_loaded():
+            await ck_util.run_sync(cls._load_once)
+        return cls.is_loaded()
+
+    @classmethod
+    def _load_once(cls) -> bool:
+        """
+        未加载时同步加载一次，并发的加载请求只查询一次数据库
+
+        :return: 是否已加载
+        """
+        with cls._load_lock:
+            if not cls.is_loaded():
+                cls.refresh_sync()
+        return cls.is_loaded()
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        """
+        交易日历是否已加载
+
+        :return: 是否已加载
+        """
+        return cls.update_time is not None
+
+    @classmethod
+    def _days(cls) -> np.ndarray:
+        """
+        获取交易日数组，未加载时在工作线程中同步加载一次，在事件循环线程中不查询数据库而抛出异常
+        """
+        if not cls.is_loaded() and (cls._on_event_loop() or not cls._load_once()):
+            raise RuntimeError('交易日历未加载')
+        return cls.trading_days
+
+    @staticmethod
+    def _on_event_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    @staticmethod
+    def _to_day(value: DateLike) -> np.datetime64:
+        if isinstance(value, datetime):
+            value = value.date()
+        return np.datetime64(value, 'D')
+
+    @staticmethod
+    def _to_date(value: np.datetime64) -> date:
+        return value.astype('datetime64[D]').astype(date)
+
+    @classmethod
+    def latest_trading_day(cls) -> date:
+        """
+        最新交易日
+
+        :return: 最新交易日
+        """
+        return cls._to_date(cls._days()[-1])
+
+    @classmethod
+    def is_trading_day(cls, value: DateLike) -> bool:
+        """
+        判断是否为交易日
+
+        :param value: 日期
+        :return: 是否为交易日
+        """
+        days = cls._days()
+        day = cls._to_day(value)
+        index = np.searchsorted(days, day)
+        return bool(index < len(days) and days[index] == day)
+
+    @classmethod
+    def trading_day_on_or_before(cls, value: DateLike) -> Optional[date]:
+        """
+        不晚于指定日期的最近一个交易日
+
+        :param value: 日期
+        :return: 交易日，指定日期早于第一个交易日时为None
+        """
+        days = cls._days()
+        index = int(np.searchsorted(days, cls._to_day(value), side='right')) - 1
+        return cls._to_date(days[index]) if index >= 0 else None
+
+    @classmethod
+    def shift_trading_days(cls, value: DateLike, n: int) -> Optional[date]:
+        """
+        指定日期之前第 n 个交易日
+
+        以不晚于指定日期的最近交易日为第0个交易日向前数，n 为负数时向后数，
+        超出日历范围时截断到第一个或最后一个交易日
+
+        :param value: 日期
+        :param n: 交易日数量
+        :return: 交易日，指定日期早于第一个交易日时为None
+        """
+        days = cls._days()
+        index = int(np.searchsorted(days, cls._to_day(value), side='right')) - 1
+        if index < 0:
+            return None
+        return cls._to_date(days[min(max(index - n, 0), len(days) - 1)])
+
+    @classmethod
+    def trading_days_between(cls, start: DateLike, end: DateLike) -> List[date]:
+        """
+        [start, end] 闭区间内的全部交易日
+
+        :param start: 开始日期
+        :param end: 结束日期
+        :return: 升序排列的交易日列表
+        """
+        days = cls._days()
+        lo = np.searchsorted(days, cls._to_day(start), side='left')
+        hi = np.searchsorted(days, cls._to_day(end), side='right')
+        return days[lo:hi].astype(date).tolist()
+
+    @classmethod
+    def count_trading_days(cls, start: DateLike, end: DateLike) -> int:
+        """
+        [start, end] 闭区间内的交易日数量
+
+        :param start: 开始日期
+        :param end: 结束日期
+        :return: 交易日数量
+        """
+        days = cls._days()
+        lo = np.searchsorted(days, cls._to_day(start), side='left')
+        hi = np.searchsorted(days, cls._to_day(end), side='right')
+        return int(max(hi - lo, 0))
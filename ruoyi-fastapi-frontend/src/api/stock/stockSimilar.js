@@ -1,4 +1,5 @@
 import request from '@/utils/request'
+import { getToken } from '@/utils/auth'
 
 // 计算股票相似性
 export function calculateStockSimilarity(data) {
@@ -17,6 +18,92 @@ export function calculateStockSimilarity(data) {
   });
 }
 
+// 流式计算股票相似性：计算过程中通过 onPartial 回调推送当前的前K个相似股票，
+// 返回与 calculateStockSimilarity 结构相同的完整结果
+export async function calculateStockSimilarityStream(data, onPartial) {
+  const response = await fetch(import.meta.env.VITE_APP_BASE_API + '/system/stockSimilarity/calculateStream', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json;charset=utf-8',
+      'Authorization': 'Bearer ' + getToken()
+    },
+    body: JSON.stringify(data)
+  });
+  // 鉴权失败等情况下后端返回普通 JSON 响应
+  if (!(response.headers.get('content-type') || '').includes('text/event-stream')) {
+    const res = await response.json().catch(() => ({}));
+    throw new Error(res.msg || '相似性流式计算请求失败');
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let payload = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+          payload += line.slice(5).trim();
+        }
+      }
+      const parsed = JSON.parse(payload);
+      if (event === 'partial') {
+        onPartial && onPartial(parsed);
+      } else if (event === 'result') {
+        return { data: parsed };
+      } else if (event === 'error') {
+        throw new Error(parsed.message);
+      }
+    }
+  }
+  throw new Error('相似性流式计算连接中断');
+}
+
+// 提交异步相似性计算任务
+export function submitSimilarityJob(data) {
+  return request({
+    url: '/system/stockSimilarity/jobs',
+    method: 'post',
+    data: data
+  })
+}
+
+// 查询异步相似性计算任务的状态及进度
+export function getSimilarityJob(jobId) {
+  return request({
+    url: '/system/stockSimilarity/jobs/' + jobId,
+    method: 'get'
+  })
+}
+
+// 获取已完成的异步相似性计算任务的结果
+export function getSimilarityJobResult(jobId) {
+  return request({
+    url: '/system/stockSimilarity/jobs/' + jobId + '/result',
+    method: 'get'
+  })
+}
+
+// 在板块内股票的全部历史中搜索与基准形态最接近的子序列
+export function searchStockPattern(data) {
+  return request({
+    url: '/system/stockSimilarity/patternSearch',
+    method: 'post',
+    data: data,
+    timeout: 60000
+  })
+}
+
 // 搜索查询历史（支持模糊搜索）
 export function fuzzySearch(keyword) {
   return request({